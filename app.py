@@ -1,11 +1,26 @@
+from __future__ import annotations
+
 import streamlit as st
 import os
+import functools
+import importlib
+import re
+import json
+import threading
+import uuid
 from dotenv import load_dotenv
-from supabase import create_client, Client
-import pandas as pd
 from typing import Optional, Tuple, Any, Dict
 import datetime
 
+from clinic.auth import LoginResolver
+from clinic.backend import DeferredBackend, check_backend, create_backend
+from clinic.cache import QueryCache
+from clinic.loader import DashboardLoader
+from clinic.metrics import InstrumentedBackend, MetricsRecorder, RunProfile
+from clinic.slots import SlotBook, SlotTaken, WINDOW_DAYS, day_slots
+# pandas and the clinic modules built on it are imported under DATA LAYER
+# below, once someone is logged in: the login page needs none of them.
+
 load_dotenv()
 
 # --- PAGE CONFIG ---
@@ -14,148 +29,307 @@ st.set_page_config(page_title="Clinic Frontend", layout="wide")
 
 
 # --- THEME DEFINITIONS ---
-THEMES = {
-    # Dark themes
-    "Dark": {
-        "primary": "#D32F2F", "background": "#0E1117", "secondary_bg": "#262730",
-        "text": "#FAFAFA", "button_text": "#FFFFFF", "plot_bg": "#1E1E1E",
-        "paper_bg": "#0E1117", "grid": "#3E3E3E", "type": "dark"
-    },
-    "Ocean": {
-        "primary": "#00CED1", "background": "#0A192F", "secondary_bg": "#172A45",
-        "text": "#CCD6F6", "button_text": "#0A192F", "plot_bg": "#0A192F",
-        "paper_bg": "#0A192F", "grid": "#233554", "type": "dark"
-    },
-    "Dracula": {
-        "primary": "#BD93F9", "background": "#282A36", "secondary_bg": "#44475A",
-        "text": "#F8F8F2", "button_text": "#F8F8F2", "plot_bg": "#282A36",
-        "paper_bg": "#282A36", "grid": "#44475A", "type": "dark"
-    },
-    # Light themes
-    "Light Classic": {
-        "primary": "#1976D2", "background": "#FFFFFF", "secondary_bg": "#F5F5F5",
-        "text": "#212121", "button_text": "#FFFFFF", "plot_bg": "#FFFFFF",
-        "paper_bg": "#FFFFFF", "grid": "#E0E0E0", "type": "light"
-    },
-    "Mint Fresh": {
-        "primary": "#00695C", "background": "#F2F7F5", "secondary_bg": "#E6F3F0",
-        "text": "#212121", "button_text": "#FFFFFF", "plot_bg": "#F2F7F5",
-        "paper_bg": "#F2F7F5", "grid": "#B2DFDB", "type": "light"
-    },
-    "Rose Gold": {
-        "primary": "#B71C1C", "background": "#FFF0F3", "secondary_bg": "#FFE4E8",
-        "text": "#212121", "button_text": "#FFFFFF", "plot_bg": "#FFF0F3",
-        "paper_bg": "#FFF0F3", "grid": "#FFCDD2", "type": "light"
-    }
-}
+# Theme colours live in themes.json; THEME_CSS_TEMPLATE is filled in with
+# one theme's colours (str.format, so literal CSS braces are doubled).
+THEMES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "themes.json")
 
-def apply_custom_css(theme: dict):
-    """Apply custom CSS based on selected theme"""
-    css = f"""
-    <style>
-        /* Main app background */
-        .stApp {{
-            background-color: {theme["background"]};
-            color: {theme["text"]};
-        }}
-        
-        /* Sidebar background */
-        section[data-testid="stSidebar"] {{
-            background-color: {theme["secondary_bg"]} !important;
-        }}
-        
-        /* Sidebar text elements */
-        section[data-testid="stSidebar"] .stMarkdown,
-        section[data-testid="stSidebar"] h1,
-        section[data-testid="stSidebar"] h2,
-        section[data-testid="stSidebar"] h3,
-        section[data-testid="stSidebar"] label,
-        section[data-testid="stSidebar"] .stRadio label {{
-            color: {theme["text"]} !important;
-        }}
-        
-        /* Main content headers */
-        .stMarkdown h1, .stMarkdown h2, .stMarkdown h3, .stTitle {{
-            color: {theme["text"]} !important;
-        }}
-
-        /* Tabs */
-        .stTabs [data-baseweb="tab"] {{
-            background-color: {theme["secondary_bg"]};
-            color: {theme["text"]};
-        }}
-        .stTabs [data-baseweb="tab"][aria-selected="true"] {{
-            background-color: {theme["background"]};
-            border-bottom-color: {theme["primary"]};
-            color: {theme["primary"]};
-        }}
-        
-        /* Buttons */
-        .stButton > button {{
-            background-color: {theme["primary"]};
-            color: {theme["button_text"]};
-            border: none;
-            border-radius: 5px;
-            font-weight: 600;
-        }}
-        .stButton > button:hover {{ opacity: 0.85; }}
-        .stButton > button:disabled {{ opacity: 0.4; }}
-        
-        /* Dataframe */
-        .dataframe {{
-            background-color: {theme["secondary_bg"]} !important;
-        }}
-        
-        /* Info/Error boxes */
-        .stAlert {{
-            background-color: {theme["secondary_bg"]};
-            color: {theme["text"]};
-        }}
-        
-        /* All input labels */
-        .stTextInput label, .stNumberInput label, .stSelectbox label, 
-        .stRadio > label, .stDateInput label, .stTimeInput label,
-        .stTextArea label {{
-            color: {theme["text"]} !important;
-        }}
-
-        /* Make radio/selectbox text dark on light themes */
-        .stRadio [role="radiogroup"] label > div:last-child,
-        .stSelectbox div[data-baseweb="select"] > div {{
-            color: {theme["text"]} !important;
-        }}
-
-        /* Fix for dark-mode-base text inputs */
-        div[data-testid="stTextInput"] div[data-baseweb="input"] > div,
-        div[data-testid="stSelectbox"] div[data-baseweb="select"] > div {{
-            background-color: {theme["secondary_bg"]};
-            border-color: {theme["grid"]};
-        }}
-        div[data-testid="stTextInput"] input,
-        div[data-testid="stSelectbox"] div[data-baseweb="select"] div {{
-            color: {theme["text"]} !important;
-        }}
-    </style>
-    """
-    st.markdown(css, unsafe_allow_html=True)
+THEME_CSS_TEMPLATE = """
+<style>
+    /* Main app background */
+    .stApp {{
+        background-color: {background};
+        color: {text};
+    }}
+    
+    /* Sidebar background */
+    section[data-testid="stSidebar"] {{
+        background-color: {secondary_bg} !important;
+    }}
+    
+    /* Sidebar text elements */
+    section[data-testid="stSidebar"] .stMarkdown,
+    section[data-testid="stSidebar"] h1,
+    section[data-testid="stSidebar"] h2,
+    section[data-testid="stSidebar"] h3,
+    section[data-testid="stSidebar"] label,
+    section[data-testid="stSidebar"] .stRadio label {{
+        color: {text} !important;
+    }}
+    
+    /* Main content headers */
+    .stMarkdown h1, .stMarkdown h2, .stMarkdown h3, .stTitle {{
+        color: {text} !important;
+    }}
+
+    /* Tabs */
+    .stTabs [data-baseweb="tab"] {{
+        background-color: {secondary_bg};
+        color: {text};
+    }}
+    .stTabs [data-baseweb="tab"][aria-selected="true"] {{
+        background-color: {background};
+        border-bottom-color: {primary};
+        color: {primary};
+    }}
+    
+    /* Buttons */
+    .stButton > button {{
+        background-color: {primary};
+        color: {button_text};
+        border: none;
+        border-radius: 5px;
+        font-weight: 600;
+    }}
+    .stButton > button:hover {{ opacity: 0.85; }}
+    .stButton > button:disabled {{ opacity: 0.4; }}
+    
+    /* Dataframe */
+    .dataframe {{
+        background-color: {secondary_bg} !important;
+    }}
+    
+    /* Info/Error boxes */
+    .stAlert {{
+        background-color: {secondary_bg};
+        color: {text};
+    }}
+    
+    /* All input labels */
+    .stTextInput label, .stNumberInput label, .stSelectbox label, 
+    .stRadio > label, .stDateInput label, .stTimeInput label,
+    .stTextArea label {{
+        color: {text} !important;
+    }}
+
+    /* Make radio/selectbox text dark on light themes */
+    .stRadio [role="radiogroup"] label > div:last-child,
+    .stSelectbox div[data-baseweb="select"] > div {{
+        color: {text} !important;
+    }}
+
+    /* Fix for dark-mode-base text inputs */
+    div[data-testid="stTextInput"] div[data-baseweb="input"] > div,
+    div[data-testid="stSelectbox"] div[data-baseweb="select"] > div {{
+        background-color: {secondary_bg};
+        border-color: {grid};
+    }}
+    div[data-testid="stTextInput"] input,
+    div[data-testid="stSelectbox"] div[data-baseweb="select"] div {{
+        color: {text} !important;
+    }}
+</style>
+"""
+
+def minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{}:;,>])\s*", r"\1", css).strip()
+
+@st.cache_resource
+def load_themes() -> Dict[str, dict]:
+    with open(THEMES_PATH) as f:
+        return json.load(f)
+
+@st.cache_resource
+def compile_theme_css() -> Dict[str, str]:
+    """Build every theme's <style> block once per server process."""
+    return {name: minify_css(THEME_CSS_TEMPLATE.format(**theme)) for name, theme in load_themes().items()}
+
+THEMES = load_themes()
+THEME_CSS = compile_theme_css()
+
+def apply_custom_css(theme_name: str):
+    """Apply the precompiled CSS for the selected theme"""
+    # Streamlit drops elements a rerun doesn't re-emit, so this still runs on
+    # every full rerun; it's now a dict lookup and a minified payload.
+    st.markdown(THEME_CSS[theme_name], unsafe_allow_html=True)
 
 # --- END THEME ---
 
 
-# --- SUPABASE & SESSION STATE ---
+# --- DATABASE & SESSION STATE ---
+
+# CLINIC_PROFILING=1 enables the performance panel in the sidebar;
+# CLINIC_QUERY_LOG=1 logs every query and rerun as a JSON line.
+PROFILING_ENABLED = os.environ.get("CLINIC_PROFILING") == "1"
 
 @st.cache_resource
-def init_supabase() -> Client:
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
-    
-    if not url or not key:
-        st.error("Supabase credentials not found. Please configure SUPABASE_URL and SUPABASE_KEY.")
+def init_metrics() -> MetricsRecorder:
+    return MetricsRecorder(measure_bytes=PROFILING_ENABLED,
+                           log_queries=os.environ.get("CLINIC_QUERY_LOG") == "1")
+
+metrics = init_metrics()
+run_profile = metrics.start_run()
+
+# CLINIC_STARTUP=eager imports the data layer and builds the database client
+# before the first page renders, as the app used to; by default both wait for
+# first use and are warmed in the background once the login page is up
+# (CLINIC_PREWARM=0 turns the warm-up off).
+EAGER_STARTUP = os.environ.get("CLINIC_STARTUP") == "eager"
+PREWARM_ENABLED = os.environ.get("CLINIC_PREWARM") != "0"
+
+@st.cache_resource
+def init_backend() -> DeferredBackend:
+    # CLINIC_BACKEND=sqlite runs against a local SQLite file instead of Supabase;
+    # CLINIC_BACKEND=supabase-async uses the async client with retries and
+    # per-call timeouts (CLINIC_DB_TIMEOUT seconds, CLINIC_DB_RETRIES, CLINIC_DB_POOL connections)
+    kind = os.environ.get("CLINIC_BACKEND", "supabase")
+    url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+    try:
+        # Report bad configuration now; the client itself is built on first use
+        check_backend(kind, url, key)
+    except ValueError as e:
+        st.error(str(e))
         st.stop()
-    
-    return create_client(url, key)
+    return DeferredBackend(lambda: create_backend(
+        kind,
+        url=url,
+        key=key,
+        sqlite_path=os.environ.get("CLINIC_SQLITE_PATH", "clinic.db"),
+        timeout=float(os.environ.get("CLINIC_DB_TIMEOUT", "10")),
+        retries=int(os.environ.get("CLINIC_DB_RETRIES", "2")),
+        max_connections=int(os.environ.get("CLINIC_DB_POOL", "20")),
+    ))
 
-supabase = init_supabase()
+db = InstrumentedBackend(init_backend(), metrics)
+
+# Seconds a cached read stays fresh, per table. Writes made through this app
+# invalidate the affected table immediately, so these only bound staleness
+# for changes made elsewhere (other servers, the Supabase dashboard).
+CACHE_TTLS = {
+    "appointment": 30,
+    "payment": 60,
+    "prescription": 120,
+    "patient": 300,
+    "staff": 600,
+    "doctor": 600,
+    "nurse": 600,
+}
+
+@st.cache_resource
+def init_query_cache() -> QueryCache:
+    # cache_resource makes this one instance shared by every session
+    return QueryCache(max_entries=512, default_ttl=60, table_ttls=CACHE_TTLS, on_hit=metrics.record_cache_hit)
+
+query_cache = init_query_cache()
+# CLINIC_ARROW_DTYPES=1 stores ids and timestamps in Arrow-backed columns
+ARROW_DTYPES = os.environ.get("CLINIC_ARROW_DTYPES") == "1"
+
+@st.cache_resource
+def init_login_resolver() -> LoginResolver:
+    # Shared so the unknown-ID cache protects the database across sessions
+    return LoginResolver(db, negative_ttl=30)
+
+login_resolver = init_login_resolver()
+
+@st.cache_resource
+def init_dashboard_loader() -> DashboardLoader:
+    return DashboardLoader(max_workers=8)
+
+dashboard_loader = init_dashboard_loader()
+
+@st.cache_resource
+def init_reference_store() -> ReferenceStore:
+    # Doctor list and patient directory, fetched once and shared by every
+    # session. CLINIC_SNAPSHOT_DIR shares them between server processes too.
+    from clinic.reference import ReferenceStore
+    from clinic.repository import ClinicRepository, PROJECTIONS
+
+    loader_repo = ClinicRepository(db, query_cache, metrics, arrow_dtypes=ARROW_DTYPES)
+    store = ReferenceStore(snapshot_dir=os.environ.get("CLINIC_SNAPSHOT_DIR"))
+    store.register("doctors", lambda: loader_repo.fetch_all("staff", "staff_id", PROJECTIONS["doctor_options"],
+                                                            "staff_type", "Doctor"),
+                   tables=["staff"], ttl=CACHE_TTLS["staff"])
+    store.register("patients", lambda: loader_repo.fetch_all("patient", "patient_id", PROJECTIONS["patient_search"]),
+                   tables=["patient"], ttl=CACHE_TTLS["patient"])
+    return store
+
+@st.cache_resource
+def init_snapshot_store() -> Optional[SnapshotStore]:
+    # CLINIC_HISTORY_DIR keeps local Parquet mirrors of the appointment,
+    # prescription and patient tables there for the history views; shared
+    # by every session, and by every server process using the same directory
+    snapshot_dir = os.environ.get("CLINIC_HISTORY_DIR")
+    if not snapshot_dir:
+        return None
+    from clinic.snapshots import SnapshotStore
+
+    store = SnapshotStore(db, snapshot_dir)
+    # Every write invalidates the query cache; let the mirrors hear about it too
+    query_cache.on_invalidate = store.invalidate
+    store.prewarm()
+    return store
+
+# CLINIC_WRITE_QUEUE names a local SQLite file that bookings and sign-ups are
+# queued in; a background worker inserts them in batches, so submitting a
+# form doesn't wait on the database. Unset, they are inserted on the script
+# thread as before.
+WRITE_QUEUE_PATH = os.environ.get("CLINIC_WRITE_QUEUE")
+
+@st.cache_resource
+def init_write_queue() -> WriteQueue:
+    from clinic.writes import WriteQueue
+
+    def committed(table_name: str):
+        # Runs on the worker thread, after each batch of inserts
+        query_cache.invalidate(table_name)
+        if table_name == "patient":
+            init_reference_store().invalidate("patient")
+            login_resolver.forget("patient")
+
+    queue = WriteQueue(db, WRITE_QUEUE_PATH, on_commit=committed)
+    queue.start()
+    return queue
+
+@st.cache_resource(max_entries=2)
+def patient_search_index(version: int) -> PatientSearchIndex:
+    # Built once per version of the patient directory, shared by every session
+    from clinic.search import PatientSearchIndex
+
+    return PatientSearchIndex(reference.get("patients"))
+
+# Matches shown per patient search
+SEARCH_RESULTS = 20
+
+def search_patients(query: str) -> pd.DataFrame:
+    reference.get("patients")  # make sure the version below is loaded
+    return patient_search_index(reference.version("patients")).search(query, SEARCH_RESULTS)
+
+# Seconds between live-feed refreshes of the nurse dashboard
+LIVE_REFRESH_SECONDS = int(os.environ.get("CLINIC_LIVE_REFRESH", "15"))
+
+@st.cache_resource
+def init_appointment_feed() -> TableFeed:
+    # One feed per process: every nurse's timer reads the same frame, and
+    # the rate limit means at most one poll per interval hits the database
+    from clinic.feed import TableFeed
+    from clinic.repository import PROJECTIONS
+
+    return TableFeed(db, "appointment", "appointment_id", PROJECTIONS["live_appointments"],
+                     window_column="appointment_datetime",
+                     window_start=lambda: datetime.date.today().strftime("%Y-%m-%d 00:00:00"),
+                     min_interval=LIVE_REFRESH_SECONDS / 2)
+
+# Modules the logged-in pages import, in the order prewarm() loads them
+DATA_LAYER_MODULES = ("pandas", "clinic.repository", "clinic.bulk", "clinic.export", "clinic.feed",
+                      "clinic.reference", "clinic.search", "clinic.analytics", "clinic.snapshots",
+                      "clinic.writes")
+
+@st.cache_resource
+def prewarm() -> threading.Thread:
+    """
+    Once per server process, after the first login page has been sent:
+    build the database client and import the data layer on background
+    threads, so the first login doesn't wait for either.
+    """
+    def import_data_layer():
+        for module in DATA_LAYER_MODULES:
+            importlib.import_module(module)
+
+    db.backend.prewarm()
+    thread = threading.Thread(target=import_data_layer, name="clinic-import-prewarm", daemon=True)
+    thread.start()
+    return thread
 
 # Initialize session state
 if 'logged_in' not in st.session_state:
@@ -169,42 +343,77 @@ if 'logged_in' not in st.session_state:
     st.session_state.selected_theme = "Light Classic"
     st.session_state.theme_mode = "light"
 
+# --- DATA LAYER ---
+# Only logged-in pages query the database, so only they import pandas and
+# the modules built on it (about a second on a cold process, client library
+# included); the login page renders without them.
+if st.session_state.logged_in or EAGER_STARTUP:
+    import pandas as pd
+    from clinic import analytics as clinic_analytics
+    from clinic import bulk
+    from clinic import export
+    from clinic.analytics import Analytics
+    from clinic.repository import ClinicRepository, PROJECTIONS
+
+    if EAGER_STARTUP:
+        db.backend.get()
+    repo = ClinicRepository(db, query_cache, metrics, arrow_dtypes=ARROW_DTYPES, snapshots=init_snapshot_store(),
+                            loader=dashboard_loader)
+    slot_book = SlotBook(db, query_cache)
+    analytics = Analytics(repo)
+    reference = init_reference_store()
+    appointment_feed = init_appointment_feed()
+
 # --- THEME APPLICATION ---
-# This must run on *every* page load, before other UI elements
-current_theme = THEMES[st.session_state.selected_theme]
-apply_custom_css(current_theme)
+# This must run on *every* page load. Logged-in pages apply it from the
+# sidebar's theme_settings fragment instead, so a theme switch reruns only that.
+if not st.session_state.logged_in:
+    apply_custom_css(st.session_state.selected_theme)
 # --- END THEME APPLICATION ---
 
 
 # --- FUNCTION DEFINITIONS ---
 
-def find_id_column(table_name: str, id_value: str, possible_columns: list) -> Optional[str]:
-    """Find which column name exists and matches the ID value in the given table."""
-    
-    try:
-        numeric_id = int(id_value)
-    except ValueError:
-        st.error(f"ID must be a number. You entered '{id_value}'.")
-        return None 
+def render_profiling_panel(profile: RunProfile):
+    """Sidebar breakdown of the current rerun and export of process-wide metrics."""
+    with st.sidebar:
+        st.divider()
+        if not st.toggle("Performance panel", key="show_profiling"):
+            return
+        # The login page shows the panel too, before the data layer is imported
+        import pandas as pd
 
-    for col_name in possible_columns:
-        try:
-            response = supabase.table(table_name).select("*").eq(col_name, numeric_id).execute()
-            if response.data:
-                return col_name
-        except Exception as e:
-            error_str = str(e)
-            if "does not exist" not in error_str.lower():
-                st.warning(f"Unexpected error checking column '{col_name}' in table '{table_name}': {error_str}")
-            continue
-    return None
+        summary = profile.summary()
+        st.caption(f"Rerun {summary['total_ms']:.0f} ms: data load {summary['load_wall_ms']:.0f} ms, "
+                   f"DataFrame build {summary['dataframe_ms_sum']:.0f} ms, render {summary['render_ms']:.0f} ms")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Queries", summary["queries"])
+        col2.metric("Cache hits", summary["cache_hits"])
+        col3.metric("Rows", f"{summary['rows']:,}")
+        if profile.queries:
+            queries_df = pd.DataFrame(profile.queries)[["table", "action", "filters", "rows", "bytes", "ms"]]
+            st.dataframe(queries_df.sort_values("ms", ascending=False), hide_index=True)
+        if profile.frames:
+            st.write("**DataFrames built**")
+            st.dataframe(pd.DataFrame(profile.frames), hide_index=True)
+        st.write("**Query cache**")
+        st.json(query_cache.stats(), expanded=False)
+        if st.session_state.logged_in:
+            st.write("**Reference data**")
+            st.json(reference.stats(), expanded=False)
+        if st.session_state.logged_in and repo.snapshots is not None:
+            st.write("**History snapshots**")
+            st.json(repo.snapshots.stats(), expanded=False)
+        if WRITE_QUEUE_PATH:
+            st.write("**Write queue**")
+            st.json(init_write_queue().stats(), expanded=False)
+        if db.backend.ready and hasattr(db.backend, "stats"):
+            st.write("**Database client**")
+            st.json(db.backend.stats(), expanded=False)
+        st.download_button("Export metrics (OpenMetrics)", metrics.openmetrics(query_cache.stats()),
+                           file_name="clinic_metrics.txt", mime="text/plain")
 
 def login(user_id: str, position: str):
-    role = None
-    id_column = None
-    user_name = None
-    error_details = []
-    
     # Convert to int *once* for all checks
     try:
         numeric_user_id = int(user_id)
@@ -212,73 +421,19 @@ def login(user_id: str, position: str):
         st.error(f"ID must be a number. You entered '{user_id}'.")
         return
 
-    try:
-        if position == 'Doctor':
-            possible_columns = ['doctor_id'] 
-            id_column = find_id_column("doctor", user_id, possible_columns) # find_id_column needs the string
-            
-            if id_column:
-                role = "Doctor"
-                try:
-                    name_response = supabase.table("staff").select("name").eq("staff_id", numeric_user_id).execute()
-                    if name_response.data:
-                        user_name = name_response.data[0]['name']
-                    else:
-                        error_details.append(f"Doctor ID '{user_id}' found, but no matching 'staff' record exists to get name.")
-                except Exception as e:
-                    error_details.append(f"Error fetching staff name: {str(e)}")
-            else:
-                error_details.append(f"No doctor found with ID '{user_id}' in column 'doctor_id'.")
-                
-        elif position == 'Nurse':
-            possible_columns = ['nurse_id']
-            id_column = find_id_column("nurse", user_id, possible_columns)
-            
-            if id_column:
-                role = "Nurse"
-                try:
-                    name_response = supabase.table("staff").select("name").eq("staff_id", numeric_user_id).execute()
-                    if name_response.data:
-                        user_name = name_response.data[0]['name']
-                    else:
-                        error_details.append(f"Nurse ID '{user_id}' found, but no matching 'staff' record exists to get name.")
-                except Exception as e:
-                    error_details.append(f"Error fetching staff name: {str(e)}")
-            else:
-                error_details.append(f"No nurse found with ID '{user_id}' in column 'nurse_id'.")
-                
-        elif position == 'Patient':
-            possible_columns = ['patient_id']
-            id_column = find_id_column("patient", user_id, possible_columns)
-            
-            if id_column:
-                role = "Patient"
-                try:
-                    name_response = supabase.table("patient").select("name").eq(id_column, numeric_user_id).execute()
-                    if name_response.data:
-                        user_name = name_response.data[0]['name']
-                        st.session_state.patient_id_column = id_column
-                    else:
-                        error_details.append(f"Patient ID '{user_id}' found, but couldn't fetch name.")
-                except Exception as e:
-                    error_details.append(f"Error fetching patient name: {str(e)}")
-            else:
-                error_details.append(f"No patient found with ID '{user_id}' in column 'patient_id'.")
-        
-    except Exception as e:
-        # This will catch the NameError if find_id_column isn't defined
-        error_details.append(f"Database connection error: {str(e)}")
-    
-    if role and user_name:
+    # One query resolves both the role record and the display name
+    user_name, error = login_resolver.resolve(position, numeric_user_id)
+
+    if user_name:
         st.session_state.logged_in = True
         st.session_state.user_name = user_name
         st.session_state.user_id = numeric_user_id 
-        st.session_state.user_role = role
+        st.session_state.user_role = position
+        if position == "Patient":
+            st.session_state.patient_id_column = "patient_id"
         st.rerun()
     else:
-        if not error_details:
-            error_details.append("Invalid credentials. Please check your Position and ID.")
-        st.error(f"Login failed: {' | '.join(error_details)}")
+        st.error(f"Login failed: {error or 'Invalid credentials. Please check your Position and ID.'}")
 
 def logout():
     st.session_state.logged_in = False
@@ -288,58 +443,406 @@ def logout():
     st.session_state.patient_id_column = None
     st.rerun()
 
-def safe_query(table_name: str, eq_column: Optional[str] = None, eq_value: Optional[Any] = None) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+def safe_query(table_name: str, eq_column: Optional[str] = None, eq_value: Optional[Any] = None,
+               columns: str = "*") -> Tuple[Optional[pd.DataFrame], Optional[str]]:
     """
     Safely query a Supabase table and return a DataFrame or error message.
+    Pass columns (e.g. a PROJECTIONS entry) to fetch only what the view needs.
+    Results are served from the shared query cache when fresh; the returned
+    DataFrame may be shared with other sessions, so don't modify it in place.
     """
-    try:
-        if eq_column and eq_value is not None:
-            response = supabase.table(table_name).select("*").eq(eq_column, eq_value).execute()
+    return repo.query(table_name, eq_column, eq_value, columns)
+
+def load_dashboard_data(tasks: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a dashboard's queries concurrently, timed as the rerun's load phase."""
+    with metrics.phase("load"):
+        return dashboard_loader.load(tasks)
+
+# CLINIC_FRAGMENTS=0 turns panel fragments off, so every interaction reruns the whole script
+FRAGMENTS_ENABLED = os.environ.get("CLINIC_FRAGMENTS") != "0"
+
+def fragment(fn=None, *, run_every=None):
+    """
+    st.fragment for dashboard panels: an interaction inside the panel reruns
+    only the panel. A panel reads its data through the query cache (its
+    *_tasks helper, if any, lists the same reads for the full-run loader),
+    so a panel rerun costs its own reads, mostly cache hits, rather than
+    the whole dashboard's. A panel rerunning on its own gets its own
+    RunProfile, labelled with its name.
+    """
+    if fn is None:
+        return lambda f: fragment(f, run_every=run_every)
+
+    @functools.wraps(fn)
+    def panel(*args, **kwargs):
+        profile = metrics.current.get()
+        if profile is not None and profile.finished is None:
+            return fn(*args, **kwargs)
+        profile = metrics.start_run(fn.__name__)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.finish_run(profile)
+
+    # Timed panels stay fragments either way; a full rerun every few seconds is what fragments avoid
+    return st.fragment(panel, run_every=run_every) if FRAGMENTS_ENABLED or run_every else fn
+
+def set_theme_mode(mode: str):
+    st.session_state.theme_mode = mode
+    if THEMES[st.session_state.selected_theme]["type"] != mode:
+        st.session_state.selected_theme = "Dark" if mode == "dark" else "Light Classic"
+
+@fragment
+def theme_settings():
+    """Sidebar theme switcher. It applies the theme's CSS itself, so a switch reruns only this fragment."""
+    st.subheader("Theme Settings")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("Light", use_container_width=True, disabled=(st.session_state.theme_mode == "light"),
+                  on_click=set_theme_mode, args=("light",))
+    with col2:
+        st.button("Dark", use_container_width=True, disabled=(st.session_state.theme_mode == "dark"),
+                  on_click=set_theme_mode, args=("dark",))
+
+    available_themes = [name for name, theme in THEMES.items() if theme["type"] == st.session_state.theme_mode]
+    if st.session_state.selected_theme not in available_themes:
+        st.session_state.selected_theme = available_themes[0]
+
+    st.session_state.selected_theme = st.selectbox(
+        f"Choose {st.session_state.theme_mode.title()} Theme:",
+        available_themes,
+        index=available_themes.index(st.session_state.selected_theme)
+    )
+    apply_custom_css(st.session_state.selected_theme)
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+def paged_table_tasks(key: str, table_name: str, order_by: str, id_column: str,
+                      eq_column: Optional[str] = None, eq_value: Optional[Any] = None,
+                      columns: str = "*") -> Dict[str, Any]:
+    """
+    Loader tasks that fetch the row count and current page paged_table will
+    show, so they can run concurrently and paged_table reads them from cache.
+    """
+    page = st.session_state.get(f"{key}_page", 0)
+    page_size = st.session_state.get(f"{key}_page_size", PAGE_SIZES[0])
+    return {
+        f"{key}_count": lambda: repo.count(table_name, eq_column, eq_value),
+        f"{key}_rows": lambda: repo.page(table_name, order_by, page, page_size, eq_column, eq_value,
+                                         id_column, columns=columns),
+    }
+
+@fragment
+def paged_table(key: str, table_name: str, order_by: str, id_column: str,
+                eq_column: Optional[str] = None, eq_value: Optional[Any] = None,
+                columns: str = "*", empty_message: str = "No rows found."):
+    """
+    Render a table one page at a time with Previous/Next controls.
+    Only the visible page is downloaded; the next one is prefetched.
+    """
+    page_key = f"{key}_page"
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 0
+
+    total = repo.count(table_name, eq_column, eq_value)
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size",
+                             on_change=lambda: st.session_state.update({page_key: 0}))
+
+    last_page = max((total - 1) // page_size, 0) if total is not None else None
+    if last_page is not None and st.session_state[page_key] > last_page:
+        st.session_state[page_key] = last_page
+    page = st.session_state[page_key]
+
+    df, error = repo.page(table_name, order_by, page, page_size, eq_column, eq_value, id_column, columns=columns)
+    if df is not None:
+        st.dataframe(df, use_container_width=True)
+    elif error:
+        if error.startswith("No data found"):
+            st.info(empty_message)
         else:
-            response = supabase.table(table_name).select("*").execute()
-            
-        if response.data:
-            return pd.DataFrame(response.data), None
+            st.error(error)
+
+    has_next = df is not None and len(df) == page_size and (last_page is None or page < last_page)
+
+    col1, col2, col3 = st.columns([1, 3, 1])
+    with col1:
+        st.button("Previous", key=f"{key}_prev", disabled=page == 0, use_container_width=True,
+                  on_click=lambda: st.session_state.update({page_key: page - 1}))
+    with col2:
+        if df is not None:
+            first_row = page * page_size + 1
+            last_row = page * page_size + len(df)
+            total_str = f"{total:,}" if total is not None else "?"
+            st.caption(f"Rows {first_row:,}–{last_row:,} of {total_str}")
+    with col3:
+        st.button("Next", key=f"{key}_next", disabled=not has_next, use_container_width=True,
+                  on_click=lambda: st.session_state.update({page_key: page + 1}))
+
+    if has_next:
+        repo.prefetch_page(table_name, order_by, page + 1, page_size, eq_column, eq_value, id_column, columns=columns)
+
+# Label -> (days back, grain of the charts and aggregates read)
+ANALYTICS_PERIODS = {"Last 30 days": (30, "day"), "Last 90 days": (90, "day"), "Last 12 months": (365, "month")}
+
+def analytics_period(key: str) -> Tuple[datetime.date, str]:
+    days, grain = ANALYTICS_PERIODS[st.session_state.get(f"{key}_period", next(iter(ANALYTICS_PERIODS)))]
+    return datetime.date.today() - datetime.timedelta(days=days), grain
+
+def analytics_tasks(key: str, doctor_id: Optional[int] = None) -> Dict[str, Any]:
+    """Loader tasks for analytics_panel's aggregates, for the period currently selected."""
+    since, grain = analytics_period(key)
+    return {
+        f"{key}_counts": lambda: analytics.appointment_counts(since, doctor_id, grain),
+        f"{key}_payments": lambda: analytics.payment_totals(since, doctor_id, grain),
+    }
+
+@fragment
+def analytics_panel(key: str, doctor_id: Optional[int] = None, doctor_names: Optional[Dict[int, str]] = None):
+    """
+    Appointment and revenue summary from the daily aggregates. With
+    doctor_names (the clinic-wide view) a per-doctor breakdown is shown too.
+    """
+    st.selectbox("Period", list(ANALYTICS_PERIODS), key=f"{key}_period")
+    since, grain = analytics_period(key)
+    today = datetime.date.today()
+    counts, error = analytics.appointment_counts(since, doctor_id, grain)
+    if counts is None:
+        if error and error.startswith("No data found"):
+            st.info("No appointments in this period.")
         else:
-            return None, f"No data found in {table_name} table."
+            st.error(error)
+        return
+    payments, error = analytics.payment_totals(since, doctor_id, grain)
+    if payments is None:
+        if error and not error.startswith("No data found"):
+            st.warning(f"Payments unavailable: {error}")
+        payments = pd.DataFrame(columns=["period", "doctor_id", "payment_status", "amount"])
+
+    totals = clinic_analytics.summary(counts, payments, grain, today)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Appointments", f"{totals['appointments']:,}")
+    col2.metric("Completed", f"{totals['completed']:,}")
+    col3.metric("Cancellation rate", f"{totals['cancellation_rate']:.1%}" if totals["cancellation_rate"] is not None else "–")
+    col4.metric("No-show rate", f"{totals['no_show_rate']:.1%}" if totals["no_show_rate"] is not None else "–",
+                help=f"Appointments in past {grain}s never marked Completed, out of those not cancelled.")
+    col5.metric("Revenue", f"{totals['revenue']:,.2f}", help=f"Pending: {totals['pending']:,.2f}")
+
+    st.write(f"**Appointments per {grain}**")
+    st.bar_chart(clinic_analytics.status_counts(counts))
+    revenue = clinic_analytics.revenue(payments)
+    if not revenue.empty:
+        st.write(f"**Revenue per {grain}**")
+        st.line_chart(revenue)
+    if doctor_names is not None:
+        st.write("**By doctor**")
+        breakdown = clinic_analytics.doctor_breakdown(counts, payments, grain, today)
+        breakdown.insert(1, "Doctor", breakdown["doctor_id"].map(doctor_names))
+        st.dataframe(breakdown, use_container_width=True, hide_index=True)
+    st.caption(f"Since {clinic_analytics.first_period(since, grain):%d %b %Y} · "
+               "from daily aggregates, updated on every booking")
+
+def queue_write(table_name: str, row: dict, form: str, kind: str, label: str, track: bool = True,
+                **submit_args) -> int:
+    """
+    Queue an insert from a form and return its job id. The idempotency key
+    combines the row with a nonce kept per form until its write finishes,
+    so submitting the same form twice queues one write. Tracked jobs are
+    polled by pending_writes_panel until they finish.
+    """
+    from clinic.writes import idempotency_key
+
+    nonce = st.session_state.setdefault(f"{form}_nonce", uuid.uuid4().hex)
+    job_id = init_write_queue().submit(table_name, row, idempotency_key(nonce, row), **submit_args)
+    if track:
+        st.session_state.setdefault("pending_writes", {})[job_id] = {"form": form, "kind": kind, "label": label}
+    return job_id
+
+@fragment(run_every=1)
+def pending_writes_panel():
+    """Progress of this session's queued writes; each outcome is reported once, after a full rerun."""
+    from clinic.writes import FINISHED
+
+    pending = st.session_state.get("pending_writes", {})
+    finished = False
+    for job_id, entry in list(pending.items()):
+        job = init_write_queue().get(job_id)
+        if job is not None and job["status"] not in FINISHED:
+            st.info(f"{entry['label']}: saving...")
+            continue
+        del pending[job_id]
+        # The form's next submit is a new request
+        st.session_state.pop(f"{entry['form']}_nonce", None)
+        finish_write(job, entry)
+        finished = True
+    if finished:
+        st.rerun()
+
+def finish_write(job: Optional[Dict[str, Any]], entry: Dict[str, str]):
+    messages = st.session_state.setdefault("write_messages", [])
+    if job is None or job["status"] == "failed":
+        error = job["error"] if job else "the request was lost"
+        messages.append(("error", f"{entry['label']} failed: {error}"))
+    elif entry["kind"] == "signup":
+        new_user = job["result"]
+        st.session_state.logged_in = True
+        st.session_state.user_name = new_user["name"]
+        st.session_state.user_id = new_user["patient_id"]
+        st.session_state.user_role = "Patient"
+        st.session_state.patient_id_column = "patient_id"
+        messages.append(("success", f"Welcome, {new_user['name']}! Your account has been created. "
+                                    f"Your new Patient ID is {new_user['patient_id']}. You are now logged in."))
+    elif entry["kind"] == "new_patient_booking":
+        messages.append(("success", f"Appointment booked for the new patient (ID: {job['result']['patient_id']})."))
+    else:
+        messages.append(("success", "Appointment booked successfully!"))
+
+def book_appointment(patient_id, doctor_id, clinic_id, slot: datetime.datetime, reason,
+                     form: str = "booking", new_patient: Optional[dict] = None):
+    """Book a slot. With the write queue, new_patient is a patient row to create first and book for."""
+    try:
+        if WRITE_QUEUE_PATH:
+            slot_book.check(doctor_id, slot)
+            row = SlotBook.appointment_row(patient_id, doctor_id, clinic_id, slot, reason)
+            label = f"Booking {slot:%a %d %b %Y, %H:%M}"
+            if new_patient is None:
+                queue_write("appointment", row, form, "booking", label)
+            else:
+                patient_job = queue_write("patient", new_patient, form, "new_patient", label, track=False)
+                queue_write("appointment", row, form, "new_patient_booking", label,
+                            depends_on=patient_job, fill={"patient_id": "patient_id"})
+            st.rerun()
+        slot_book.book(patient_id, doctor_id, clinic_id, slot, reason)
+        st.success("Appointment booked successfully!")
+        st.rerun()
+    except SlotTaken as e:
+        st.error(f"{e} Please choose another slot.")
     except Exception as e:
-        error_msg = str(e)
-        if "infinite recursion" in error_msg.lower():
-            return None, f"Database configuration error: Row Level Security policy issue in {table_name}. Please check your Supabase RLS policies."
-        elif "does not exist" in error_msg.lower():
-            return None, f"Column or table error in {table_name}: {error_msg}"
-        else:
-            return None, f"Error accessing {table_name}: {error_msg}"
+        st.error(f"Error: {str(e)}")
 
-def get_cancellable_appointments(id_column: str, user_id: int) -> pd.DataFrame:
-    df, _ = safe_query("appointment", id_column, user_id)
-    if df is not None:
-        df = df[df['status'] == 'Booked']
-        # A more advanced version would join tables to get names
-        df['display'] = "Appt ID: " + df['appointment_id'].astype(str) + " on " + df['appointment_datetime'].astype(str)
-        return df
-    return pd.DataFrame(columns=['appointment_id', 'display'])
+# How many upcoming free slots the booking forms offer
+SLOTS_OFFERED = 20
 
-def book_appointment(patient_id, doctor_id, clinic_id, appt_datetime, reason):
+def slot_picker(doctor_id: int, from_day: datetime.date, key: str) -> Optional[datetime.datetime]:
+    """Selectbox of the doctor's next free slots from from_day; None if there are none."""
     try:
-        response = supabase.table("appointment").insert({
-            "patient_id": patient_id,
-            "doctor_id": doctor_id,
-            "clinic_id": clinic_id,
-            "appointment_datetime": appt_datetime,
-            "status": "Booked",
-            "reason": reason,
-            "priority": "Medium"
-        }).execute()
-        
+        slots = slot_book.next_slots(doctor_id, from_day, n=SLOTS_OFFERED)
+    except Exception as e:
+        st.error(f"Could not load available slots: {str(e)}")
+        return None
+    if not slots:
+        st.warning(f"No free slots in the {WINDOW_DAYS} days from {from_day}. Try a later date.")
+        return None
+    return st.selectbox("Available Slot", slots, format_func=lambda s: s.strftime("%a %d %b %Y, %H:%M"), key=key)
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+@fragment
+def bulk_booking_panel(key: str, doctor_options: Optional[Dict[str, int]] = None, doctor_id: Optional[int] = None):
+    """
+    Book many appointments from a CSV file or a weekly schedule. doctor_id
+    fixes the doctor (doctor dashboard); otherwise CSV rows name their
+    doctor and the schedule form offers doctor_options.
+    """
+    batch_key = f"{key}_batch"
+    source = st.radio("Import from", ["CSV file", "Recurring schedule"], horizontal=True, key=f"{key}_source")
+
+    raw, source_id = None, None
+    if source == "CSV file":
+        st.download_button("Download CSV template", ",".join(bulk.CSV_COLUMNS) + "\n",
+                           file_name="appointments.csv", mime="text/csv", key=f"{key}_template")
+        upload = st.file_uploader("Appointments CSV", type="csv", key=f"{key}_csv")
+        # Validate each uploaded file once, not on every rerun
+        if upload is not None and st.session_state.get(f"{key}_source_id") != upload.file_id:
+            raw, source_id = bulk.read_csv(upload), upload.file_id
+    else:
+        with st.form(f"{key}_schedule"):
+            patient_id = st.number_input("Patient ID", min_value=1, step=1)
+            if doctor_id is None:
+                doctor_name = st.selectbox("Doctor", options=(doctor_options or {}).keys())
+            start_date = st.date_input("From", min_value=datetime.date.today(), key=f"{key}_from")
+            end_date = st.date_input("Until", value=datetime.date.today() + datetime.timedelta(weeks=12),
+                                     min_value=datetime.date.today(), key=f"{key}_until")
+            at = st.selectbox("Time", [s.time() for s in day_slots(datetime.date.today())],
+                              format_func=lambda t: t.strftime("%H:%M"))
+            weekdays = st.multiselect("Every", WEEKDAYS, default=["Mon"])
+            reason = st.text_input("Reason for visit")
+            if st.form_submit_button("Preview Schedule"):
+                schedule_doctor = doctor_id if doctor_id is not None else (doctor_options or {}).get(doctor_name)
+                if schedule_doctor is None:
+                    st.error("Please choose a doctor.")
+                else:
+                    raw = bulk.recurrence(int(patient_id), schedule_doctor, start_date, end_date, at,
+                                          [WEEKDAYS.index(d) for d in weekdays], reason)
+                    source_id = "schedule"
+
+    if raw is not None:
+        st.session_state[f"{key}_source_id"] = source_id
+        try:
+            batch = bulk.normalise(raw, default_doctor_id=doctor_id)
+            if doctor_id is not None:
+                # Doctors only book into their own calendar
+                bulk.flag(batch, batch["doctor_id"] != doctor_id, "doctor_id must be your own ID")
+            st.session_state[batch_key] = bulk.validate(db, batch)
+        except ValueError as e:
+            st.session_state.pop(batch_key, None)
+            st.error(str(e))
+        except Exception as e:
+            st.session_state.pop(batch_key, None)
+            st.error(f"Could not validate appointments: {str(e)}")
+
+    batch = st.session_state.get(batch_key)
+    if batch is None:
+        return
+    rejected = batch[batch["error"].notna()]
+    valid_count = len(batch) - len(rejected)
+    col1, col2 = st.columns(2)
+    col1.metric("Ready to book", valid_count)
+    col2.metric("Rejected", len(rejected))
+    if not rejected.empty:
+        st.dataframe(rejected, use_container_width=True, hide_index=True)
+
+    if valid_count and st.button(f"Book {valid_count} Appointments", key=f"{key}_book"):
+        with st.spinner("Booking..."):
+            inserted, failed = bulk.insert_batches(db, batch)
+        query_cache.invalidate("appointment")
+        st.session_state.pop(batch_key, None)
+        st.success(f"Booked {inserted} appointments.")
+        if not failed.empty:
+            st.warning(f"{len(failed)} rows were rejected by the database:")
+            st.dataframe(failed, use_container_width=True, hide_index=True)
+
+def cancel_appointment(appointment_id: int, id_column: str, user_id: int):
+    """Cancel one of the user's Booked appointments with a single conditional update."""
+    try:
+        # Matches nothing if the appointment isn't theirs or is no longer Booked
+        response = (db.table("appointment").update({"status": "Cancelled"})
+                    .eq("appointment_id", appointment_id).eq(id_column, user_id).eq("status", "Booked")
+                    .execute())
+        query_cache.invalidate("appointment")
         if response.data:
-            st.success("Appointment booked successfully!")
+            st.success(f"Appointment {appointment_id} cancelled.")
             st.rerun()
         else:
-            st.error(f"Failed to book appointment: {response.error.message if response.error else 'Unknown error'}")
+            st.error(f"Appointment {appointment_id} could not be cancelled; it may already be cancelled or completed.")
     except Exception as e:
         st.error(f"Error: {str(e)}")
 
+@fragment
+def cancel_panel(id_column: str, user_id: int):
+    """Cancel tab: pick one of the upcoming appointments by id."""
+    df, error = repo.upcoming_appointments(id_column, user_id)
+    if df is not None:
+        labels = dict(zip(df['appointment_id'].tolist(), df['appointment_datetime'].dt.strftime("%a %d %b %Y, %H:%M")))
+        appointment_id = st.selectbox("Select appointment to cancel", options=list(labels),
+                                      format_func=lambda i: f"#{i} · {labels[i]}")
+        if st.button("Cancel Selected Appointment"):
+            cancel_appointment(appointment_id, id_column, user_id)
+    elif error and not error.startswith("No data found"):
+        st.error(error)
+    else:
+        st.info("You have no upcoming 'Booked' appointments to cancel.")
+
 def sign_up_patient(name, email, phone, dob, gender, addr):
     """Handles new patient sign up and logs them in."""
     if not name:
@@ -355,11 +858,20 @@ def sign_up_patient(name, email, phone, dob, gender, addr):
             "gender": gender,
             "address": addr  # <--- FIX: Renamed 'addr' to 'address'
         }
-        
+
+        if WRITE_QUEUE_PATH:
+            # pending_writes_panel logs them in once the worker has inserted the row
+            queue_write("patient", new_patient_data, "signup_form", "signup", f"Creating the account for {name}")
+            st.rerun()
+
         # Insert new patient and get their details back
-        response = supabase.table("patient").insert(new_patient_data).execute()
+        response = db.table("patient").insert(new_patient_data).execute()
         
         if response.data:
+            query_cache.invalidate("patient")
+            # Called from the login page, where the store may not be built yet
+            init_reference_store().invalidate("patient")
+            login_resolver.forget("patient")
             new_user = response.data[0]
             new_patient_id = new_user['patient_id']
             new_patient_name = new_user['name']
@@ -381,150 +893,240 @@ def sign_up_patient(name, email, phone, dob, gender, addr):
         st.error(f"An error occurred during sign up: {str(e)}")
 
 
+@fragment
+def doctor_booking_form(user_id: int):
+    """Book for an existing patient (searched) or a new one, in one of the doctor's free slots."""
+    booking_mode = st.radio("Select Patient Type", ["Existing Patient", "New Patient"], horizontal=True)
+
+    patients_df, _ = reference.result("patients")
+
+    if patients_df is None and booking_mode == "Existing Patient":
+        st.warning("Could not load patient list. Please add a new patient.")
+        booking_mode = "New Patient"
+
+    # Outside the form so changing them refreshes the slot and patient lists
+    slot_date = st.date_input("Earliest Appointment Date", min_value=datetime.date.today(), key="doctor_slot_date")
+    matches = None
+    if booking_mode == "Existing Patient":
+        patient_query = st.text_input("Search Patients", placeholder="Name, phone, email or patient ID",
+                                      key="doctor_patient_search")
+        if patient_query:
+            matches = search_patients(patient_query)
+
+    with st.form("doctor_book_form"):
+        patient_id_to_book = None 
+
+        if booking_mode == "Existing Patient":
+            if matches is None:
+                st.info("Search for a patient above.")
+            elif matches.empty:
+                st.warning("No patients match your search.")
+            else:
+                # Keyed by patient_id, so patients who share a name stay distinct
+                labels = dict(zip(matches['patient_id'].tolist(),
+                                  (matches['name'].fillna("") + " · #" + matches['patient_id'].astype(str)
+                                   + " · " + matches['phone'].fillna("").astype(str)).tolist()))
+                patient_id_to_book = st.selectbox("Select Existing Patient", options=list(labels),
+                                                  format_func=labels.get)
+
+        else: # booking_mode == "New Patient"
+            st.subheader("New Patient Details")
+            new_patient_name = st.text_input("Name")
+            new_patient_email = st.text_input("Email")
+            new_patient_phone = st.text_input("Phone")
+            new_patient_dob = st.date_input("Date of Birth", 
+                                            min_value=datetime.date(1900, 1, 1), 
+                                            max_value=datetime.date.today(),
+                                            value=datetime.date(2000, 1, 1))
+            new_patient_gender = st.selectbox("Gender", ["Male", "Female", "Other"])
+            new_patient_addr = st.text_area("Address")
+
+        st.divider()
+        st.subheader("Appointment Details")
+        slot = slot_picker(user_id, slot_date, key="doctor_slot")
+        reason = st.text_area("Reason for visit")
+        submit_button = st.form_submit_button("Book Appointment")
+
+        if submit_button:
+            if slot is None:
+                st.error("Please choose an available slot.")
+            elif booking_mode == "New Patient":
+                if not new_patient_name:
+                    st.error("New patient's Name is required.")
+                else:
+                    try:
+                        new_patient_data = {
+                            "name": new_patient_name,
+                            "email": new_patient_email,
+                            "phone": new_patient_phone,
+                            "date_of_birth": str(new_patient_dob),
+                            "gender": new_patient_gender,
+                            "address": new_patient_addr # <--- FIX: Renamed 'addr' to 'address'
+                        }
+                        if WRITE_QUEUE_PATH:
+                            # Both rows are queued; the booking takes the patient_id once the patient is inserted
+                            book_appointment(None, user_id, 1, slot, reason, form="doctor_book_form",
+                                             new_patient=new_patient_data)
+                            return
+                        # Insert new patient and get their ID
+                        insert_response = db.table("patient").insert(new_patient_data).execute()
+
+                        if insert_response.data:
+                            query_cache.invalidate("patient")
+                            reference.invalidate("patient")
+                            login_resolver.forget("patient")
+                            patient_id_to_book = insert_response.data[0]['patient_id']
+                            st.success(f"Successfully created new patient: {new_patient_name} (ID: {patient_id_to_book})")
+                        else:
+                            st.error(f"Failed to create new patient: {insert_response.error.message if insert_response.error else 'Unknown error'}")
+
+                    except Exception as e:
+                        st.error(f"Error creating patient: {str(e)}")
+
+            if slot is not None and patient_id_to_book is not None:
+                clinic_id = 1 # Hardcoding clinic ID 1 as example
+                book_appointment(patient_id_to_book, user_id, clinic_id, slot, reason, form="doctor_book_form")
+            elif slot is not None and booking_mode == "Existing Patient":
+                 st.error("No patient was selected.")
+
 def doctor_dashboard():
     st.title("Doctor Dashboard")
     st.write(f"Welcome, {st.session_state.user_name}!")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["My Patients", "My Appointments", "All Payments", "Manage Appointments"])
+    user_id = st.session_state.user_id
+    appointments_table = dict(key="doctor_appointments", table_name="appointment",
+                              order_by="appointment_datetime", id_column="appointment_id",
+                              eq_column="doctor_id", eq_value=user_id,
+                              columns=PROJECTIONS["doctor_appointments"])
+    payments_table = dict(key="doctor_payments", table_name="payment", order_by="payment_date",
+                          id_column="payment_id", columns=PROJECTIONS["payment_table"])
+
+    # Every tab is rendered on a full run, so fetch all their data at once.
+    # Panels that rerun on their own (fragments) read theirs back from the cache.
+    data = load_dashboard_data({
+        "patients": lambda: repo.my_patients(user_id),
+        "patient_options": lambda: reference.result("patients"),
+        "cancellable": lambda: repo.upcoming_appointments("doctor_id", user_id),
+        **paged_table_tasks(**appointments_table),
+        **paged_table_tasks(**payments_table),
+        **analytics_tasks("doctor_analytics", user_id),
+    })
+
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["My Patients", "My Appointments", "All Payments", "Manage Appointments",
+                                            "Analytics"])
     
     with tab1:
         st.subheader("My Patients")
-        try:
-            appt_response = supabase.table("appointment").select("patient_id").eq("doctor_id", st.session_state.user_id).execute()
-            if appt_response.data:
-                patient_ids = list(set([d['patient_id'] for d in appt_response.data]))
-                
-                patient_response = supabase.table("patient").select("*").in_("patient_id", patient_ids).execute()
-                if patient_response.data:
-                    st.dataframe(pd.DataFrame(patient_response.data), use_container_width=True)
-                else:
-                    st.info("No patient details found for your appointments.")
-            else:
-                st.info("You do not have any appointments, and therefore no patients listed.")
-        except Exception as e:
-            st.error(f"Error fetching patients: {str(e)}")
-
-    with tab2:
-        st.subheader("My Appointments")
-        df, error = safe_query("appointment", "doctor_id", st.session_state.user_id)
+        df, error = data["patients"]
         if df is not None:
             st.dataframe(df, use_container_width=True)
-        elif error:
-            st.error(error)
+        elif error and error.startswith("No data found"):
+            st.info("You do not have any appointments, and therefore no patients listed.")
         else:
-            st.info("No appointments found.")
+            st.error(f"Error fetching patients: {error}")
+
+    with tab2:
+        st.subheader("My Appointments")
+        paged_table(**appointments_table, empty_message="No appointments found.")
     
     with tab3:
         st.subheader("All Payments")
-        df, error = safe_query("payment")
-        if df is not None:
-            st.dataframe(df, use_container_width=True)
-        elif error:
-            st.error(error)
-        else:
-            st.info("No payments found.")
+        paged_table(**payments_table, empty_message="No payments found.")
 
     with tab4:
         st.subheader("Manage Appointments")
-        book_tab, cancel_tab = st.tabs(["Book New Appointment", "Cancel Appointment"])
+        book_tab, bulk_tab, cancel_tab = st.tabs(["Book New Appointment", "Bulk Booking", "Cancel Appointment"])
 
         with book_tab:
             st.subheader("Book New Appointment")
-            
-            booking_mode = st.radio("Select Patient Type", ["Existing Patient", "New Patient"], horizontal=True)
-            
-            patients_df, _ = safe_query("patient")
-            
-            if patients_df is None and booking_mode == "Existing Patient":
-                st.warning("Could not load patient list. Please add a new patient.")
-                booking_mode = "New Patient"
-                
-            with st.form("doctor_book_form"):
-                patient_id_to_book = None 
-
-                if booking_mode == "Existing Patient":
-                    if patients_df is not None:
-                        patient_options = {row['name']: row['patient_id'] for index, row in patients_df.iterrows()}
-                        selected_patient_name = st.selectbox("Select Existing Patient", options=patient_options.keys())
-                        patient_id_to_book = patient_options[selected_patient_name]
-                    else:
-                        st.error("Patient list is unavailable. Please select 'New Patient'.")
-                
-                else: # booking_mode == "New Patient"
-                    st.subheader("New Patient Details")
-                    new_patient_name = st.text_input("Name")
-                    new_patient_email = st.text_input("Email")
-                    new_patient_phone = st.text_input("Phone")
-                    new_patient_dob = st.date_input("Date of Birth", 
-                                                    min_value=datetime.date(1900, 1, 1), 
-                                                    max_value=datetime.date.today(),
-                                                    value=datetime.date(2000, 1, 1))
-                    new_patient_gender = st.selectbox("Gender", ["Male", "Female", "Other"])
-                    new_patient_addr = st.text_area("Address")
-                
-                st.divider()
-                st.subheader("Appointment Details")
-                appt_date = st.date_input("Appointment Date", min_value=datetime.date.today())
-                appt_time = st.time_input("Appointment Time", value=datetime.time(9, 0))
-                reason = st.text_area("Reason for visit")
-                submit_button = st.form_submit_button("Book Appointment")
+            doctor_booking_form(user_id)
 
-                if submit_button:
-                    if booking_mode == "New Patient":
-                        if not new_patient_name:
-                            st.error("New patient's Name is required.")
-                        else:
-                            try:
-                                new_patient_data = {
-                                    "name": new_patient_name,
-                                    "email": new_patient_email,
-                                    "phone": new_patient_phone,
-                                    "date_of_birth": str(new_patient_dob),
-                                    "gender": new_patient_gender,
-                                    "address": new_patient_addr # <--- FIX: Renamed 'addr' to 'address'
-                                }
-                                # Insert new patient and get their ID
-                                
-                                if insert_response.data:
-                                    patient_id_to_book = insert_response.data[0]['patient_id']
-                                    st.success(f"Successfully created new patient: {new_patient_name} (ID: {patient_id_to_book})")
-                                else:
-                                    st.error(f"Failed to create new patient: {insert_response.error.message if insert_response.error else 'Unknown error'}")
-
-                            except Exception as e:
-                                st.error(f"Error creating patient: {str(e)}")
-                    
-                    if patient_id_to_book is not None:
-                        doctor_id = st.session_state.user_id
-                        clinic_id = 1 # Hardcoding clinic ID 1 as example
-                        appt_datetime_str = f"{appt_date} {appt_time}"
-                        book_appointment(patient_id_to_book, doctor_id, clinic_id, appt_datetime_str, reason)
-                    elif booking_mode == "Existing Patient":
-                         st.error("No patient was selected.")
+        with bulk_tab:
+            st.subheader("Bulk Booking")
+            bulk_booking_panel("doctor_bulk", doctor_id=user_id)
 
         with cancel_tab:
             st.subheader("Cancel an Appointment")
-            cancellable_df = get_cancellable_appointments("doctor_id", st.session_state.user_id)
-            
-            if not cancellable_df.empty:
-                appt_to_cancel_display = st.selectbox("Select appointment to cancel", options=cancellable_df['display'])
-                appt_to_cancel_id = cancellable_df[cancellable_df['display'] == appt_to_cancel_display]['appointment_id'].values[0]
-                
-                if st.button("Cancel Selected Appointment"):
-                    cancel_appointment(int(appt_to_cancel_id))
-            else:
-                st.info("You have no 'Booked' appointments to cancel.")
+            cancel_panel("doctor_id", user_id)
+
+    with tab5:
+        st.subheader("My Practice")
+        analytics_panel("doctor_analytics", doctor_id=user_id)
+
+
+@fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_appointments():
+    """Upcoming appointments, refreshed in place from the shared change feed."""
+    try:
+        changed = appointment_feed.refresh()
+    except Exception as e:
+        st.error(f"Could not refresh appointments: {str(e)}")
+        return
+    df = appointment_feed.snapshot()
+    if df.empty:
+        st.info("No appointments from today onwards.")
+    else:
+        st.dataframe(df.drop(columns="updated_at"), use_container_width=True, hide_index=True)
+    refreshed = appointment_feed.refreshed_at
+    st.caption(f"{len(df):,} appointments · updated {refreshed:%H:%M:%S}"
+               + (f" · {changed} changed" if changed else "")
+               + f" · refreshes every {LIVE_REFRESH_SECONDS}s")
+
+EXPORT_TABLES = {"Appointments": "appointment", "Payments": "payment", "Prescriptions": "prescription"}
 
+@fragment
+def export_panel(key: str, doctor_options: Optional[Dict[str, int]] = None):
+    """
+    Download a whole table, optionally filtered, as CSV or Parquet. The file
+    is streamed from the database page by page when the button is clicked,
+    never loaded into a DataFrame.
+    """
+    col1, col2 = st.columns(2)
+    label = col1.selectbox("Table", list(EXPORT_TABLES), key=f"{key}_table")
+    fmt = col2.radio("Format", list(export.FORMATS), format_func=str.upper, horizontal=True, key=f"{key}_format")
+
+    today = datetime.date.today()
+    start, end = None, None
+    if not st.checkbox("All dates", key=f"{key}_all_dates"):
+        dates = st.date_input("Dates", value=(today - datetime.timedelta(days=30), today), key=f"{key}_dates")
+        if len(dates) != 2:
+            st.info("Choose the last day of the range.")
+            return
+        start, end = dates
+    col1, col2 = st.columns(2)
+    doctor_name = col1.selectbox("Doctor", ["All doctors", *(doctor_options or {})], key=f"{key}_doctor")
+    clinic_id = col2.number_input("Clinic ID (0 for all)", min_value=0, step=1, key=f"{key}_clinic")
+
+    table_name = EXPORT_TABLES[label]
+    filters = dict(start=start, end=end, doctor_id=(doctor_options or {}).get(doctor_name),
+                   clinic_id=int(clinic_id) or None)
+    # A callable is run on the download request, off the script thread
+    st.download_button(f"Download {label} ({fmt.upper()})",
+                       data=lambda: export.collect(export.export_chunks(db, table_name, fmt, **filters)),
+                       file_name=f"{table_name}_{today:%Y%m%d}.{fmt}", mime=export.FORMATS[fmt],
+                       on_click="ignore", key=f"{key}_download")
 
 def nurse_dashboard():
     st.title("Nurse Dashboard")
     st.write(f"Welcome, {st.session_state.user_name}!")
     
-    tab1, tab2 = st.tabs(["Assigned Doctors", "Appointments"])
+    appointments_table = dict(key="nurse_appointments", table_name="appointment",
+                              order_by="appointment_datetime", id_column="appointment_id",
+                              columns=PROJECTIONS["appointment_table"])
+
+    data = load_dashboard_data({
+        "doctors": lambda: safe_query("doctor", columns=PROJECTIONS["doctor_table"]),
+        "doctor_options": lambda: reference.result("doctors"),
+        **paged_table_tasks(**appointments_table),
+        **analytics_tasks("nurse_analytics"),
+    })
+
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Assigned Doctors", "Appointments", "Bulk Booking", "Analytics",
+                                            "Export"])
     
     with tab1:
         st.subheader("Assigned Doctors")
-        df, error = safe_query("doctor")
+        df, error = data["doctors"]
         if df is not None:
             st.dataframe(df, use_container_width=True)
         elif error:
@@ -533,14 +1135,54 @@ def nurse_dashboard():
             st.info("No doctors found.")
     
     with tab2:
-        st.subheader("Appointments")
-        df, error = safe_query("appointment")
-        if df is not None:
-            st.dataframe(df, use_container_width=True)
-        elif error:
-            st.error(error)
+        st.subheader("Today and Upcoming")
+        live_appointments()
+        st.subheader("All Appointments")
+        paged_table(**appointments_table, empty_message="No appointments found.")
+
+    with tab3:
+        st.subheader("Bulk Booking")
+        doctors_df, _ = data["doctor_options"]
+        doctor_options = dict(zip(doctors_df['name'], doctors_df['staff_id'].tolist())) if doctors_df is not None else {}
+        bulk_booking_panel("nurse_bulk", doctor_options=doctor_options)
+
+    with tab4:
+        st.subheader("Clinic Analytics")
+        analytics_panel("nurse_analytics", doctor_names={v: k for k, v in doctor_options.items()})
+
+    with tab5:
+        st.subheader("Export")
+        export_panel("nurse_export", doctor_options=doctor_options)
+
+@fragment
+def patient_booking_form(user_id: int):
+    """Book the patient into a chosen doctor's free slot."""
+    try:
+        doctors_df, _ = reference.result("doctors")
+        if doctors_df is not None:
+            doctor_options = dict(zip(doctors_df['name'], doctors_df['staff_id'].tolist()))
+
+            # Outside the form so changing them refreshes the slot list
+            selected_doc_name = st.selectbox("Select Doctor", options=doctor_options.keys())
+            doctor_id = doctor_options[selected_doc_name]
+            slot_date = st.date_input("Earliest Appointment Date", min_value=datetime.date.today(),
+                                      key="patient_slot_date")
+
+            with st.form("patient_book_form"):
+                slot = slot_picker(doctor_id, slot_date, key="patient_slot")
+                reason = st.text_area("Reason for visit")
+                submit_button = st.form_submit_button("Book Appointment")
+
+                if submit_button:
+                    if slot is None:
+                        st.error("Please choose an available slot.")
+                    else:
+                        clinic_id = 1 # Hardcoding clinic ID 1 as example
+                        book_appointment(user_id, doctor_id, clinic_id, slot, reason, form="patient_book_form")
         else:
-            st.info("No appointments found.")
+            st.error("Could not load doctor list.")
+    except Exception as e:
+        st.error(f"Error loading doctors: {str(e)}")
 
 def patient_dashboard():
     st.title("Patient Dashboard")
@@ -549,10 +1191,19 @@ def patient_dashboard():
     tab1, tab2, tab3, tab4 = st.tabs(["My Info", "My Appointments", "My Prescriptions", "Manage Appointments"])
     
     patient_id_col = st.session_state.patient_id_column or "patient_id" 
+    user_id = st.session_state.user_id
+
+    data = load_dashboard_data({
+        "info": lambda: safe_query("patient", patient_id_col, user_id, columns=PROJECTIONS["patient_info"]),
+        "appointments": lambda: repo.patient_appointments(patient_id_col, user_id),
+        "prescriptions": lambda: repo.my_prescriptions(user_id),
+        "doctor_options": lambda: reference.result("doctors"),
+        "cancellable": lambda: repo.upcoming_appointments(patient_id_col, user_id),
+    })
     
     with tab1:
         st.subheader("My Information")
-        df, error = safe_query("patient", patient_id_col, st.session_state.user_id)
+        df, error = data["info"]
         if df is not None and not df.empty:
             patient_info = df.iloc[0].to_dict()
             col1, col2 = st.columns(2)
@@ -571,7 +1222,7 @@ def patient_dashboard():
     
     with tab2:
         st.subheader("My Appointments")
-        df, error = safe_query("appointment", patient_id_col, st.session_state.user_id)
+        df, error = data["appointments"]
         if df is not None:
             st.dataframe(df, use_container_width=True)
         elif error:
@@ -582,26 +1233,13 @@ def patient_dashboard():
     with tab3:
         st.subheader("My Prescriptions")
         
-        try:
-            patient_id = st.session_state.user_id
-            
-            appt_response = supabase.table("appointment").select("appointment_id").eq("patient_id", patient_id).execute()
-            
-            if not appt_response.data:
-                st.info("No appointments found, so no prescriptions can be shown.")
-            else:
-                appointment_ids = [d['appointment_id'] for d in appt_response.data]
-                
-                presc_response = supabase.table("prescription").select("*").in_("appointment_id", appointment_ids).execute()
-                
-                if presc_response.data:
-                    df = pd.DataFrame(presc_response.data)
-                    st.dataframe(df, use_container_width=True)
-                else:
-                    st.info("No prescriptions found for your past appointments.")
-                    
-        except Exception as e:
-            st.error(f"Error fetching prescriptions: {str(e)}")
+        df, error = data["prescriptions"]
+        if df is not None:
+            st.dataframe(df, use_container_width=True)
+        elif error and error.startswith("No data found"):
+            st.info("No prescriptions found for your appointments.")
+        else:
+            st.error(f"Error fetching prescriptions: {error}")
 
     with tab4:
         st.subheader("Manage Appointments")
@@ -610,46 +1248,22 @@ def patient_dashboard():
         with book_tab:
             st.subheader("Book New Appointment")
             
-            try:
-                doc_response = supabase.table("staff").select("staff_id, name").eq("staff_type", "Doctor").execute()
-                if doc_response.data:
-                    doctor_options = {d['name']: d['staff_id'] for d in doc_response.data}
-                    
-                    with st.form("patient_book_form"):
-                        selected_doc_name = st.selectbox("Select Doctor", options=doctor_options.keys())
-                        appt_date = st.date_input("Appointment Date", min_value=datetime.date.today())
-                        appt_time = st.time_input("Appointment Time", value=datetime.time(9, 0))
-                        reason = st.text_area("Reason for visit")
-                        submit_button = st.form_submit_button("Book Appointment")
-
-                        if submit_button:
-                            patient_id = st.session_state.user_id
-                            doctor_id = doctor_options[selected_doc_name]
-                            clinic_id = 1 # Hardcoding clinic ID 1 as example
-                            appt_datetime_str = f"{appt_date} {appt_time}"
-                            book_appointment(patient_id, doctor_id, clinic_id, appt_datetime_str, reason)
-                else:
-                    st.error("Could not load doctor list.")
-            except Exception as e:
-                st.error(f"Error loading doctors: {str(e)}")
+            patient_booking_form(user_id)
 
         with cancel_tab:
             st.subheader("Cancel an Appointment")
-            cancellable_df = get_cancellable_appointments(patient_id_col, st.session_state.user_id)
-            
-            if not cancellable_df.empty:
-                appt_to_cancel_display = st.selectbox("Select appointment to cancel", options=cancellable_df['display'])
-                appt_to_cancel_id = cancellable_df[cancellable_df['display'] == appt_to_cancel_display]['appointment_id'].values[0]
-                
-                if st.button("Cancel Selected Appointment"):
-                    cancel_appointment(int(appt_to_cancel_id))
-            else:
-                st.info("You have no 'Booked' appointments to cancel.")
+            cancel_panel(patient_id_col, user_id)
 
 
 # --- MAIN APP LOGIC ---
 # This part MUST come AFTER all function definitions
 
+# Outcomes of queued bookings and sign-ups, then any still in flight
+for level, message in st.session_state.pop("write_messages", []):
+    getattr(st, level)(message)
+if st.session_state.get("pending_writes"):
+    pending_writes_panel()
+
 if not st.session_state.logged_in:
     # --- LOGIN PAGE ---
     st.title("Clinic Management System")
@@ -698,6 +1312,10 @@ if not st.session_state.logged_in:
                     new_patient_address # <--- FIX: Pass the renamed variable
                 )
 
+    # The page is on screen; get the dashboards' imports and client ready
+    if PREWARM_ENABLED and not EAGER_STARTUP:
+        prewarm()
+
 else:
     # --- LOGGED-IN DASHBOARD ---
     with st.sidebar:
@@ -706,44 +1324,7 @@ else:
         st.write(f"**ID:** {st.session_state.user_id}")
         st.divider()
         
-        # --- THEME SWITCHER UI ---
-        st.subheader("Theme Settings")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("Light", use_container_width=True, 
-                        disabled=(st.session_state.theme_mode == "light")):
-                st.session_state.theme_mode = "light"
-                if THEMES[st.session_state.selected_theme]["type"] == "dark":
-                    st.session_state.selected_theme = "Light Classic"
-                st.rerun()
-        
-        with col2:
-            if st.button("Dark", use_container_width=True,
-                        disabled=(st.session_state.theme_mode == "dark")):
-                st.session_state.theme_mode = "dark"
-                if THEMES[st.session_state.selected_theme]["type"] == "light":
-                    st.session_state.selected_theme = "Dark"
-                st.rerun()
-        
-        if st.session_state.theme_mode == "dark":
-            available_themes = {k: v for k, v in THEMES.items() if v["type"] == "dark"}
-        else:
-            available_themes = {k: v for k, v in THEMES.items() if v["type"] == "light"}
-        
-        if st.session_state.selected_theme not in available_themes:
-            st.session_state.selected_theme = list(available_themes.keys())[0]
-        
-        selected_theme_name = st.selectbox(
-            f"Choose {st.session_state.theme_mode.title()} Theme:",
-            list(available_themes.keys()),
-            index=list(available_themes.keys()).index(st.session_state.selected_theme)
-        )
-        
-        if selected_theme_name != st.session_state.selected_theme:
-            st.session_state.selected_theme = selected_theme_name
-            st.rerun()
-        # --- END THEME UI ---
+        theme_settings()
 
         st.divider()
         if st.button("Logout", type="primary"):
@@ -756,3 +1337,8 @@ else:
         nurse_dashboard()
     elif st.session_state.user_role == "Patient":
         patient_dashboard()
+
+# --- PROFILING ---
+if PROFILING_ENABLED:
+    render_profiling_panel(run_profile)
+metrics.finish_run(run_profile)
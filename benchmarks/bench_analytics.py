@@ -0,0 +1,83 @@
+"""
+Compare the analytics tab's reads: the day and month aggregate views
+against the pandas fallback that aggregates raw appointment and payment
+rows, on a synthetic clinic on the SQLite backend.
+
+    python -m benchmarks.bench_analytics --appointments 500000 --days 30 365
+
+For each period it times the clinic-wide and a single doctor's view both
+ways (cold cache), reports the rows each read, and checks the two give the
+same summary.
+"""
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+from dataclasses import asdict
+
+from clinic import analytics as clinic_analytics
+from clinic.analytics import Analytics
+from clinic.cache import QueryCache
+from clinic.metrics import InstrumentedBackend, MetricsRecorder
+from clinic.repository import ClinicRepository
+
+
+def measure(backend, since: datetime.date, doctor_id, grain: str, fallback: bool) -> dict:
+    recorder = MetricsRecorder()
+    profile = recorder.start_run()
+    analytics = Analytics(ClinicRepository(InstrumentedBackend(backend, recorder), QueryCache()))
+    if fallback:
+        analytics.missing = {f"appointment_doctor_{grain}", f"payment_doctor_{grain}"}
+    start = time.perf_counter()
+    counts, error = analytics.appointment_counts(since, doctor_id, grain)
+    payments, _ = analytics.payment_totals(since, doctor_id, grain)
+    ms = (time.perf_counter() - start) * 1000
+    if counts is None:
+        raise SystemExit(f"No appointments since {since}: {error}")
+    totals = clinic_analytics.summary(counts, payments, grain, datetime.date.today())
+    return {"ms": ms, "rows": profile.summary()["rows"], "requests": profile.summary()["queries"], "totals": totals}
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+    from clinic.sqlite_backend import SQLiteBackend
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365])
+    parser.add_argument("--month-after", type=int, default=90,
+                        help="read monthly aggregates for periods longer than this many days, like the app")
+    parser.add_argument("--doctor", type=int, default=1)
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+    backend = SQLiteBackend(db_path)
+
+    print(f"{'view':<22}{'source':<12}{'ms':>9}{'rows read':>12}{'requests':>10}")
+    mismatches = 0
+    for days in args.days:
+        since = datetime.date.today() - datetime.timedelta(days=days)
+        grain = "month" if days > args.month_after else "day"
+        for label, doctor_id in ((f"clinic, {days}d", None), (f"doctor {args.doctor}, {days}d", args.doctor)):
+            results = {source: measure(backend, since, doctor_id, grain, source == "fallback")
+                       for source in ("aggregates", "fallback")}
+            for source, r in results.items():
+                print(f"{label:<22}{source:<12}{r['ms']:>9.1f}{r['rows']:>12,}{r['requests']:>10}")
+            a, b = results["aggregates"]["totals"], results["fallback"]["totals"]
+            if any(abs((a[k] or 0) - (b[k] or 0)) > 0.01 for k in a):
+                mismatches += 1
+                print(f"  summaries differ: {a} vs {b}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Race concurrent bookings for the same slots and time slot lookups, against
+a synthetic clinic on the SQLite backend.
+
+    python -m benchmarks.bench_booking --threads 16 --slots 10 --appointments 200000
+
+Every thread has its own SlotBook and query cache, like separate app
+servers, and all of them try to book the same few slots of one doctor at
+once. The run fails if any slot ends up with more than one live booking.
+"""
+
+import argparse
+import datetime
+import os
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+
+from clinic.cache import QueryCache
+from clinic.slots import SlotBook, SlotTaken
+
+
+def race(db, doctor_id: int, slots: list, threads: int) -> dict:
+    barrier = threading.Barrier(threads)
+    outcome = {"booked": 0, "taken": 0, "errors": []}
+    lock = threading.Lock()
+
+    def worker(n: int):
+        book = SlotBook(db, QueryCache())
+        barrier.wait()
+        for slot in slots:
+            try:
+                book.book(1 + n, doctor_id, 1, slot, "Load test")
+                result = "booked"
+            except SlotTaken:
+                result = "taken"
+            except Exception as e:
+                with lock:
+                    outcome["errors"].append(str(e))
+                continue
+            with lock:
+                outcome[result] += 1
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    outcome["seconds"] = time.perf_counter() - start
+    return outcome
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+    from clinic.sqlite_backend import SQLiteBackend
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--slots", type=int, default=10, help="slots every thread tries to book")
+    parser.add_argument("--lookups", type=int, default=200, help="next-slots lookups to time")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+    db = SQLiteBackend(db_path)
+    doctor_id = 1
+
+    # Slot lookups: one query per (doctor, window) when cold, none when warm
+    cold, warm = [], []
+    for _ in range(args.lookups):
+        book = SlotBook(db, QueryCache())
+        start = time.perf_counter()
+        book.next_slots(doctor_id, n=20)
+        cold.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        book.next_slots(doctor_id, n=20)
+        warm.append((time.perf_counter() - start) * 1000)
+    print(f"next 20 slots   cold median {statistics.median(cold):7.2f} ms   warm median {statistics.median(warm):7.3f} ms")
+
+    slots = SlotBook(db, QueryCache()).next_slots(doctor_id, n=args.slots)
+    outcome = race(db, doctor_id, slots, args.threads)
+    print(f"race            {args.threads} threads x {len(slots)} slots in {outcome['seconds']:.2f}s: "
+          f"{outcome['booked']} booked, {outcome['taken']} rejected, {len(outcome['errors'])} errors")
+
+    with db.reader() as conn:
+        duplicates = conn.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM appointment WHERE status <> 'Cancelled' "
+            "GROUP BY doctor_id, appointment_datetime HAVING count(*) > 1)").fetchone()[0]
+    print(f"double-booked slots: {duplicates}")
+    if duplicates or outcome["booked"] != len(slots) or outcome["errors"]:
+        raise SystemExit("FAILED: " + "; ".join(outcome["errors"][:3]))
+
+
+if __name__ == "__main__":
+    main()
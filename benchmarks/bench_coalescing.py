@@ -0,0 +1,109 @@
+"""
+Stress the query cache's single-flight loading: many sessions miss the
+cache for the same few queries at the same instant, like a clinic opening
+in the morning.
+
+    python -m benchmarks.bench_coalescing --sessions 64 --doctors 5 --rounds 10
+
+Every round, all sessions are released together (after the cache is
+cleared, as if the entries had just expired). Each one loads the doctor
+list and one doctor's appointments through its own ClinicRepository over a
+shared QueryCache and a fake backend with simulated latency. The run fails
+unless the backend saw exactly one request per distinct query per round.
+The same load without coalescing (plain get, execute, set) is shown for
+comparison.
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from benchmarks.bench_login import make_clinic
+from benchmarks.fake_backend import FakeClient
+from clinic.cache import QueryCache
+from clinic.repository import PROJECTIONS, ClinicRepository
+
+APPOINTMENT_COLUMNS = "appointment_id, patient_id, doctor_id, appointment_datetime, status"
+
+
+def make_tables(doctors: int, appointments: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    tables = make_clinic(doctors=doctors, nurses=10, patients=500)
+    tables["appointment"] = [{"appointment_id": i, "patient_id": rng.randint(1, 500),
+                              "doctor_id": rng.randint(1, doctors),
+                              "appointment_datetime": f"2026-10-{rng.randint(1, 28):02d} 10:00:00",
+                              "status": "Booked"} for i in range(1, appointments + 1)]
+    return tables
+
+
+def session_load(client, cache: QueryCache, doctor_id: int):
+    repo = ClinicRepository(client, cache)
+    repo.query("staff", "staff_type", "Doctor", PROJECTIONS["doctor_options"])
+    repo.query("appointment", "doctor_id", doctor_id, APPOINTMENT_COLUMNS)
+
+
+def uncoalesced_load(client, cache: QueryCache, doctor_id: int):
+    # The pre-single-flight path: every session that misses sends its own request
+    for key, build in ((("staff", "staff_type", "Doctor"),
+                        lambda: client.table("staff").select(PROJECTIONS["doctor_options"]).eq("staff_type", "Doctor")),
+                       (("appointment", "doctor_id", doctor_id),
+                        lambda: client.table("appointment").select(APPOINTMENT_COLUMNS).eq("doctor_id", doctor_id))):
+        found, _ = cache.get(key)
+        if not found:
+            cache.set(key, build().execute().data)
+
+
+def run(label: str, load, tables: dict, sessions: int, doctors: int, rounds: int, latency: float) -> dict:
+    client = FakeClient(tables, latency)
+    cache = QueryCache(max_entries=1024, default_ttl=600)
+    wall = []
+    for _ in range(rounds):
+        cache.clear()
+        barrier = threading.Barrier(sessions)
+
+        def session(n: int):
+            barrier.wait()
+            load(client, cache, n % doctors + 1)
+
+        threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall.append((time.perf_counter() - start) * 1000)
+
+    distinct = len(client.requests_by_query)
+    stats = cache.stats()
+    print(f"{label:<14} requests {client.requests:>6}   distinct queries {distinct:>4}   "
+          f"max per query {max(client.requests_by_query.values()):>5}   "
+          f"coalesced {stats['coalesced']:>6}   ratio {stats['coalescing_ratio']:.3f}   "
+          f"round {sum(wall) / len(wall):7.1f} ms")
+    return {"requests": client.requests, "by_query": client.requests_by_query, "stats": stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--doctors", type=int, default=5, help="distinct doctors whose appointments are loaded")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per request")
+    args = parser.parse_args()
+
+    tables = make_tables(args.doctors, args.appointments)
+    run("uncoalesced", uncoalesced_load, tables, args.sessions, args.doctors, args.rounds, args.latency)
+    result = run("single-flight", session_load, tables, args.sessions, args.doctors, args.rounds, args.latency)
+
+    expected = 1 + min(args.doctors, args.sessions)
+    over = {query: n for query, n in result["by_query"].items() if n != args.rounds}
+    if len(result["by_query"]) != expected or over:
+        print(f"FAIL: expected {expected} distinct queries sent once per round ({args.rounds}); got {dict(over)}")
+        sys.exit(1)
+    print(f"OK: {expected} distinct queries, each sent once per round")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Time each dashboard end to end against a synthetic clinic, using
+Streamlit's AppTest runner on the SQLite backend.
+
+    python -m benchmarks.bench_dashboards --appointments 200000 --output results.json
+
+For every dashboard it records a cold run (query cache empty) and warm
+runs, with per-query latency, rows and bytes transferred, DataFrame build
+time and peak Python memory. Memory is measured in a separate cold run
+because tracemalloc slows allocation-heavy code enough to skew timings.
+Results are written as JSON so runs can be compared across releases.
+--latency adds a simulated network round trip to every query.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+DASHBOARDS = {
+    "doctor": {"user_role": "Doctor", "user_id": 1},
+    "nurse": {"user_role": "Nurse", "user_id": None},  # filled with the first nurse id
+    "patient": {"user_role": "Patient", "user_id": 1},
+}
+
+
+class Recorder:
+    """Wraps the SQLite backend and the repository to time queries and DataFrame builds."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.queries = []
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def install(self):
+        from clinic.repository import ClinicRepository
+        from clinic.sqlite_backend import SQLiteQuery
+
+        recorder = self
+        execute = SQLiteQuery.execute
+        to_frame = ClinicRepository.to_frame
+
+        def timed_execute(query):
+            start = time.perf_counter()
+            if recorder.latency:
+                time.sleep(recorder.latency)
+            response = execute(query)
+            elapsed = (time.perf_counter() - start) * 1000
+            with recorder.lock:
+                recorder.queries.append({
+                    "table": query.table_name, "action": query.action, "columns": query.columns,
+                    "ms": round(elapsed, 3), "rows": len(response.data),
+                    "bytes": len(json.dumps(response.data, default=str)),
+                })
+            return response
+
+        def timed_to_frame(repo, table_name, rows):
+            start = time.perf_counter()
+            df = to_frame(repo, table_name, rows)
+            with recorder.lock:
+                recorder.frames.append({"table": table_name, "rows": len(rows),
+                                        "ms": round((time.perf_counter() - start) * 1000, 3)})
+            return df
+
+        SQLiteQuery.execute = timed_execute
+        ClinicRepository.to_frame = timed_to_frame
+
+    def reset(self):
+        self.queries, self.frames = [], []
+
+
+def run_dashboard(dashboard: str, session: dict, recorder: Recorder, cold: bool,
+                  trace_memory: bool = False) -> dict:
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    if cold:
+        st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    for key, value in session.items():
+        at.session_state[key] = value
+
+    recorder.reset()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    at.run()
+    wall_ms = (time.perf_counter() - start) * 1000
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    if at.exception:
+        raise RuntimeError(f"{dashboard} dashboard raised: {at.exception[0].value}")
+    errors = [e.value for e in at.error]
+    return {
+        "dashboard": dashboard,
+        "run": "cold" if cold else "warm",
+        "wall_ms": round(wall_ms, 2),
+        "queries": len(recorder.queries),
+        "query_ms_total": round(sum(q["ms"] for q in recorder.queries), 2),
+        "query_ms_max": round(max((q["ms"] for q in recorder.queries), default=0), 2),
+        "rows": sum(q["rows"] for q in recorder.queries),
+        "bytes": sum(q["bytes"] for q in recorder.queries),
+        "dataframe_ms": round(sum(f["ms"] for f in recorder.frames), 2),
+        "peak_memory_kb": round(peak / 1024, 1) if peak is not None else None,
+        "errors": errors,
+        "per_query": list(recorder.queries),
+    }
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+    from clinic.sqlite_backend import SQLiteBackend
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per query")
+    parser.add_argument("--repeat", type=int, default=3, help="warm runs per dashboard")
+    parser.add_argument("--output", help="write JSON results here")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        start = time.perf_counter()
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+        print(f"Generated {db_path} in {time.perf_counter() - start:.1f}s")
+
+    os.environ["CLINIC_BACKEND"] = "sqlite"
+    os.environ["CLINIC_SQLITE_PATH"] = db_path
+    recorder = Recorder(args.latency)
+    recorder.install()
+
+    results = []
+    for dashboard, session in DASHBOARDS.items():
+        session = dict(session)
+        if session["user_id"] is None:
+            session["user_id"] = size.doctors + 1
+        session.update(logged_in=True, user_name="Benchmark User", selected_theme="Light Classic",
+                       theme_mode="light", patient_id_column="patient_id" if dashboard == "patient" else None)
+        runs = [run_dashboard(dashboard, session, recorder, cold=True)]
+        runs += [run_dashboard(dashboard, session, recorder, cold=False) for _ in range(args.repeat)]
+        traced = run_dashboard(dashboard, session, recorder, cold=True, trace_memory=True)
+        runs[0]["peak_memory_kb"] = traced["peak_memory_kb"]
+        results.extend(runs)
+
+        cold, warm = runs[0], runs[1:]
+        print(f"{dashboard:<8} cold {cold['wall_ms']:8.1f} ms  {cold['queries']:3d} queries  "
+              f"{cold['rows']:8,} rows  {cold['bytes'] / 1024:8.1f} KB  df {cold['dataframe_ms']:6.1f} ms  "
+              f"peak {cold['peak_memory_kb'] / 1024:6.1f} MB   "
+              f"warm median {statistics.median(r['wall_ms'] for r in warm):8.1f} ms")
+        for run in runs:
+            if run["errors"]:
+                print(f"  errors: {run['errors']}")
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "size": asdict(size) if not args.db else None,
+        "db": db_path,
+        "latency": args.latency,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare exporting a table the old way, a fully materialised DataFrame
+written with to_csv/to_parquet, with clinic.export's page-by-page stream,
+on a generated SQLite clinic.
+
+    python -m benchmarks.bench_export --appointments 300000
+
+For each table and format it reports the wall time, the peak Python
+memory traced while exporting, and the file size. Memory is traced with
+tracemalloc in a second pass, so tracing doesn't slow the timings. Arrow's
+own buffers aren't traced in either approach. The streamed figure includes
+collect(), the single bytes object a download is served from.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+
+from clinic import export
+from clinic.cache import QueryCache
+from clinic.repository import ClinicRepository
+from clinic.sqlite_backend import SQLiteBackend
+
+
+def materialised(repo: ClinicRepository, table_name: str, fmt: str) -> bytes:
+    df = repo.fetch_all(table_name, export.EXPORTS[table_name]["key"], ", ".join(export.export_columns(table_name)))
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+    return df.to_parquet(index=False, compression="zstd")
+
+
+def streamed(db, table_name: str, fmt: str) -> bytes:
+    return export.collect(export.export_chunks(db, table_name, fmt))
+
+
+def measure(fn, *args) -> dict:
+    start = time.perf_counter()
+    size = len(fn(*args))
+    wall_s = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"wall_s": wall_s, "peak_mb": peak / 2 ** 20, "size_mb": size / 2 ** 20}
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+    db = SQLiteBackend(db_path)
+    repo = ClinicRepository(db, QueryCache())
+
+    print(f"{'table':<14}{'format':<9}{'':>13}{'seconds':>9}{'peak MB':>9}{'file MB':>9}")
+    for table_name in export.EXPORTS:
+        for fmt in export.FORMATS:
+            for label, fn, client in (("materialised", materialised, repo), ("streamed", streamed, db)):
+                r = measure(fn, client, table_name, fmt)
+                print(f"{table_name if label == 'materialised' else '':<14}{fmt if label == 'materialised' else '':<9}"
+                      f"{label:>13}{r['wall_s']:>9.2f}{r['peak_mb']:>9.1f}{r['size_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Time the history views (a patient's appointments and prescriptions, a
+doctor's patient list) read from the database and from clinic.snapshots'
+local Parquet mirrors, on a generated SQLite clinic.
+
+    python -m benchmarks.bench_history --appointments 300000 --latency 0.03
+
+Each view is read for --samples different patients or doctors with an
+empty query cache, as a first visit would be. It reports the median and
+p95 time per view and the database queries per view. --latency adds a
+simulated network round trip to every query. Building the mirrors is
+timed separately: it happens once, in the background, when the app starts.
+Both paths are checked to return the same rows.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from dataclasses import asdict
+
+from clinic.cache import QueryCache
+from clinic.repository import ClinicRepository
+from clinic.snapshots import SnapshotStore
+from clinic.sqlite_backend import SQLiteBackend, SQLiteQuery
+
+VIEWS = {
+    "patient_appointments": ("patient_id", lambda repo, i: repo.patient_appointments("patient_id", i)),
+    "my_prescriptions": ("patient_id", lambda repo, i: repo.my_prescriptions(i)),
+    "my_patients": ("doctor_id", lambda repo, i: repo.my_patients(i)),
+}
+
+
+class QueryCounter:
+    """Counts SQLite queries and adds a simulated round trip to each."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.count = 0
+
+    def install(self):
+        counter = self
+        execute = SQLiteQuery.execute
+
+        def counted_execute(query):
+            counter.count += 1
+            if counter.latency:
+                time.sleep(counter.latency)
+            return execute(query)
+
+        SQLiteQuery.execute = counted_execute
+
+
+def same_rows(a, b) -> bool:
+    (df_a, error_a), (df_b, error_b) = a, b
+    if df_a is None or df_b is None:
+        return df_a is None and df_b is None and error_a == error_b
+    key = df_a.columns[0]
+    df_a = df_a.sort_values(key).reset_index(drop=True)
+    df_b = df_b[df_a.columns].sort_values(key).reset_index(drop=True)
+    return df_a.shape == df_b.shape and all(df_a[c].astype(str).equals(df_b[c].astype(str)) for c in df_a.columns)
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds added to every query")
+    parser.add_argument("--seed", type=int, default=42)
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+    db = SQLiteBackend(db_path)
+    counter = QueryCounter(args.latency)
+    counter.install()
+
+    store = SnapshotStore(db, tempfile.mkdtemp(prefix="clinic-history-"))
+    start = time.perf_counter()
+    for table_name in store.mirrors:
+        store.refresh(table_name)
+    built = ", ".join(f"{name} {s['rows_fetched']} rows" for name, s in store.stats().items())
+    print(f"mirrors built in {time.perf_counter() - start:.1f}s ({built})\n")
+
+    ids = {
+        "patient_id": [row["patient_id"] for row in db.table("patient").select("patient_id").execute().data],
+        "doctor_id": [row["doctor_id"] for row in db.table("doctor").select("doctor_id").execute().data],
+    }
+    rng = random.Random(args.seed)
+
+    print(f"{'view':<22}{'source':>10}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}")
+    mismatches = 0
+    for view, (id_column, read) in VIEWS.items():
+        sample = rng.sample(ids[id_column], min(args.samples, len(ids[id_column])))
+        results = {}
+        for source, snapshots in (("database", None), ("snapshot", store)):
+            times, queries, results[source] = [], 0, []
+            for i in sample:
+                repo = ClinicRepository(db, QueryCache(), snapshots=snapshots)
+                before = counter.count
+                start = time.perf_counter()
+                results[source].append(read(repo, i))
+                times.append((time.perf_counter() - start) * 1000)
+                queries += counter.count - before
+            p95 = statistics.quantiles(times, n=20)[-1] if len(times) > 1 else times[0]
+            print(f"{view if source == 'database' else '':<22}{source:>10}{statistics.median(times):>9.1f}"
+                  f"{p95:>9.1f}{queries / len(sample):>9.1f}")
+        mismatches += sum(not same_rows(a, b) for a, b in zip(results["database"], results["snapshot"]))
+
+    print("\nsnapshot results match the database" if not mismatches else f"\n{mismatches} results differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Count the work one widget interaction costs on the doctor dashboard, with
+the dashboard's panels as fragments and without (CLINIC_FRAGMENTS=0), using
+Streamlit's AppTest runner on the SQLite backend.
+
+    python -m benchmarks.bench_interactions --appointments 200000
+
+Each interaction starts from a freshly rendered dashboard. Without
+fragments it reruns the whole script, as Streamlit does; with them only
+the fragment that owns the widget reruns. For each it reports the reads
+made (queries sent plus query cache hits; every hit becomes a query once
+its entry expires), the queries actually sent, the elements sent to the
+browser and the wall time. The cache is warm, as it is between clicks.
+
+AppTest always reruns the whole script, so fragment reruns are requested
+the way the browser does, by fragment id, through a LocalScriptRunner
+subclass.
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import asdict
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+SESSION = {"logged_in": True, "user_name": "Benchmark User", "user_role": "Doctor", "user_id": 1,
+           "patient_id_column": None, "selected_theme": "Light Classic", "theme_mode": "light"}
+
+# Label -> how to find the widget in the rendered dashboard and interact with it
+INTERACTIONS = {
+    "Dark theme button": lambda at: next(b for b in at.button if b.label == "Dark").click(),
+    "Theme selectbox": lambda at: next(s for s in at.selectbox if s.label.startswith("Choose"))
+    .set_value(next(s for s in at.selectbox if s.label.startswith("Choose")).options[-1]),
+    "New Patient radio": lambda at: next(r for r in at.radio if r.label == "Select Patient Type")
+    .set_value("New Patient"),
+    "Patient search": lambda at: at.text_input(key="doctor_patient_search").input("Sharma"),
+    "Appointments next page": lambda at: at.button(key="doctor_appointments_next").click(),
+    "Analytics period": lambda at: at.selectbox(key="doctor_analytics_period").set_value("Last 90 days"),
+}
+
+
+class RunLog(logging.Handler):
+    """Collects the rerun summaries clinic.metrics logs with CLINIC_QUERY_LOG=1."""
+
+    def __init__(self):
+        super().__init__()
+        self.runs = []
+
+    def emit(self, record: logging.LogRecord):
+        event = json.loads(record.getMessage())
+        if event["event"] == "rerun":
+            self.runs.append(event)
+
+
+def install_fragment_runner():
+    """Make AppTest runs rerun only FragmentRunner.fragment_id when it is set, and keep each run's messages."""
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.element_tree import parse_tree_from_messages
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas
+
+    class FragmentRunner(LocalScriptRunner):
+        fragment_id = None
+        messages = []
+
+        def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+            if FragmentRunner.fragment_id is None:
+                tree = super().run(widget_state, query_params, timeout, page_hash)
+            else:
+                # Replace the full rerun every runner starts with queued, which would absorb this one
+                self._requests = ScriptRequests()
+                self.request_rerun(RerunData(widget_states=widget_state, page_script_hash=page_hash,
+                                             fragment_id_queue=[FragmentRunner.fragment_id]))
+                try:
+                    if not self._script_thread:
+                        self.start()
+                    require_widgets_deltas(self, timeout)
+                finally:
+                    self.join()
+                tree = parse_tree_from_messages(self.forward_msgs())
+            FragmentRunner.messages = list(self.forward_msgs())
+            return tree
+
+    app_test.LocalScriptRunner = FragmentRunner
+    return FragmentRunner
+
+
+def owning_fragment(messages, widget_id: str) -> str:
+    for msg in messages:
+        if msg.WhichOneof("type") != "delta" or msg.delta.WhichOneof("type") != "new_element":
+            continue
+        element = msg.delta.new_element
+        if getattr(getattr(element, element.WhichOneof("type")), "id", None) == widget_id:
+            return msg.delta.fragment_id
+    raise LookupError(f"widget {widget_id} not found")
+
+
+def measure(runner, log: RunLog, interact, fragments: bool) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["CLINIC_FRAGMENTS"] = "1" if fragments else "0"
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    for key, value in SESSION.items():
+        at.session_state[key] = value
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"dashboard raised: {at.exception[0].value}")
+
+    widget = interact(at)
+    if fragments:
+        runner.fragment_id = owning_fragment(runner.messages, widget.id) or None
+    log.runs.clear()
+    start = time.perf_counter()
+    try:
+        at.run()
+    finally:
+        runner.fragment_id = None
+    wall_ms = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(f"interaction raised: {at.exception[0].value}")
+
+    queries = sum(r["queries"] for r in log.runs)
+    hits = sum(r["cache_hits"] for r in log.runs)
+    return {"runs": [r["label"] or "script" for r in log.runs], "reads": queries + hits, "queries": queries,
+            "elements": sum(1 for m in runner.messages if m.WhichOneof("type") == "delta"),
+            "wall_ms": wall_ms}
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+    from clinic.sqlite_backend import SQLiteBackend
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+
+    os.environ.update(CLINIC_BACKEND="sqlite", CLINIC_SQLITE_PATH=db_path, CLINIC_QUERY_LOG="1")
+    log = RunLog()
+    metrics_logger = logging.getLogger("clinic.metrics")
+    metrics_logger.addHandler(log)
+    metrics_logger.setLevel(logging.INFO)
+    metrics_logger.propagate = False
+    runner = install_fragment_runner()
+
+    print(f"{'interaction':<24}{'':>11}{'reads':>7}{'queries':>9}{'elements':>10}{'ms':>9}   reran")
+    for label, interact in INTERACTIONS.items():
+        for fragments in (False, True):
+            r = measure(runner, log, interact, fragments)
+            print(f"{label if not fragments else '':<24}{'fragments' if fragments else 'whole app':>11}"
+                  f"{r['reads']:>7}{r['queries']:>9}{r['elements']:>10}{r['wall_ms']:>9.1f}   {', '.join(r['runs'])}")
+
+
+if __name__ == "__main__":
+    main()
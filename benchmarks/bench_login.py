@@ -0,0 +1,96 @@
+"""
+Compare login latency: the old find_id_column + name lookup flow against
+LoginResolver's single embedded query with its unknown-ID cache.
+
+    python -m benchmarks.bench_login --latency 0.02 --attempts 200
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.fake_backend import FakeClient
+from clinic.auth import LoginResolver
+
+
+def legacy_login(client, position: str, user_id: int):
+    """The pre-LoginResolver flow from app.py: existence check, then a name query."""
+    table_name, id_column = {"Doctor": ("doctor", "doctor_id"),
+                             "Nurse": ("nurse", "nurse_id"),
+                             "Patient": ("patient", "patient_id")}[position]
+    response = client.table(table_name).select("*").eq(id_column, user_id).execute()
+    if not response.data:
+        return None
+    if position == "Patient":
+        name_response = client.table("patient").select("name").eq("patient_id", user_id).execute()
+    else:
+        name_response = client.table("staff").select("name").eq("staff_id", user_id).execute()
+    return name_response.data[0]["name"] if name_response.data else None
+
+
+def make_clinic(doctors: int = 50, nurses: int = 50, patients: int = 2000) -> dict:
+    staff, doctor, nurse = [], [], []
+    for i in range(1, doctors + nurses + 1):
+        is_doctor = i <= doctors
+        staff.append({"staff_id": i, "name": f"Staff {i}", "email": f"staff{i}@clinic.test",
+                      "phone": "555-0100", "address": "1 Clinic Road",
+                      "staff_type": "Doctor" if is_doctor else "Nurse"})
+        if is_doctor:
+            doctor.append({"doctor_id": i, "specialization": "General", "pstart": "2020-01-01"})
+        else:
+            nurse.append({"nurse_id": i, "department": "OPD", "shift_type": "Morning"})
+    patient = [{"patient_id": i, "name": f"Patient {i}", "email": f"p{i}@mail.test", "phone": "555-0199",
+                "date_of_birth": "1990-01-01", "gender": "Other", "address": "2 Main Street"}
+               for i in range(1, patients + 1)]
+    return {"staff": staff, "doctor": doctor, "nurse": nurse, "patient": patient}
+
+
+def make_attempts(n: int, bad_ratio: float, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    bad_ids = [900000 + i for i in range(5)]  # a handful of IDs retried over and over
+    attempts = []
+    for _ in range(n):
+        position = rng.choice(["Doctor", "Nurse", "Patient"])
+        if rng.random() < bad_ratio:
+            user_id = rng.choice(bad_ids)
+        else:
+            user_id = {"Doctor": rng.randint(1, 50), "Nurse": rng.randint(51, 100),
+                       "Patient": rng.randint(1, 2000)}[position]
+        attempts.append((position, user_id))
+    return attempts
+
+
+def run(label: str, client: FakeClient, attempts: list, login_fn) -> None:
+    timings = []
+    for position, user_id in attempts:
+        start = time.perf_counter()
+        login_fn(position, user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{label:<16} mean {statistics.mean(timings):7.2f} ms   "
+          f"p50 {timings[len(timings) // 2]:7.2f} ms   "
+          f"p95 {timings[int(len(timings) * 0.95)]:7.2f} ms   "
+          f"round trips {client.requests}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated seconds per request")
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--bad-ratio", type=float, default=0.25, help="share of attempts with unknown IDs")
+    args = parser.parse_args()
+
+    tables = make_clinic()
+    attempts = make_attempts(args.attempts, args.bad_ratio)
+
+    legacy_client = FakeClient(tables, args.latency)
+    run("legacy", legacy_client, attempts, lambda pos, uid: legacy_login(legacy_client, pos, uid))
+
+    resolver_client = FakeClient(tables, args.latency)
+    resolver = LoginResolver(resolver_client)
+    run("single query", resolver_client, attempts, resolver.resolve)
+
+
+if __name__ == "__main__":
+    main()
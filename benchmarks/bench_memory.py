@@ -0,0 +1,74 @@
+"""
+Report how much memory each table's DataFrame takes before and after the
+clinic.schema dtypes are applied, against a synthetic clinic on the SQLite
+backend.
+
+    python -m benchmarks.bench_memory --appointments 500000 --output memory.json
+
+For every table it loads all rows through the backend, then measures the
+plain pd.DataFrame(rows), the typed frame, and the typed frame with
+Arrow-backed ids and timestamps (deep memory_usage), plus the conversion time.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict
+
+import pandas as pd
+
+from clinic.schema import TABLE_DTYPES, apply_schema, memory_footprint
+
+
+def measure(backend, table_name: str) -> dict:
+    rows = backend.table(table_name).select("*").execute().data
+    raw = pd.DataFrame(rows)
+    start = time.perf_counter()
+    typed = apply_schema(table_name, raw)
+    typed_ms = (time.perf_counter() - start) * 1000
+    arrow = apply_schema(table_name, raw, arrow=True)
+    before = memory_footprint(raw)
+    return {
+        "table": table_name,
+        "rows": len(raw),
+        "before_bytes": before,
+        "typed_bytes": memory_footprint(typed),
+        "arrow_bytes": memory_footprint(arrow),
+        "typed_ratio": round(memory_footprint(typed) / before, 3) if before else None,
+        "convert_ms": round(typed_ms, 1),
+    }
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+    from clinic.sqlite_backend import SQLiteBackend
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results here")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+    backend = SQLiteBackend(db_path)
+
+    results = [measure(backend, table_name) for table_name in TABLE_DTYPES]
+    print(f"{'table':<14}{'rows':>10}{'before MB':>12}{'typed MB':>11}{'arrow MB':>11}{'ratio':>8}{'convert ms':>12}")
+    for r in results:
+        print(f"{r['table']:<14}{r['rows']:>10,}{r['before_bytes'] / 1e6:>12.2f}{r['typed_bytes'] / 1e6:>11.2f}"
+              f"{r['arrow_bytes'] / 1e6:>11.2f}{r['typed_ratio'] or 0:>8.2f}{r['convert_ms']:>12.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"db": db_path, "results": results}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
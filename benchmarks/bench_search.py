@@ -0,0 +1,80 @@
+"""
+Time the patient search index against a synthetic patient directory.
+
+    python -m benchmarks.bench_search --patients 1000000 --output search.json
+
+Builds a clinic.search.PatientSearchIndex over generated patients, then
+times a mix of name, phone, email, patient id and misspelt queries. Exits
+non-zero if any query's 95th percentile is over --budget-ms.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+from clinic.search import SEARCH_COLUMNS, PatientSearchIndex
+
+QUERIES = {
+    "name prefix": ["aar", "diya s", "Kabir Kh", "meera nair", "z"],
+    "last name": ["sharma", "iyer", "kapo"],
+    "phone": ["97123", "9745", "97 81 2"],
+    "email": ["patient42@", "patient99"],
+    "patient id": ["12345", "1"],
+    "fuzzy": ["sharam", "meera nayr", "kabeer khan", "vihan patl"],
+}
+
+
+def time_query(index: PatientSearchIndex, query: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = index.search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {"query": query, "matches": len(found), "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3), "max_ms": round(timings[-1], 3)}
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, patient_rows
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args()
+
+    patients = pd.DataFrame(patient_rows(ClinicSize(patients=args.patients), random.Random(args.seed)),
+                            columns=SEARCH_COLUMNS)
+    start = time.perf_counter()
+    index = PatientSearchIndex(patients)
+    build_s = time.perf_counter() - start
+    print(f"Indexed {len(index):,} patients in {build_s:.2f}s")
+
+    results = []
+    print(f"{'kind':<13}{'query':<16}{'matches':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for kind, queries in QUERIES.items():
+        for query in queries:
+            r = {"kind": kind, **time_query(index, query, args.repeat)}
+            results.append(r)
+            print(f"{kind:<13}{query:<16}{r['matches']:>8}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['max_ms']:>9.2f}")
+
+    over = [r for r in results if r["p95_ms"] > args.budget_ms]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"patients": len(index), "build_s": round(build_s, 2), "results": results}, f, indent=2)
+        print(f"Wrote {args.output}")
+    if over:
+        print(f"{len(over)} queries over the {args.budget_ms:g} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
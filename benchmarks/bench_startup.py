@@ -0,0 +1,193 @@
+"""
+Time a cold server process's first page: the imports app.py makes and how
+long the login page takes to render, then the first login after it.
+
+    python -m benchmarks.bench_startup --output startup.json
+
+Each mode runs in a fresh interpreter under python -X importtime, with
+Streamlit already imported as it is by the server before any session:
+
+- eager: CLINIC_STARTUP=eager, the data layer imported and the database
+  client built before the login page renders.
+- lazy: the default, without the background warm-up (CLINIC_PREWARM=0),
+  so the first login pays for the imports.
+- lazy+prewarm: the default; the warm-up runs while the user types their
+  ID (--think-ms) and the first login finds everything loaded.
+
+The first login is made against a small generated SQLite clinic; with
+--backend supabase (dummy credentials, nothing is sent) only the login page
+is timed. Exits non-zero if the default mode's app imports or first paint
+are over --budget-import-ms or --budget-paint-ms, or if the login page
+fails with the performance panel open (CLINIC_PROFILING=1), where nothing
+of the data layer is loaded yet.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+MODES = {
+    "eager": {"CLINIC_STARTUP": "eager"},
+    "lazy": {"CLINIC_PREWARM": "0"},
+    "lazy+prewarm": {},
+}
+
+# Whether each was imported, or being imported by the warm-up, when the login page was up
+WATCHED = ("pandas", "pyarrow", "supabase", "clinic.repository")
+
+PAINT_MARKER = "bench_startup: paint"
+LOGIN_MARKER = "bench_startup: login"
+
+
+def child(login_id: int, think_ms: float):
+    """Render the login page, then log in; prints the timings as one JSON line."""
+    from streamlit.testing.v1 import AppTest
+
+    print(PAINT_MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+    paint_ms = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(f"login page raised: {at.exception[0].value}")
+    result = {"paint_ms": paint_ms, "loaded": {m: m in sys.modules for m in WATCHED}, "login_ms": None}
+
+    print(LOGIN_MARKER, file=sys.stderr, flush=True)
+    if login_id:
+        time.sleep(think_ms / 1000)
+        at.selectbox[0].select("Doctor")
+        at.text_input[0].input(str(login_id))
+        start = time.perf_counter()
+        at.button[0].click().run()
+        result["login_ms"] = (time.perf_counter() - start) * 1000
+        if at.exception or not at.session_state.logged_in:
+            raise RuntimeError(f"login failed: {[e.value for e in at.exception or at.error]}")
+    print(json.dumps(result))
+
+
+def profiling_child():
+    """Open the performance panel on the login page and fail a login; raises if the page does."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+    at.toggle(key="show_profiling").set_value(True).run()
+    at.selectbox[0].select("Doctor")
+    at.text_input[0].input("999999")
+    at.button[0].click().run()
+    if at.exception:
+        raise RuntimeError(f"login page with the performance panel raised: {at.exception[0].value}")
+    if at.session_state.logged_in:
+        raise RuntimeError("an unknown ID logged in")
+
+
+def check_profiling(env: dict) -> str:
+    """Run profiling_child in a fresh interpreter without the warm-up; '' if it passed, else the error."""
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--check-profiling"],
+        env={**env, "CLINIC_PROFILING": "1", "CLINIC_PREWARM": "0"}, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return proc.stderr.strip().splitlines()[-1] if proc.returncode else ""
+
+
+def top_level_imports(importtime: str) -> list:
+    """(module, cumulative ms) for each import the app made itself while rendering the login page."""
+    lines = importtime.split(PAINT_MARKER, 1)[-1].split(LOGIN_MARKER, 1)[0].splitlines()
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if not module[1:].startswith(" "):  # nested imports are indented under their importer
+            imports.append((module.strip(), int(cumulative) / 1000))
+    return imports
+
+
+def run_mode(mode: str, env: dict, login_id: int, think_ms: float) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "benchmarks.bench_startup",
+         "--child", "--login-id", str(login_id), "--think-ms", str(think_ms)],
+        env={**env, **MODES[mode]}, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if proc.returncode:
+        raise RuntimeError(f"{mode} run failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = top_level_imports(proc.stderr)
+    heaviest = sorted(imports, key=lambda i: -i[1])[:5]
+    return {"mode": mode, "import_ms": round(sum(ms for _, ms in imports), 1),
+            "paint_ms": round(result["paint_ms"], 1),
+            "login_ms": round(result["login_ms"], 1) if result["login_ms"] is not None else None,
+            "loaded": result["loaded"], "heaviest": [{"module": m, "ms": round(ms, 1)} for m, ms in heaviest]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "supabase"], default="sqlite")
+    parser.add_argument("--think-ms", type=float, default=2000.0, help="pause between login page and login")
+    parser.add_argument("--budget-import-ms", type=float, default=150.0)
+    parser.add_argument("--budget-paint-ms", type=float, default=750.0)
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--login-id", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--check-profiling", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.login_id, args.think_ms)
+        return
+    if args.check_profiling:
+        profiling_child()
+        return
+
+    env = dict(os.environ)
+    login_id = 0
+    if args.backend == "sqlite":
+        from benchmarks.datagen import ClinicSize, generate_clinic
+        from clinic.sqlite_backend import SQLiteBackend
+
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), ClinicSize(patients=2000, appointments=5000,
+                                                           prescriptions=2000, payments=3000), 42)
+        env.update(CLINIC_BACKEND="sqlite", CLINIC_SQLITE_PATH=db_path)
+        login_id = 1  # the generator's first staff member is a doctor
+    else:
+        env.update(CLINIC_BACKEND="supabase", SUPABASE_URL="http://127.0.0.1:9", SUPABASE_KEY="bench-key")
+
+    results = []
+    print(f"{'mode':<14}{'imports ms':>11}{'paint ms':>10}{'login ms':>10}   loaded at paint")
+    for mode in MODES:
+        r = run_mode(mode, env, login_id, args.think_ms)
+        results.append(r)
+        login = f"{r['login_ms']:>10.1f}" if r["login_ms"] is not None else f"{'-':>10}"
+        print(f"{mode:<14}{r['import_ms']:>11.1f}{r['paint_ms']:>10.1f}{login}   "
+              f"{', '.join(m for m, loaded in r['loaded'].items() if loaded) or '-'}")
+    for r in results:
+        print(f"{r['mode']} heaviest: " + ", ".join(f"{i['module']} {i['ms']:.0f} ms" for i in r["heaviest"]))
+
+    default = next(r for r in results if r["mode"] == "lazy+prewarm")
+    over = []
+    if default["import_ms"] > args.budget_import_ms:
+        over.append(f"app imports {default['import_ms']:.0f} ms > {args.budget_import_ms:g} ms")
+    if default["paint_ms"] > args.budget_paint_ms:
+        over.append(f"first paint {default['paint_ms']:.0f} ms > {args.budget_paint_ms:g} ms")
+    profiling_error = check_profiling(env)
+    print(f"login page with the performance panel: {profiling_error or 'ok'}")
+    if profiling_error:
+        over.append(profiling_error)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"backend": args.backend, "results": results}, f, indent=2)
+        print(f"Wrote {args.output}")
+    if over:
+        print("Failed: " + "; ".join(over))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
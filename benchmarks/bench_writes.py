@@ -0,0 +1,171 @@
+"""
+A morning rush of bookings and sign-ups, written straight to the database
+on each session's thread (the default) and through clinic.writes' queue,
+on a generated SQLite clinic.
+
+    python -m benchmarks.bench_writes --sessions 32 --bookings 10 --latency 0.05 --connections 4
+
+Every session books --bookings free slots (sessions sharing a doctor are
+given different ones) and signs up one patient. Every submit is sent
+twice, as after a double click. --latency adds a simulated network round
+trip to every query, and --connections caps how many queries the
+database serves at once, as a connection pool would. For each mode it reports how long a submit blocks its
+session (median, p95 and worst), the time until every write is in the database
+(and so writes per second), the insert requests sent, and the duplicate
+patients created. Run sql/005 first; a duplicate booking is always
+stopped by the slot guard.
+"""
+
+import argparse
+import datetime
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict
+
+from clinic.cache import QueryCache
+from clinic.slots import SlotBook, SlotTaken
+from clinic.sqlite_backend import SQLiteBackend, SQLiteQuery
+from clinic.writes import WriteQueue, idempotency_key
+
+
+class QueryCounter:
+    """Counts SQLite inserts and adds a simulated round trip to every query, connections at a time."""
+
+    def __init__(self, latency: float = 0.0, connections: int = 4):
+        self.latency = latency
+        self.inserts = 0
+        self.lock = threading.Lock()
+        self.connections = threading.BoundedSemaphore(connections)
+
+    def install(self):
+        counter = self
+        execute = SQLiteQuery.execute
+
+        def counted_execute(query):
+            if query.action == "insert":
+                with counter.lock:
+                    counter.inserts += 1
+            with counter.connections:
+                if counter.latency:
+                    time.sleep(counter.latency)
+                return execute(query)
+
+        SQLiteQuery.execute = counted_execute
+
+
+def patient_row(run: str, session: int) -> dict:
+    return {"name": f"Rush {run} {session}", "phone": "555-0100", "date_of_birth": "1990-01-01"}
+
+
+def direct(db, session: int, doctor_id: int, slots: list, run: str, submits: list):
+    book = SlotBook(db, QueryCache())
+    for slot in slots:
+        for _ in range(2):
+            start = time.perf_counter()
+            try:
+                book.book(1 + session, doctor_id, 1, slot, "Rush")
+            except SlotTaken:
+                pass
+            submits.append((time.perf_counter() - start) * 1000)
+    for _ in range(2):
+        start = time.perf_counter()
+        db.table("patient").insert(patient_row(run, session)).execute()
+        submits.append((time.perf_counter() - start) * 1000)
+
+
+def queued(queue: WriteQueue, db, session: int, doctor_id: int, slots: list, run: str, submits: list,
+           jobs: list):
+    book = SlotBook(db, QueryCache())
+    nonce = uuid.uuid4().hex
+    rows = [("appointment", SlotBook.appointment_row(1 + session, doctor_id, 1, slot, "Rush")) for slot in slots]
+    rows.append(("patient", patient_row(run, session)))
+    for table_name, row in rows:
+        for _ in range(2):
+            start = time.perf_counter()
+            if table_name == "appointment":
+                book.check(doctor_id, datetime.datetime.strptime(row["appointment_datetime"], "%Y-%m-%d %H:%M:%S"))
+            jobs.append(queue.submit(table_name, row, idempotency_key(nonce, row)))
+            submits.append((time.perf_counter() - start) * 1000)
+
+
+def rush(mode: str, db, counter: QueryCounter, sessions: int, bookings: int, doctors: list, run: str,
+         queue_path: str) -> dict:
+    submits, jobs = [], []
+    day = datetime.date.today() + datetime.timedelta(days=1)
+    # Sessions sharing a doctor take turns through the doctor's free slots
+    sharing = -(-sessions // len(doctors))
+    free = {d: SlotBook(db, QueryCache()).next_slots(d, day, n=bookings * sharing) for d in doctors[:sessions]}
+    plans = [free[doctors[s % len(doctors)]][s // len(doctors)::sharing][:bookings] for s in range(sessions)]
+    queue = WriteQueue(db, queue_path) if mode == "queued" else None
+    inserts_before = counter.inserts
+    barrier = threading.Barrier(sessions)
+
+    def session(s: int):
+        barrier.wait()
+        doctor_id = doctors[s % len(doctors)]
+        if queue is None:
+            direct(db, s, doctor_id, plans[s], run, submits)
+        else:
+            queued(queue, db, s, doctor_id, plans[s], run, submits, jobs)
+
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if queue is not None:
+        failed = [job for job in queue.wait(set(jobs), timeout=600) if job is None or job["status"] != "done"]
+        if failed:
+            raise SystemExit(f"FAILED: {len(failed)} queued writes did not complete, e.g. {failed[0]}")
+    seconds = time.perf_counter() - start
+
+    with db.reader() as conn:
+        patients = conn.execute("SELECT count(*) FROM patient WHERE name LIKE ?", (f"Rush {run} %",)).fetchone()[0]
+    writes = sessions * (bookings + 1)
+    return {"submit_p50_ms": statistics.median(submits), "submit_p95_ms": statistics.quantiles(submits, n=20)[-1],
+            "submit_max_ms": max(submits),
+            "seconds": seconds, "writes_per_s": writes / seconds, "insert_requests": counter.inserts - inserts_before,
+            "duplicate_patients": patients - sessions}
+
+
+def main():
+    from benchmarks.datagen import ClinicSize, add_size_arguments, generate_clinic
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing SQLite clinic to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--bookings", type=int, default=10, help="bookings per session")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every query")
+    parser.add_argument("--connections", type=int, default=4, help="queries the database serves at once")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+        db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+        generate_clinic(SQLiteBackend(db_path), size, args.seed)
+    db = SQLiteBackend(db_path)
+    doctors = [row["doctor_id"] for row in db.table("doctor").select("doctor_id").order("doctor_id").execute().data]
+    counter = QueryCounter(args.latency, args.connections)
+    counter.install()
+    queue_dir = tempfile.mkdtemp(prefix="clinic-writes-")
+
+    print(f"{'mode':<8}{'submit p50':>12}{'p95':>8}{'max ms':>8}{'seconds':>9}{'writes/s':>10}{'inserts':>9}{'dup patients':>14}")
+    for mode in ("direct", "queued"):
+        # The second mode's sessions are offered the slots the first left free
+        r = rush(mode, db, counter, args.sessions, args.bookings, doctors, uuid.uuid4().hex[:8],
+                 os.path.join(queue_dir, "writes.db"))
+        print(f"{mode:<8}{r['submit_p50_ms']:>12.1f}{r['submit_p95_ms']:>8.1f}{r['submit_max_ms']:>8.0f}"
+              f"{r['seconds']:>9.2f}"
+              f"{r['writes_per_s']:>10.1f}{r['insert_requests']:>9}{r['duplicate_patients']:>14}")
+
+
+if __name__ == "__main__":
+    main()
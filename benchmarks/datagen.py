@@ -0,0 +1,152 @@
+"""
+Generate a synthetic clinic into a local SQLite backend.
+
+    python -m benchmarks.datagen --db /tmp/clinic.db --patients 100000 --appointments 1000000
+
+Rows are produced by generators and written in batches, so memory stays
+flat even for millions of appointments. The same seed always produces the
+same clinic.
+"""
+
+import argparse
+import datetime
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Iterator
+
+from clinic.sqlite_backend import SQLiteBackend
+
+FIRST_NAMES = ["Aarav", "Diya", "Kabir", "Anaya", "Vihaan", "Isha", "Arjun", "Meera", "Rohan", "Saanvi",
+               "Dev", "Kiara", "Aditya", "Myra", "Reyansh", "Tara", "Ishaan", "Riya", "Krish", "Zara"]
+LAST_NAMES = ["Sharma", "Verma", "Gupta", "Iyer", "Khan", "Singh", "Patel", "Reddy", "Das", "Nair",
+              "Mehta", "Joshi", "Kapoor", "Bose", "Menon"]
+SPECIALIZATIONS = ["General Medicine", "Cardiology", "Dermatology", "Orthopedics", "Pediatrics",
+                   "Neurology", "ENT", "Physiotherapy", "Nephrology"]
+DEPARTMENTS = ["OPD", "Emergency", "ICU", "Ward", "Dialysis"]
+REASONS = ["Routine check-up", "Fever and cough", "Follow-up visit", "Back pain", "Skin rash",
+           "Blood pressure review", "Physiotherapy session", "Dialysis session", "Vaccination"]
+DIAGNOSES = ["Viral fever", "Hypertension", "Lower back strain", "Dermatitis", "Type 2 diabetes", "Migraine"]
+MEDICINES = ["Paracetamol 500mg", "Amlodipine 5mg", "Ibuprofen 400mg", "Cetirizine 10mg", "Metformin 500mg"]
+
+
+@dataclass
+class ClinicSize:
+    clinics: int = 3
+    doctors: int = 40
+    nurses: int = 60
+    patients: int = 10000
+    appointments: int = 100000
+    prescriptions: int = 60000
+    payments: int = 80000
+
+
+def name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def staff_rows(size: ClinicSize, rng: random.Random) -> Iterator[dict]:
+    for staff_id in range(1, size.doctors + size.nurses + 1):
+        is_doctor = staff_id <= size.doctors
+        yield {"staff_id": staff_id, "name": name(rng), "email": f"staff{staff_id}@clinic.test",
+               "phone": f"98{rng.randint(10000000, 99999999)}", "address": f"{staff_id} Staff Quarters",
+               "staff_type": "Doctor" if is_doctor else "Nurse"}
+
+
+def patient_rows(size: ClinicSize, rng: random.Random) -> Iterator[dict]:
+    for patient_id in range(1, size.patients + 1):
+        dob = datetime.date(1940, 1, 1) + datetime.timedelta(days=rng.randint(0, 30000))
+        yield {"patient_id": patient_id, "name": name(rng), "email": f"patient{patient_id}@mail.test",
+               "phone": f"97{rng.randint(10000000, 99999999)}", "date_of_birth": dob.isoformat(),
+               "gender": rng.choice(["Male", "Female", "Other"]),
+               "address": f"{rng.randint(1, 999)} {rng.choice(LAST_NAMES)} Nagar"}
+
+
+def appointment_rows(size: ClinicSize, rng: random.Random, today: datetime.date) -> Iterator[dict]:
+    # Two years of history plus two months of upcoming bookings, in 15-minute
+    # slots. Slots are drawn without replacement so no doctor is double-booked
+    # (the appointment_slot_guard index would reject it).
+    days, slots_per_day = 791, 36
+    start = datetime.datetime.combine(today - datetime.timedelta(days=730), datetime.time(9, 0))
+    per_doctor = days * slots_per_day
+    if size.appointments > size.doctors * per_doctor:
+        raise ValueError(f"{size.appointments:,} appointments don't fit in {size.doctors} doctors' calendars; "
+                         f"add doctors or reduce appointments")
+    for appointment_id, slot in enumerate(rng.sample(range(size.doctors * per_doctor), size.appointments), 1):
+        doctor_index, slot = divmod(slot, per_doctor)
+        day, minute_slot = divmod(slot, slots_per_day)
+        when = start + datetime.timedelta(days=day, minutes=15 * minute_slot)
+        if when.date() >= today:
+            status = "Cancelled" if rng.random() < 0.05 else "Booked"
+        else:
+            status = "Cancelled" if rng.random() < 0.08 else "Completed"
+        yield {"appointment_id": appointment_id, "patient_id": rng.randint(1, size.patients),
+               "doctor_id": doctor_index + 1, "clinic_id": rng.randint(1, size.clinics),
+               "appointment_datetime": when.strftime("%Y-%m-%d %H:%M:%S"), "status": status,
+               "reason": rng.choice(REASONS), "priority": rng.choice(["Low", "Medium", "Medium", "High"])}
+
+
+def prescription_rows(size: ClinicSize, rng: random.Random, today: datetime.date) -> Iterator[dict]:
+    for prescription_id in range(1, size.prescriptions + 1):
+        yield {"prescription_id": prescription_id, "appointment_id": rng.randint(1, size.appointments),
+               "diagnosis": rng.choice(DIAGNOSES), "medicines": ", ".join(rng.sample(MEDICINES, 2)),
+               "advice": "Rest and plenty of fluids",
+               "prescription_date": (today - datetime.timedelta(days=rng.randint(0, 730))).isoformat()}
+
+
+def payment_rows(size: ClinicSize, rng: random.Random, today: datetime.date) -> Iterator[dict]:
+    # payment.appointment_id is unique, so pay for a random subset of appointments
+    for payment_id, appointment_id in enumerate(sorted(rng.sample(range(1, size.appointments + 1),
+                                                                  min(size.payments, size.appointments))), 1):
+        paid_on = today - datetime.timedelta(days=rng.randint(0, 730))
+        yield {"payment_id": payment_id, "appointment_id": appointment_id,
+               "amount": round(rng.uniform(200, 5000), 2),
+               "payment_method": rng.choice(["Cash", "Card", "UPI", "Insurance"]),
+               "payment_status": rng.choice(["Paid", "Paid", "Paid", "Pending", "Failed"]),
+               "payment_date": paid_on.isoformat()}
+
+
+def generate_clinic(backend: SQLiteBackend, size: ClinicSize, seed: int = 42,
+                    today: datetime.date = None) -> dict:
+    """Fill an empty backend with a synthetic clinic. Returns rows written per table."""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    written = {
+        "clinic": backend.bulk_insert("clinic", ({"clinic_id": i, "name": f"Clinic {i}", "address": f"{i} Main Road"}
+                                                 for i in range(1, size.clinics + 1))),
+        "staff": backend.bulk_insert("staff", staff_rows(size, rng)),
+        "doctor": backend.bulk_insert("doctor", ({"doctor_id": i, "specialization": rng.choice(SPECIALIZATIONS),
+                                                  "pstart": "2015-06-01"} for i in range(1, size.doctors + 1))),
+        "nurse": backend.bulk_insert("nurse", ({"nurse_id": i, "department": rng.choice(DEPARTMENTS),
+                                                "shift_type": rng.choice(["Morning", "Evening", "Night"])}
+                                               for i in range(size.doctors + 1, size.doctors + size.nurses + 1))),
+        "patient": backend.bulk_insert("patient", patient_rows(size, rng)),
+        "appointment": backend.bulk_insert("appointment", appointment_rows(size, rng, today)),
+        "prescription": backend.bulk_insert("prescription", prescription_rows(size, rng, today)),
+        "payment": backend.bulk_insert("payment", payment_rows(size, rng, today)),
+    }
+    return written
+
+
+def add_size_arguments(parser: argparse.ArgumentParser):
+    for field, default in asdict(ClinicSize()).items():
+        parser.add_argument(f"--{field}", type=int, default=default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="SQLite file to create (must not already hold data)")
+    parser.add_argument("--seed", type=int, default=42)
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    size = ClinicSize(**{k: getattr(args, k) for k in asdict(ClinicSize())})
+    start = time.perf_counter()
+    written = generate_clinic(SQLiteBackend(args.db), size, args.seed)
+    print(f"Wrote {sum(written.values()):,} rows to {args.db} in {time.perf_counter() - start:.1f}s")
+    for table_name, rows in written.items():
+        print(f"  {table_name:<14}{rows:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+An in-memory stand-in for the Supabase client with simulated network latency.
+
+Supports the subset of the query builder used by the login path:
+table().select(columns).eq(column, value).limit(n).execute(), including
+one level of embedded resources such as "doctor_id, staff(name)".
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+# (table, embedded table) -> (local column, remote column)
+RELATIONS = {
+    ("doctor", "staff"): ("doctor_id", "staff_id"),
+    ("nurse", "staff"): ("nurse_id", "staff_id"),
+}
+
+EMBED_RE = re.compile(r"(\w+)\(([^)]*)\)")
+
+
+class FakeClient:
+    def __init__(self, tables: Dict[str, List[dict]], latency: float = 0.02):
+        self.tables = tables
+        self.latency = latency
+        self.requests = 0
+        # Requests per distinct query, for checking coalescing
+        self.requests_by_query: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> "FakeQuery":
+        return FakeQuery(self, name)
+
+
+class FakeQuery:
+    def __init__(self, client: FakeClient, table_name: str):
+        self.client = client
+        self.table_name = table_name
+        self.columns = "*"
+        self.filters: List[Tuple[str, object]] = []
+        self.max_rows = None
+
+    def select(self, columns: str = "*", **kwargs) -> "FakeQuery":
+        self.columns = columns
+        return self
+
+    def eq(self, column: str, value) -> "FakeQuery":
+        self.filters.append((column, value))
+        return self
+
+    def limit(self, n: int) -> "FakeQuery":
+        self.max_rows = n
+        return self
+
+    def _project(self, row: dict) -> dict:
+        if self.columns.strip() == "*":
+            return dict(row)
+        out = {}
+        for embed_table, embed_cols in EMBED_RE.findall(self.columns):
+            local, remote = RELATIONS[(self.table_name, embed_table)]
+            match = next((r for r in self.client.tables[embed_table] if r[remote] == row[local]), None)
+            out[embed_table] = {c.strip(): match[c.strip()] for c in embed_cols.split(",")} if match else None
+        for col in EMBED_RE.sub("", self.columns).split(","):
+            if col.strip():
+                out[col.strip()] = row[col.strip()]
+        return out
+
+    def execute(self) -> SimpleNamespace:
+        with self.client.lock:
+            self.client.requests += 1
+            self.client.requests_by_query[(self.table_name, self.columns, tuple(self.filters))] += 1
+        time.sleep(self.client.latency)
+        rows = [r for r in self.client.tables[self.table_name]
+                if all(r.get(c) == v for c, v in self.filters)]
+        if self.max_rows is not None:
+            rows = rows[:self.max_rows]
+        return SimpleNamespace(data=[self._project(r) for r in rows], count=None)
@@ -0,0 +1 @@
+"""Data access helpers shared by the Streamlit frontend in app.py."""
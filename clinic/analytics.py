@@ -0,0 +1,197 @@
+"""
+Appointment and payment analytics for the doctor and nurse dashboards.
+
+Reads per-doctor views over the trigger-maintained daily aggregate tables
+(sql/003_daily_aggregates.sql, mirrored by the SQLite backend): one row
+per period, doctor and status for appointments, and per period, doctor and
+payment status for payments. A period is a day, or a month for long
+ranges, so a doctor's month is a few hundred rows and the whole clinic's
+year a couple of thousand, against every appointment and payment behind
+them.
+
+Where the views are missing (a Supabase project without the migration),
+the same frames are built from the raw tables with a vectorized pandas
+groupby, so the tab works everywhere and only gets slower. Every result is
+cached under the base table it summarises, so bookings and cancellations
+invalidate it.
+"""
+
+import datetime
+from typing import Callable, Optional
+
+import pandas as pd
+
+from clinic.repository import PROJECTIONS, ClinicRepository, QueryResult, describe_query_error, is_cacheable
+
+APPOINTMENT_KEYS = ["period", "doctor_id", "status"]
+PAYMENT_KEYS = ["period", "doctor_id", "payment_status"]
+STATUSES = ["Booked", "Completed", "Cancelled"]
+
+# Length of one period of each grain
+GRAINS = {"day": pd.offsets.Day(), "month": pd.offsets.MonthBegin()}
+
+
+def period_start(values: pd.Series, grain: str) -> pd.Series:
+    stamps = pd.to_datetime(values)
+    return stamps.dt.normalize() if grain == "day" else stamps.dt.to_period("M").dt.to_timestamp()
+
+
+def first_period(since: datetime.date, grain: str) -> datetime.date:
+    """The start of the period containing since."""
+    return since if grain == "day" else since.replace(day=1)
+
+
+# --- Fallbacks: the views computed from raw rows ---
+
+def aggregate_appointments(raw: pd.DataFrame, grain: str = "day") -> pd.DataFrame:
+    """appointment rows (PROJECTIONS["appointment_facts"]) -> appointment_doctor_{grain} rows."""
+    keys = pd.DataFrame({
+        "period": period_start(raw["appointment_datetime"], grain),
+        "doctor_id": raw["doctor_id"].fillna(0).astype("Int64"),
+        "status": raw["status"].astype("string").fillna("Unknown").astype("category"),
+    })
+    return (keys.dropna(subset=["period"]).groupby(APPOINTMENT_KEYS, observed=True).size()
+            .rename("appointments").astype("Int64").reset_index())
+
+
+def aggregate_payments(raw: pd.DataFrame, grain: str = "day") -> pd.DataFrame:
+    """payment rows with their embedded appointment (PROJECTIONS["payment_facts"]) -> payment_doctor_{grain} rows."""
+    keys = pd.DataFrame({
+        "period": period_start(raw["payment_date"], grain),
+        "doctor_id": pd.to_numeric(raw["appointment"].str.get("doctor_id")).fillna(0).astype("Int64"),
+        "payment_status": raw["payment_status"].astype("string").fillna("Unknown").astype("category"),
+        "amount": pd.to_numeric(raw["amount"]).fillna(0.0),
+    })
+    grouped = keys.dropna(subset=["period"]).groupby(PAYMENT_KEYS, observed=True)["amount"]
+    return grouped.agg(payments="size", amount="sum").astype({"payments": "Int64"}).reset_index()
+
+
+# --- Summaries of the aggregate frames ---
+
+def past_periods(counts: pd.DataFrame, grain: str, today: datetime.date) -> pd.DataFrame:
+    """Rows for periods that ended before today."""
+    return counts[counts["period"] + GRAINS[grain] <= pd.Timestamp(today)]
+
+
+def status_counts(counts: pd.DataFrame) -> pd.DataFrame:
+    """Appointments per period (index) and status (columns)."""
+    table = counts.pivot_table(index="period", columns="status", values="appointments",
+                               aggfunc="sum", fill_value=0, observed=True)
+    return table.reindex(columns=[s for s in STATUSES if s in table.columns]).astype("int64")
+
+
+def revenue(payments: pd.DataFrame) -> pd.Series:
+    """Amount paid per period."""
+    paid = payments[payments["payment_status"] == "Paid"]
+    return paid.groupby("period")["amount"].sum().rename("Revenue")
+
+
+def doctor_breakdown(counts: pd.DataFrame, payments: pd.DataFrame, grain: str,
+                     today: datetime.date) -> pd.DataFrame:
+    """Per doctor: appointments by status, no-shows, rates and revenue."""
+    by_status = counts.pivot_table(index="doctor_id", columns="status", values="appointments",
+                                   aggfunc="sum", fill_value=0, observed=True)
+    by_status = by_status.reindex(columns=STATUSES, fill_value=0)
+    past = past_periods(counts, grain, today)
+    no_shows = past[past["status"] == "Booked"].groupby("doctor_id")["appointments"].sum()
+    paid = payments[payments["payment_status"] == "Paid"].groupby("doctor_id")["amount"].sum()
+
+    table = by_status.assign(
+        Total=by_status.sum(axis=1),
+        **{"No-shows": no_shows.reindex(by_status.index, fill_value=0)},
+    )
+    attended = table["Completed"] + table["No-shows"]
+    table["Cancellation rate"] = (table["Cancelled"] / table["Total"].where(table["Total"] > 0)).round(3)
+    table["No-show rate"] = (table["No-shows"] / attended.where(attended > 0)).round(3)
+    table["Revenue"] = paid.reindex(table.index, fill_value=0.0).round(2)
+    return table.reset_index()
+
+
+def summary(counts: pd.DataFrame, payments: pd.DataFrame, grain: str, today: datetime.date) -> dict:
+    """
+    Headline numbers for the range. A no-show is an appointment still Booked
+    in a period that has ended, i.e. never marked Completed; the rate is
+    over those periods' appointments that weren't cancelled.
+    """
+    total = int(counts["appointments"].sum())
+    by_status = counts.groupby("status", observed=True)["appointments"].sum()
+    past_by_status = past_periods(counts, grain, today).groupby("status", observed=True)["appointments"].sum()
+    no_shows = int(past_by_status.get("Booked", 0))
+    attended = int(past_by_status.get("Completed", 0)) + no_shows
+    paid = payments[payments["payment_status"] == "Paid"]
+    pending = payments[payments["payment_status"] == "Pending"]
+    return {
+        "appointments": total,
+        "completed": int(by_status.get("Completed", 0)),
+        "cancellation_rate": int(by_status.get("Cancelled", 0)) / total if total else None,
+        "no_shows": no_shows,
+        "no_show_rate": no_shows / attended if attended else None,
+        "revenue": float(paid["amount"].sum()),
+        "pending": float(pending["amount"].sum()),
+    }
+
+
+class Analytics:
+    """
+    Aggregates for a doctor (doctor_id) or the whole clinic (None), for the
+    periods from the one containing since onwards.
+    """
+
+    def __init__(self, repo: ClinicRepository):
+        self.repo = repo
+        # Aggregate views that don't exist here; read the base table instead
+        self.missing = set()
+
+    def load(self, key: tuple, fetch: Callable[[], pd.DataFrame], depends_on=()) -> QueryResult:
+        table_name = key[0]
+
+        def run():
+            try:
+                df = fetch()
+            except Exception as e:
+                return None, describe_query_error(table_name, e)
+            if df.empty:
+                return None, f"No data found in {table_name} table."
+            return df, None
+
+        return self.repo.cache.get_or_load(key, run, depends_on, cacheable=is_cacheable)
+
+    def aggregate(self, view: str, keys: list, base_table: str, since: datetime.date, doctor_id: Optional[int],
+                  fallback: Callable[[], pd.DataFrame], depends_on=()) -> QueryResult:
+        since_text = since.isoformat()
+        if view not in self.missing:
+            df, error = self.load(
+                (base_table, view, since_text, doctor_id),
+                lambda: self.repo.fetch_all(view, keys, PROJECTIONS[view],
+                                            "doctor_id", doctor_id, gte=("period", since_text)),
+                depends_on,
+            )
+            if df is not None or not (error and "does not exist" in error):
+                return df, error
+            self.missing.add(view)
+        return self.load((base_table, f"{view}_fallback", since_text, doctor_id), fallback, depends_on)
+
+    def appointment_counts(self, since: datetime.date, doctor_id: Optional[int] = None,
+                           grain: str = "day") -> QueryResult:
+        since = first_period(since, grain)
+
+        def fallback():
+            raw = self.repo.fetch_all("appointment", "appointment_id", PROJECTIONS["appointment_facts"],
+                                      "doctor_id", doctor_id, gte=("appointment_datetime", since.isoformat()))
+            return aggregate_appointments(raw, grain) if not raw.empty else raw
+
+        return self.aggregate(f"appointment_doctor_{grain}", APPOINTMENT_KEYS, "appointment", since, doctor_id,
+                              fallback)
+
+    def payment_totals(self, since: datetime.date, doctor_id: Optional[int] = None,
+                       grain: str = "day") -> QueryResult:
+        since = first_period(since, grain)
+
+        def fallback():
+            raw = self.repo.fetch_all("payment", "payment_id", PROJECTIONS["payment_facts"],
+                                      "appointment.doctor_id", doctor_id, gte=("payment_date", since.isoformat()))
+            return aggregate_payments(raw, grain) if not raw.empty else raw
+
+        # Payments are attributed through their appointment, so both tables invalidate them
+        return self.aggregate(f"payment_doctor_{grain}", PAYMENT_KEYS, "payment", since, doctor_id, fallback,
+                              depends_on=["appointment"])
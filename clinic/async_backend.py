@@ -0,0 +1,230 @@
+"""
+Supabase access through the async client, behind the same synchronous
+query-builder interface as the other backends (clinic.backend).
+
+The script thread still calls .execute() and blocks, but the request runs
+on one event loop per process over a shared, tuned HTTP connection pool
+(keep-alive, HTTP/2 when the h2 package is installed). On top of that:
+
+- Coalescing: identical reads already in flight share one request, so a
+  burst of sessions loading the same dashboard costs one round trip.
+- Retry: transient failures (timeouts, dropped connections, 5xx gateway
+  errors, PostgREST pool errors) are retried with capped, full-jitter
+  exponential backoff. Writes are retried only when the request never
+  reached the server (connect errors), so an insert is never sent twice.
+- Timeouts: each call has a total time budget covering its retries, set
+  per backend and overridable around any block of calls with
+  call_timeout(). A call that runs out raises QueryTimeout.
+
+Selected with CLINIC_BACKEND=supabase-async.
+"""
+
+import asyncio
+import contextvars
+import importlib.util
+import random
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+WRITE_METHODS = {"insert", "update", "upsert", "delete"}
+
+# PostgREST codes for a database it couldn't reach or get a pooled
+# connection for, and Postgres codes for conflicts that succeed on retry
+TRANSIENT_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "40001", "40P01"}
+TRANSIENT_STATUSES = {500, 502, 503, 504, 520, 522, 524}
+
+
+class QueryTimeout(TimeoutError):
+    pass
+
+
+def is_transient(e: Exception) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, QueryTimeout)):
+        return True
+    try:
+        import httpx
+        if isinstance(e, (httpx.TimeoutException, httpx.TransportError)):
+            return True
+    except ImportError:
+        pass
+    code = getattr(e, "code", None)
+    if code in TRANSIENT_CODES:
+        return True
+    try:
+        return int(code) in TRANSIENT_STATUSES
+    except (TypeError, ValueError):
+        return False
+
+
+def never_sent(e: Exception) -> bool:
+    """True if the request failed before reaching the server, so even a write is safe to resend."""
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+async def connect_supabase(url: str, key: str, timeout: float = 10.0, max_connections: int = 20):
+    """An async Supabase client on a keep-alive connection pool, HTTP/2 when available."""
+    import httpx
+    from supabase import AsyncClientOptions, acreate_client
+
+    http_client = httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                            keepalive_expiry=60),
+        # The per-call budget is enforced by AsyncBackend; this only bounds a
+        # single attempt in case the budget is raised above it
+        timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+        follow_redirects=True,
+    )
+    return await acreate_client(url, key, options=AsyncClientOptions(httpx_client=http_client,
+                                                                      postgrest_client_timeout=timeout))
+
+
+class AsyncQuery:
+    """Records builder calls; execute() replays them on the async client."""
+
+    def __init__(self, backend: "AsyncBackend", table_name: str):
+        self._backend = backend
+        self._table_name = table_name
+        self._calls: List[Tuple[str, tuple, tuple]] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self._calls.append((name, args, tuple(sorted(kwargs.items()))))
+            return self
+
+        return call
+
+    def execute(self):
+        return self._backend.run(self._table_name, self._calls)
+
+
+class AsyncBackend:
+    """
+    Runs queries on an async client from synchronous callers. Thread-safe;
+    one instance per server process.
+
+    connect is a coroutine function returning the async client; it runs
+    once, on the backend's own event loop.
+    """
+
+    def __init__(self, connect: Callable[[], Awaitable[Any]], timeout: float = 10.0, retries: int = 2,
+                 backoff: float = 0.1, max_backoff: float = 2.0, coalesce: bool = True):
+        self.default_timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+        self.timeout_override: contextvars.ContextVar = contextvars.ContextVar("clinic_call_timeout",
+                                                                               default=None)
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True, name="clinic-async-db")
+        self.thread.start()
+        self.client = asyncio.run_coroutine_threadsafe(connect(), self.loop).result()
+
+        # Reentrant: a future that is already done runs forget() inside run()'s lock
+        self.lock = threading.RLock()
+        self.in_flight: Dict[tuple, Future] = {}
+        self.counters = {"requests": 0, "coalesced": 0, "retries": 0, "timeouts": 0, "failures": 0}
+
+    def table(self, table_name: str) -> AsyncQuery:
+        return AsyncQuery(self, table_name)
+
+    @contextmanager
+    def call_timeout(self, seconds: float):
+        """Give calls made inside the block (and loader tasks it starts) a different time budget."""
+        token = self.timeout_override.set(seconds)
+        try:
+            yield
+        finally:
+            self.timeout_override.reset(token)
+
+    def run(self, table_name: str, calls: List[Tuple[str, tuple, tuple]]):
+        timeout = self.timeout_override.get() or self.default_timeout
+        is_write = any(name in WRITE_METHODS for name, _, _ in calls)
+        if is_write or not self.coalesce:
+            return self.submit(table_name, calls, is_write, timeout).result()
+
+        key = (table_name, repr(calls))
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+            else:
+                future = self.submit(table_name, calls, is_write, timeout)
+                self.in_flight[key] = future
+                future.add_done_callback(lambda _: self.forget(key, future))
+        # Every waiter gets the same response: callers must not modify .data in place
+        return future.result()
+
+    def forget(self, key: tuple, future: Future):
+        with self.lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    def submit(self, table_name: str, calls: list, is_write: bool, timeout: float) -> Future:
+        with self.lock:
+            self.counters["requests"] += 1
+        return asyncio.run_coroutine_threadsafe(self.execute_with_retry(table_name, calls, is_write, timeout),
+                                                self.loop)
+
+    def build(self, table_name: str, calls: list):
+        builder = self.client.table(table_name)
+        for name, args, kwargs in calls:
+            builder = getattr(builder, name)(*args, **dict(kwargs))
+        if hasattr(builder, "retry"):
+            # postgrest retries some 503s itself without jitter or a bound
+            # that fits our budget; this class owns the retry policy
+            builder = builder.retry(False)
+        return builder
+
+    async def execute_with_retry(self, table_name: str, calls: list, is_write: bool, timeout: float):
+        deadline = self.loop.time() + timeout
+        attempt = 0
+        while True:
+            remaining = deadline - self.loop.time()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                return await asyncio.wait_for(self.build(table_name, calls).execute(), remaining)
+            except Exception as e:
+                retryable = never_sent(e) if is_write else is_transient(e)
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if not retryable or attempt >= self.retries or self.loop.time() + delay >= deadline:
+                    timed_out = isinstance(e, asyncio.TimeoutError)
+                    with self.lock:
+                        self.counters["timeouts" if timed_out else "failures"] += 1
+                    if timed_out:
+                        raise QueryTimeout(f"Query on {table_name} timed out after {timeout:g}s "
+                                           f"({attempt + 1} attempt{'s' if attempt else ''})") from None
+                    raise
+                with self.lock:
+                    self.counters["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {**self.counters, "in_flight": len(self.in_flight), "timeout_s": self.default_timeout,
+                    "max_retries": self.retries}
+
+    def close(self):
+        async def shutdown():
+            for name in ("postgrest", "_postgrest"):
+                session = getattr(getattr(self.client, name, None), "session", None)
+                if session is not None:
+                    await session.aclose()
+                    break
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,66 @@
+"""Login lookups: resolve a position + ID to a display name in one query."""
+
+from typing import Optional, Tuple
+
+from clinic.cache import QueryCache
+
+# position -> (table, id column, select with the display name embedded).
+# Doctor and nurse names live on staff; PostgREST follows the
+# doctor_id/nurse_id -> staff.staff_id foreign key for the embed.
+LOGIN_TABLES = {
+    "Doctor": ("doctor", "doctor_id", "doctor_id, staff(name)"),
+    "Nurse": ("nurse", "nurse_id", "nurse_id, staff(name)"),
+    "Patient": ("patient", "patient_id", "patient_id, name"),
+}
+
+
+def display_name(row: dict) -> Optional[str]:
+    if "name" in row:
+        return row["name"]
+    staff = row.get("staff")
+    if isinstance(staff, list):
+        staff = staff[0] if staff else None
+    return staff.get("name") if staff else None
+
+
+class LoginResolver:
+    """
+    Looks up who is logging in with a single round trip per attempt.
+
+    IDs that don't exist are remembered for negative_ttl seconds so repeated
+    bad logins are answered without touching the database.
+    """
+
+    def __init__(self, client, negative_ttl: float = 30.0, max_entries: int = 4096):
+        self.client = client
+        self.unknown_ids = QueryCache(max_entries=max_entries, default_ttl=negative_ttl)
+
+    def resolve(self, position: str, user_id: int) -> Tuple[Optional[str], Optional[str]]:
+        """Return (display name, None) on success or (None, error message)."""
+        if position not in LOGIN_TABLES:
+            return None, f"Unknown position '{position}'."
+        table_name, id_column, columns = LOGIN_TABLES[position]
+
+        cache_key = (table_name, user_id)
+        found, error = self.unknown_ids.get(cache_key)
+        if found:
+            return None, error
+
+        try:
+            response = self.client.table(table_name).select(columns).eq(id_column, user_id).limit(1).execute()
+        except Exception as e:
+            return None, f"Database connection error: {str(e)}"
+
+        if not response.data:
+            error = f"No {position.lower()} found with ID '{user_id}' in column '{id_column}'."
+            self.unknown_ids.set(cache_key, error)
+            return None, error
+
+        name = display_name(response.data[0])
+        if not name:
+            return None, f"{position} ID '{user_id}' found, but no matching 'staff' record exists to get name."
+        return name, None
+
+    def forget(self, table_name: str):
+        """Drop negative entries for a table, e.g. after new patients sign up."""
+        self.unknown_ids.invalidate(table_name)
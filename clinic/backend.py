@@ -0,0 +1,133 @@
+"""
+Storage backends.
+
+The app talks to its database through the Supabase client's query builder
+(client.table(name).select(...).eq(...).execute()). Any object with the
+same shape can stand in for it; the Protocols below spell out the subset
+the app relies on. Two implementations exist:
+
+- "supabase": the real supabase-py client (default).
+- "supabase-async": clinic.async_backend.AsyncBackend, the async client
+  behind the same interface, with a pooled HTTP/2 connection, coalescing
+  of identical in-flight reads, retry with backoff and per-call timeouts.
+- "sqlite": clinic.sqlite_backend.SQLiteBackend, a local engine with the
+  same schema for offline development, load tests and benchmarks.
+
+DeferredBackend wraps any of them so the client library is only imported
+and the client built on first use, or ahead of it on a background thread.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, List, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class Response(Protocol):
+    data: List[dict]
+    count: Optional[int]
+
+
+class QueryBuilder(Protocol):
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None) -> "QueryBuilder": ...
+    def insert(self, json: Any, **kwargs) -> "QueryBuilder": ...
+    def update(self, json: dict, **kwargs) -> "QueryBuilder": ...
+    def eq(self, column: str, value: Any) -> "QueryBuilder": ...
+    def neq(self, column: str, value: Any) -> "QueryBuilder": ...
+    def gt(self, column: str, value: Any) -> "QueryBuilder": ...
+    def gte(self, column: str, value: Any) -> "QueryBuilder": ...
+    def lt(self, column: str, value: Any) -> "QueryBuilder": ...
+    def lte(self, column: str, value: Any) -> "QueryBuilder": ...
+    def in_(self, column: str, values: list) -> "QueryBuilder": ...
+    def order(self, column: str, *, desc: bool = False) -> "QueryBuilder": ...
+    def limit(self, size: int) -> "QueryBuilder": ...
+    def range(self, start: int, end: int) -> "QueryBuilder": ...
+    def execute(self) -> Response: ...
+
+
+class Backend(Protocol):
+    def table(self, table_name: str) -> QueryBuilder: ...
+
+
+BACKENDS = ("supabase", "supabase-async", "sqlite")
+
+
+def create_backend(kind: str = "supabase", url: Optional[str] = None, key: Optional[str] = None,
+                   sqlite_path: str = "clinic.db", timeout: float = 10.0, retries: int = 2,
+                   max_connections: int = 20) -> Backend:
+    """
+    Build the backend named by kind. Imports are deferred so each only loads
+    its own dependencies. timeout, retries and max_connections only apply to
+    supabase-async.
+    """
+    check_backend(kind, url, key)
+    if kind == "supabase":
+        from supabase import create_client
+        return create_client(url, key)
+    if kind == "supabase-async":
+        from clinic.async_backend import AsyncBackend, connect_supabase
+        return AsyncBackend(lambda: connect_supabase(url, key, timeout, max_connections),
+                            timeout=timeout, retries=retries)
+    from clinic.sqlite_backend import SQLiteBackend
+    return SQLiteBackend(sqlite_path)
+
+
+def check_backend(kind: str, url: Optional[str] = None, key: Optional[str] = None):
+    """Raise the ValueError create_backend would, without importing or building anything."""
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown backend '{kind}'. Expected one of: {', '.join(BACKENDS)}.")
+    if kind in ("supabase", "supabase-async") and (not url or not key):
+        raise ValueError("Supabase credentials not found. Please configure SUPABASE_URL and SUPABASE_KEY.")
+
+
+class DeferredBackend:
+    """
+    A backend built by build() on first use rather than up front, so a page
+    that makes no queries (the login form) doesn't wait for the client
+    library to import. prewarm() starts the build on a background thread;
+    callers arriving while it runs wait for it instead of building their own.
+    A failed build is retried on the next use.
+    """
+
+    def __init__(self, build: Callable[[], Backend]):
+        self._build = build
+        self._backend: Optional[Backend] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._backend is not None
+
+    def get(self) -> Backend:
+        backend = self._backend
+        if backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._build()
+                backend = self._backend
+        return backend
+
+    def prewarm(self) -> Optional[threading.Thread]:
+        """Build in the background unless already built; returns the thread."""
+        if self.ready:
+            return None
+        thread = threading.Thread(target=self._prewarm, name="clinic-backend-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def _prewarm(self):
+        try:
+            self.get()
+        except Exception:
+            # The first real use raises it again, where it can be shown
+            logger.exception("Background backend build failed")
+
+    def table(self, table_name: str) -> QueryBuilder:
+        return self.get().table(table_name)
+
+    def __getattr__(self, name: str):
+        # Anything beyond table() (bulk_insert, stats, close...) goes to the built backend
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
@@ -0,0 +1,192 @@
+"""
+Bulk appointment booking from a CSV file or a recurrence rule.
+
+A batch is normalised into one DataFrame, validated in a single vectorized
+pass (types, slot grid, past dates, unknown patients/doctors, clashes within
+the batch and with live bookings, fetched with one chunked query per table)
+and then inserted in multi-row requests of batch_size rows. A multi-row
+insert is all-or-nothing, so a batch that fails, e.g. because a slot was
+taken after validation, is retried row by row to pin the error on the rows
+that caused it. Every rejected row keeps its CSV line number and a reason.
+"""
+
+import datetime
+from typing import Iterable, Optional, Tuple
+
+import pandas as pd
+
+from clinic.repository import FETCH_PAGE_SIZE, IN_CHUNK_SIZE
+from clinic.slots import DAY_END, DAY_START, SLOT_FORMAT, SLOT_MINUTES, is_conflict, slot_now
+
+REQUIRED_COLUMNS = ("patient_id", "appointment_datetime")
+CSV_COLUMNS = ["patient_id", "doctor_id", "clinic_id", "appointment_datetime", "reason", "priority"]
+PRIORITIES = ("Low", "Medium", "High")
+DEFAULT_BATCH_SIZE = 500
+
+
+def read_csv(source) -> pd.DataFrame:
+    df = pd.read_csv(source, dtype=str, keep_default_na=False, skipinitialspace=True)
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
+
+
+def recurrence(patient_id: int, doctor_id: int, start_date: datetime.date, end_date: datetime.date,
+               at: datetime.time, weekdays: Iterable[int], reason: str = "", priority: str = "Medium",
+               clinic_id: int = 1) -> pd.DataFrame:
+    """One row per matching weekday (0 = Monday) from start_date to end_date inclusive."""
+    days = pd.date_range(start_date, end_date, freq="D")
+    days = days[days.weekday.isin(list(weekdays))]
+    return pd.DataFrame({
+        "patient_id": patient_id,
+        "doctor_id": doctor_id,
+        "clinic_id": clinic_id,
+        "appointment_datetime": days + pd.Timedelta(hours=at.hour, minutes=at.minute),
+        "reason": reason,
+        "priority": priority,
+    })
+
+
+def normalise(df: pd.DataFrame, default_doctor_id: Optional[int] = None, default_clinic_id: int = 1) -> pd.DataFrame:
+    """Coerce a raw batch to typed columns plus an "error" column. Raises ValueError for missing columns."""
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if "doctor_id" not in df.columns and default_doctor_id is None:
+        missing.append("doctor_id")
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}. Expected: {', '.join(CSV_COLUMNS)}.")
+
+    def ids(column: str, default: Optional[int]) -> pd.Series:
+        raw = df[column] if column in df.columns else pd.Series(default, index=df.index)
+        raw = raw.replace("", default) if default is not None else raw
+        return pd.to_numeric(raw, errors="coerce").astype("Float64").round().astype("Int64")
+
+    out = pd.DataFrame({
+        # Line numbers as shown in a spreadsheet: header is line 1
+        "line": df.index + 2,
+        "patient_id": ids("patient_id", None),
+        "doctor_id": ids("doctor_id", default_doctor_id),
+        "clinic_id": ids("clinic_id", default_clinic_id),
+        "slot": pd.to_datetime(df["appointment_datetime"], errors="coerce", format="mixed"),
+        "reason": df["reason"].astype(str) if "reason" in df.columns else "",
+        "priority": df["priority"].replace("", "Medium") if "priority" in df.columns else "Medium",
+    }, index=df.index)
+    out["error"] = pd.Series(None, index=df.index, dtype=object)
+    return out
+
+
+def flag(batch: pd.DataFrame, mask: pd.Series, message: str):
+    """Set message on rows matching mask that don't already have an error."""
+    batch.loc[mask & batch["error"].isna(), "error"] = message
+
+
+def unique_ids(ids: pd.Series) -> list:
+    # Plain ints, so the list serialises to JSON for PostgREST
+    return [int(v) for v in ids.dropna().unique()]
+
+
+def fetch_in(client, table_name: str, column: str, values: list, columns: str, build=None,
+             order_by: Optional[str] = None) -> pd.DataFrame:
+    """
+    Uncached in_ lookup, chunked like ClinicRepository.query_in and paged
+    like ClinicRepository.fetch_all, so no chunk is cut off at PostgREST's
+    max-rows. order_by must make the order unique (default: column).
+    """
+    rows = []
+    for i in range(0, len(values), IN_CHUNK_SIZE):
+        start = 0
+        while True:
+            query = client.table(table_name).select(columns).in_(column, values[i:i + IN_CHUNK_SIZE])
+            query = (build(query) if build else query).order(order_by or column)
+            page = query.range(start, start + FETCH_PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < FETCH_PAGE_SIZE:
+                break
+            start += FETCH_PAGE_SIZE
+    return pd.DataFrame(rows, columns=[c.strip() for c in columns.split(",")])
+
+
+def validate(client, batch: pd.DataFrame, now: Optional[datetime.datetime] = None) -> pd.DataFrame:
+    """Fill batch["error"] for every row that can't be booked. Modifies and returns batch."""
+    now = now or slot_now()
+    slot = batch["slot"]
+    minutes = slot.dt.hour * 60 + slot.dt.minute
+    start = DAY_START.hour * 60 + DAY_START.minute
+    end = DAY_END.hour * 60 + DAY_END.minute
+
+    flag(batch, batch["patient_id"].isna(), "patient_id is not a number")
+    flag(batch, batch["doctor_id"].isna(), "doctor_id is not a number")
+    flag(batch, batch["clinic_id"].isna(), "clinic_id is not a number")
+    flag(batch, slot.isna(), "appointment_datetime is not a date and time")
+    flag(batch, slot <= pd.Timestamp(now), "appointment is in the past")
+    flag(batch, (minutes < start) | (minutes + SLOT_MINUTES > end),
+         f"outside clinic hours ({DAY_START:%H:%M}-{DAY_END:%H:%M})")
+    flag(batch, (minutes % SLOT_MINUTES != 0) | (slot.dt.second != 0),
+         f"not on a {SLOT_MINUTES}-minute slot boundary")
+    flag(batch, ~batch["priority"].isin(PRIORITIES), f"priority must be one of {', '.join(PRIORITIES)}")
+
+    ok = batch["error"].isna()
+    if ok.any():
+        known = fetch_in(client, "patient", "patient_id", unique_ids(batch.loc[ok, "patient_id"]), "patient_id")["patient_id"]
+        flag(batch, ~batch["patient_id"].isin(known), "unknown patient_id")
+
+        known = fetch_in(client, "doctor", "doctor_id", unique_ids(batch.loc[ok, "doctor_id"]), "doctor_id")["doctor_id"]
+        flag(batch, ~batch["doctor_id"].isin(known), "unknown doctor_id")
+
+    flag(batch, batch.duplicated(["doctor_id", "slot"]), "same doctor and time as an earlier row")
+
+    ok = batch["error"].isna()
+    if ok.any():
+        window_start, window_end = batch.loc[ok, "slot"].min(), batch.loc[ok, "slot"].max()
+        booked = fetch_in(
+            client, "appointment", "doctor_id", unique_ids(batch.loc[ok, "doctor_id"]),
+            "doctor_id, appointment_datetime",
+            build=lambda q: (q.neq("status", "Cancelled")
+                             .gte("appointment_datetime", window_start.strftime(SLOT_FORMAT))
+                             .lte("appointment_datetime", window_end.strftime(SLOT_FORMAT))),
+            order_by="appointment_id",
+        )
+        taken = pd.MultiIndex.from_arrays([
+            booked["doctor_id"].astype("Int64"),
+            pd.to_datetime(booked["appointment_datetime"], format="mixed").dt.tz_localize(None),
+        ])
+        flag(batch, pd.MultiIndex.from_frame(batch[["doctor_id", "slot"]]).isin(taken), "slot already booked")
+    return batch
+
+
+def to_records(batch: pd.DataFrame) -> list:
+    payload = pd.DataFrame({
+        "patient_id": batch["patient_id"].astype("int64"),
+        "doctor_id": batch["doctor_id"].astype("int64"),
+        "clinic_id": batch["clinic_id"].astype("int64"),
+        "appointment_datetime": batch["slot"].dt.strftime(SLOT_FORMAT),
+        "status": "Booked",
+        "reason": batch["reason"],
+        "priority": batch["priority"],
+    })
+    return payload.to_dict("records")
+
+
+def insert_batches(client, batch: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple[int, pd.DataFrame]:
+    """
+    Insert the rows of batch without an error. Returns (rows inserted, failed rows),
+    where failed rows carry the database's reason in "error".
+    """
+    valid = batch[batch["error"].isna()]
+    records = to_records(valid)
+    inserted, failures = 0, []
+    for i in range(0, len(records), batch_size):
+        chunk = records[i:i + batch_size]
+        try:
+            inserted += len(client.table("appointment").insert(chunk).execute().data or chunk)
+            continue
+        except Exception:
+            pass
+        # Find the offending rows; the rest of the chunk still goes in
+        for offset, record in enumerate(chunk):
+            try:
+                client.table("appointment").insert(record).execute()
+                inserted += 1
+            except Exception as e:
+                failure = valid.iloc[i + offset].to_dict()
+                failure["error"] = "slot already booked" if is_conflict(e) else str(e)
+                failures.append(failure)
+    return inserted, pd.DataFrame(failures, columns=batch.columns)
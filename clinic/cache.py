@@ -0,0 +1,151 @@
+"""Shared TTL + LRU cache for query results."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from clinic.singleflight import SingleFlight
+
+
+class QueryCache:
+    """
+    A size-bounded, thread-safe cache for table reads.
+
+    Keys are tuples whose first element is the table name, so every entry
+    belonging to a table can be dropped with invalidate(table) after a write.
+    Entries built from a join can list extra tables they depend on. Each
+    table can have its own TTL; tables without one use default_ttl.
+
+    get_or_load() also collapses concurrent misses for one key into a
+    single load (clinic.singleflight). on_hit, if given, is called with the
+    table name of every hit (e.g. MetricsRecorder.record_cache_hit), and
+    on_invalidate with the table names of every invalidate(), so other
+    copies of the data (e.g. clinic.snapshots) hear about writes too.
+    """
+
+    def __init__(self, max_entries: int = 512, default_ttl: float = 60.0,
+                 table_ttls: Optional[Dict[str, float]] = None,
+                 on_hit: Optional[Callable[[str], None]] = None,
+                 on_invalidate: Optional[Callable[..., None]] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.table_ttls = dict(table_ttls or {})
+        self.on_hit = on_hit
+        self.on_invalidate = on_invalidate
+        self._entries: "OrderedDict[Tuple, Tuple[float, frozenset, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(), so a load that overlapped a write isn't stored
+        self._generations: Dict[str, int] = {}
+        self.flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def ttl_for(self, table_name: str) -> float:
+        return self.table_ttls.get(table_name, self.default_ttl)
+
+    def get(self, key: Tuple[Hashable, ...]) -> Tuple[bool, Any]:
+        """Return (found, value). Expired entries count as a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        if self.on_hit is not None:
+            self.on_hit(key[0])
+        return True, value
+
+    def has(self, key: Tuple[Hashable, ...]) -> bool:
+        """True if key is cached and fresh, or being loaded. Not counted as a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return True
+        return self.flights.in_flight(key)
+
+    def set(self, key: Tuple[Hashable, ...], value: Any, depends_on: Iterable[str] = ()):
+        with self._lock:
+            self._put(key, value, depends_on)
+
+    def _put(self, key: Tuple[Hashable, ...], value: Any, depends_on: Iterable[str]):
+        """set() with self._lock already held."""
+        tables = frozenset((key[0], *depends_on))
+        expires_at = time.monotonic() + min(self.ttl_for(t) for t in tables)
+        self._entries[key] = (expires_at, tables, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key: Tuple[Hashable, ...], load: Callable[[], Any], depends_on: Iterable[str] = (),
+                    cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """
+        The cached value for key, or load()'s result. Concurrent misses share
+        one load() call. The result is stored unless cacheable(result) is
+        false (e.g. an error) or a table it reads was invalidated meanwhile.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+        depends_on = tuple(depends_on)
+        tables = (key[0], *depends_on)
+
+        def lead():
+            with self._lock:
+                # A previous leader may have stored it since our miss
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[2]
+                generations = [self._generations.get(t, 0) for t in tables]
+            value = load()
+            if cacheable(value):
+                with self._lock:
+                    if [self._generations.get(t, 0) for t in tables] == generations:
+                        self._put(key, value, depends_on)
+            return value
+
+        return self.flights.do(key, lead, depends_on)
+
+    def invalidate(self, *table_names: str):
+        """Drop every cached entry that reads from any of the given tables."""
+        self.flights.forget(*table_names)
+        with self._lock:
+            for table_name in table_names:
+                self._generations[table_name] = self._generations.get(table_name, 0) + 1
+            stale = [key for key, (_, tables, _) in self._entries.items()
+                     if not tables.isdisjoint(table_names)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        if self.on_invalidate is not None:
+            self.on_invalidate(*table_names)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                **{k: v for k, v in self.flights.stats().items() if k != "by_table"},
+            }
@@ -0,0 +1,183 @@
+"""
+Streaming exports of the appointment, payment and prescription tables.
+
+An export reads its table one page at a time. Pages are keyset-paginated:
+ordered by the primary key, each starting after the last key seen, so the
+database does the same work for the last page as for the first. Each page
+is encoded and dropped before the next is read. CSV pages become lines
+straight away. Parquet pages become Arrow columns, written a row group at
+a time through pyarrow's ParquetWriter. The stream holds at most one
+page, or one row group of Arrow columns, however large the table is.
+
+A Streamlit download is served from a single bytes object (collect()), so
+the app's ceiling is the encoded file, not every row as a dict plus a
+DataFrame. Date-range, doctor and clinic filters are sent as query
+filters. Payments and prescriptions are filtered through an inner join on
+their appointment.
+"""
+
+import csv
+import datetime
+import io
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from clinic.repository import FETCH_PAGE_SIZE, PROJECTIONS
+from clinic.schema import arrow_schema, rows_to_arrow
+
+# Per table: primary key, the date the range filter applies to, and the
+# table carrying doctor_id and clinic_id when the table itself doesn't
+EXPORTS: Dict[str, Dict[str, Optional[str]]] = {
+    "appointment": {"key": "appointment_id", "date_column": "appointment_datetime", "via": None},
+    "payment": {"key": "payment_id", "date_column": "payment_date", "via": "appointment"},
+    "prescription": {"key": "prescription_id", "date_column": "prescription_date", "via": "appointment"},
+}
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Rows per Parquet row group. Groups of a single page compress poorly;
+# buffered as Arrow columns, this many rows take a few MB.
+PARQUET_ROW_GROUP_ROWS = 50000
+
+# Exports larger than this are spooled to a temporary file rather than memory
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+def export_columns(table_name: str) -> List[str]:
+    return [c.strip() for c in PROJECTIONS[f"{table_name}_export"].split(",")]
+
+
+def iter_pages(client, table_name: str, start: Optional[datetime.date] = None,
+               end: Optional[datetime.date] = None, doctor_id: Optional[int] = None,
+               clinic_id: Optional[int] = None, page_size: int = FETCH_PAGE_SIZE) -> Iterator[List[dict]]:
+    """
+    Rows of table_name matching the filters, one page (a list of row dicts)
+    at a time in primary key order. start and end are inclusive dates.
+    Raises on errors.
+    """
+    spec = EXPORTS[table_name]
+    key, date_column, via = spec["key"], spec["date_column"], spec["via"]
+    columns = PROJECTIONS[f"{table_name}_export"]
+    prefix = ""
+    if via and (doctor_id is not None or clinic_id is not None):
+        columns = f"{columns}, {via}!inner()"
+        prefix = f"{via}."
+
+    last_key = None
+    while True:
+        query = client.table(table_name).select(columns)
+        if start is not None:
+            query = query.gte(date_column, start.isoformat())
+        if end is not None:
+            query = query.lt(date_column, (end + datetime.timedelta(days=1)).isoformat())
+        if doctor_id is not None:
+            query = query.eq(f"{prefix}doctor_id", doctor_id)
+        if clinic_id is not None:
+            query = query.eq(f"{prefix}clinic_id", clinic_id)
+        if last_key is not None:
+            query = query.gt(key, last_key)
+        page = query.order(key).limit(page_size).execute().data or []
+        if via:
+            for row in page:
+                row.pop(via, None)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last_key = page[-1][key]
+
+
+def csv_chunks(pages: Iterable[List[dict]], columns: List[str]) -> Iterator[bytes]:
+    """UTF-8 CSV, the header and then one chunk per page."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield drain_text(buffer)
+    yield drain_text(buffer)
+
+
+def drain_text(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    A write-only file for ParquetWriter that hands its bytes out as chunks.
+    tell() keeps counting across drains, since the footer records offsets.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_chunks(pages: Iterable[List[dict]], table_name: str, columns: List[str]) -> Iterator[bytes]:
+    """
+    A Parquet file written a row group at a time, then the footer. Pages are
+    converted to Arrow as they arrive and buffered, compactly, until they
+    fill a row group of PARQUET_ROW_GROUP_ROWS.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(table_name, columns)
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        buffered, rows = [], 0
+        for page in pages:
+            buffered.append(rows_to_arrow(page, schema))
+            rows += len(page)
+            if rows >= PARQUET_ROW_GROUP_ROWS:
+                writer.write_table(pa.concat_tables(buffered), row_group_size=rows)
+                buffered, rows = [], 0
+                yield sink.drain()
+        if buffered:
+            writer.write_table(pa.concat_tables(buffered), row_group_size=rows)
+    yield sink.drain()
+
+
+def export_chunks(client, table_name: str, fmt: str = "csv", **filters: Any) -> Iterator[bytes]:
+    """The encoded export, chunk by chunk. filters are iter_pages' keyword arguments."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Expected one of: {', '.join(FORMATS)}.")
+    columns = export_columns(table_name)
+    pages = iter_pages(client, table_name, **filters)
+    if fmt == "csv":
+        return csv_chunks(pages, columns)
+    return parquet_chunks(pages, table_name, columns)
+
+
+def collect(chunks: Iterable[bytes]) -> bytes:
+    """
+    The whole export as bytes, which is what Streamlit serves a download
+    from. Chunks go through a temporary file (in memory up to
+    SPOOL_MAX_MEMORY, then on disk) rather than a list, so the result is the
+    only full copy held.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.seek(0)
+        return f.read()
@@ -0,0 +1,156 @@
+"""
+Incrementally maintained views of a table, refreshed by watermark polling.
+
+The first refresh loads the window once. Every later refresh asks only for
+rows whose updated_at is at or after the newest one seen (less a small
+overlap, because a transaction can commit after a later one that stamped a
+newer time) and merges them into the cached DataFrame by primary key.
+Re-merging a row that was already seen is harmless, so the overlap costs a
+few duplicate rows rather than missed changes. A refresh therefore
+downloads what changed, not the whole table. Polls filter on the watermark
+alone, not the window, so a row moved out of the window (e.g. rescheduled
+to earlier today) is fetched too and then pruned with the rest.
+
+Deletes are not picked up: a deleted row leaves no updated_at to poll
+for, so it stays in the frame until it falls out of the window. The app
+never deletes appointments; cancelling one is an update.
+
+Supabase Realtime needs the async client, which the app doesn't use, so
+polling the watermark is the change feed on both backends. It relies on
+appointment.updated_at (sql/002_appointment_updated_at.sql; the SQLite
+backend maintains it itself). Without that column the feed falls back to
+reloading the window on every refresh.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger("clinic.feed")
+
+WATERMARK_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def format_watermark(when: pd.Timestamp) -> str:
+    # Millisecond precision, UTC, no offset: compares correctly against the
+    # SQLite backend's text stamps and parses as a timestamp in Postgres
+    return when.strftime(WATERMARK_FORMAT)[:-3]
+
+
+class TableFeed:
+    """
+    A shared DataFrame of one table's rows inside a moving window, e.g.
+    appointments from today onwards. Thread-safe; refresh() is rate limited
+    so any number of sessions can call it on their own timers.
+    """
+
+    def __init__(self, client, table_name: str, key_column: str, columns: str,
+                 window_column: str, window_start: Callable[[], str],
+                 order_by: Optional[str] = None, watermark_column: str = "updated_at",
+                 overlap: float = 5.0, min_interval: float = 2.0):
+        self.client = client
+        self.table_name = table_name
+        self.key_column = key_column
+        self.columns = columns
+        self.window_column = window_column
+        self.window_start = window_start
+        self.order_by = order_by or window_column
+        self.watermark_column = watermark_column
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.min_interval = min_interval
+
+        self.lock = threading.Lock()
+        self.frame: Optional[pd.DataFrame] = None
+        self.watermark: Optional[pd.Timestamp] = None
+        self.incremental = True
+        self.last_refresh = 0.0
+        self.refreshed_at: Optional[datetime.datetime] = None
+        self.stats: Dict[str, Any] = {"full_loads": 0, "polls": 0, "rows_fetched": 0, "rows_changed": 0}
+
+    def select(self):
+        return self.client.table(self.table_name).select(self.columns)
+
+    def full_load(self):
+        response = self.select().gte(self.window_column, self.window_start()).execute()
+        self.frame = self.build(response.data or [])
+        self.watermark = self.newest(self.frame)
+        self.stats["full_loads"] += 1
+        self.stats["rows_fetched"] += len(self.frame)
+
+    def poll(self) -> int:
+        since = format_watermark(self.watermark - self.overlap) if self.watermark is not None else "1970-01-01"
+        try:
+            response = self.select().gte(self.watermark_column, since).order(self.watermark_column).execute()
+        except Exception as e:
+            if "does not exist" not in str(e).lower():
+                raise
+            logger.warning("%s.%s is missing, reloading the whole window on every refresh",
+                           self.table_name, self.watermark_column)
+            self.incremental = False
+            self.full_load()
+            return len(self.frame)
+
+        self.stats["polls"] += 1
+        self.stats["rows_fetched"] += len(response.data or [])
+        changed = self.build(response.data or [])
+        newest = self.newest(changed)
+        if newest is not None:
+            self.watermark = max(self.watermark, newest) if self.watermark is not None else newest
+
+        # Drop rows we already hold unchanged (the overlap re-reads them)
+        if not changed.empty and not self.frame.empty:
+            held = self.frame.reindex(changed.index)
+            same = (held[self.watermark_column] == changed[self.watermark_column]).fillna(False)
+            changed = changed[~same.to_numpy(dtype=bool)]
+        # Rows outside the window matter only if they replace one we hold; prune() then drops them
+        in_window = changed[self.window_column].astype(str) >= self.window_start()
+        changed = changed[in_window | changed.index.isin(self.frame.index)]
+        if changed.empty:
+            return 0
+
+        frame = pd.concat([self.frame.drop(changed.index, errors="ignore"), changed])
+        self.frame = frame.sort_values(self.order_by, kind="stable")
+        return len(changed)
+
+    def build(self, rows: list) -> pd.DataFrame:
+        df = pd.DataFrame(rows, columns=[c.strip() for c in self.columns.split(",")])
+        return df.set_index(self.key_column, drop=False)
+
+    def newest(self, df: pd.DataFrame) -> Optional[pd.Timestamp]:
+        if df.empty or self.watermark_column not in df:
+            return None
+        stamps = pd.to_datetime(df[self.watermark_column], format="mixed", utc=True).dropna()
+        return stamps.max().tz_localize(None) if not stamps.empty else None
+
+    def prune(self):
+        """Drop rows that have fallen out of the window (e.g. yesterday's after midnight)."""
+        start = self.window_start()
+        if self.frame is not None and not self.frame.empty:
+            keep = self.frame[self.window_column].astype(str) >= start
+            if not keep.all():
+                self.frame = self.frame[keep]
+
+    def refresh(self, force: bool = False) -> int:
+        """Bring the frame up to date. Returns how many rows changed (all of them on a full load)."""
+        with self.lock:
+            if not force and self.frame is not None and time.monotonic() - self.last_refresh < self.min_interval:
+                return 0
+            if self.frame is None or not self.incremental:
+                self.full_load()
+                changed = len(self.frame)
+            else:
+                changed = self.poll()
+                self.prune()
+            self.stats["rows_changed"] += changed
+            self.last_refresh = time.monotonic()
+            self.refreshed_at = datetime.datetime.now()
+            return changed
+
+    def snapshot(self) -> pd.DataFrame:
+        """The current frame. Shared between sessions, so don't modify it in place."""
+        with self.lock:
+            return self.frame if self.frame is not None else self.build([])
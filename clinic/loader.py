@@ -0,0 +1,30 @@
+"""Concurrent loading of a dashboard's independent queries."""
+
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class DashboardLoader:
+    """
+    Runs a dashboard's queries on a bounded thread pool so page latency is
+    the slowest query rather than the sum of all of them.
+
+    One loader is shared by every session, so max_workers also caps how many
+    requests this server process has in flight against the database.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dashboard-loader")
+
+    def load(self, tasks: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        """Run every task concurrently and return {name: result}."""
+        # Each task runs in a copy of the caller's context so per-rerun
+        # metrics (clinic.metrics) attribute its queries to this rerun
+        futures = {name: self.pool.submit(contextvars.copy_context().run, task)
+                   for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def submit(self, task: Callable[[], Any]) -> Future:
+        """Run task on the pool without waiting for it, e.g. a prefetch that only warms the cache."""
+        return self.pool.submit(task)
@@ -0,0 +1,253 @@
+"""
+Query instrumentation: per-query timing, per-rerun profiles and an
+OpenMetrics export.
+
+InstrumentedBackend wraps any backend from clinic.backend and records every
+execute() (table, action, filters, rows, bytes, wall time) into a
+MetricsRecorder. Queries are attributed to the rerun that issued them via a
+context variable; DashboardLoader copies the context into its worker
+threads so concurrent loads are attributed too.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("clinic.metrics")
+
+FILTER_METHODS = {"eq", "neq", "gt", "gte", "lt", "lte", "in_", "ilike", "like", "is_", "or_"}
+WRITE_METHODS = {"insert", "update", "upsert", "delete"}
+
+# Upper bounds (seconds) for the query latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def describe_value(value: Any) -> str:
+    if isinstance(value, (list, tuple, set)):
+        return f"[{len(value)} values]"
+    text = str(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+class RunProfile:
+    """Everything recorded during one script rerun."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.queries: List[Dict[str, Any]] = []
+        self.frames: List[Dict[str, Any]] = []
+        # Reads answered by the query cache without a query
+        self.cache_hits = 0
+        self.phases: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def total_ms(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            query_ms = sum(q["ms"] for q in self.queries)
+            frame_ms = sum(f["ms"] for f in self.frames)
+            load_ms = self.phases.get("load", 0.0)
+            return {
+                "label": self.label,
+                "total_ms": round(self.total_ms, 1),
+                "load_wall_ms": round(load_ms, 1),
+                "render_ms": round(max(self.total_ms - load_ms, 0.0), 1),
+                "queries": len(self.queries),
+                "cache_hits": self.cache_hits,
+                "query_ms_sum": round(query_ms, 1),
+                "dataframe_ms_sum": round(frame_ms, 1),
+                "rows": sum(q["rows"] for q in self.queries),
+                "bytes": sum(q["bytes"] or 0 for q in self.queries),
+            }
+
+
+class MetricsRecorder:
+    """Process-wide, thread-safe store of query metrics."""
+
+    def __init__(self, measure_bytes: bool = False, log_queries: bool = False):
+        # Measuring bytes re-serialises every response, so it's opt-in
+        self.measure_bytes = measure_bytes
+        self.log_queries = log_queries
+        self.current: contextvars.ContextVar = contextvars.ContextVar("clinic_run_profile", default=None)
+        self.lock = threading.Lock()
+        self.totals: Dict[tuple, Dict[str, Any]] = {}
+
+    # --- Rerun profiles ---
+
+    def start_run(self, label: str = "") -> RunProfile:
+        profile = RunProfile(label)
+        self.current.set(profile)
+        return profile
+
+    def finish_run(self, profile: RunProfile):
+        profile.finished = time.perf_counter()
+        if self.log_queries:
+            logger.info(json.dumps({"event": "rerun", **profile.summary()}))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a named section of the current rerun, e.g. the dashboard load."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            profile = self.current.get()
+            if profile is not None:
+                with profile.lock:
+                    profile.phases[name] = profile.phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    # --- Recording ---
+
+    def record_query(self, table_name: str, action: str, filters: List[str], columns: str,
+                     seconds: float, rows: int, size: Optional[int], error: Optional[str] = None):
+        entry = {
+            "table": table_name, "action": action, "filters": ", ".join(filters), "columns": columns,
+            "rows": rows, "bytes": size, "ms": round(seconds * 1000, 2), "error": error,
+        }
+        profile = self.current.get()
+        if profile is not None:
+            with profile.lock:
+                profile.queries.append(entry)
+
+        with self.lock:
+            total = self.totals.setdefault((table_name, action), {
+                "count": 0, "errors": 0, "seconds": 0.0, "rows": 0, "bytes": 0,
+                "buckets": [0] * len(LATENCY_BUCKETS),
+            })
+            total["count"] += 1
+            total["errors"] += 1 if error else 0
+            total["seconds"] += seconds
+            total["rows"] += rows
+            total["bytes"] += size or 0
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    total["buckets"][i] += 1
+
+        if self.log_queries:
+            logger.info(json.dumps({"event": "query", **entry}))
+
+    def record_cache_hit(self, table_name: str):
+        profile = self.current.get()
+        if profile is not None:
+            with profile.lock:
+                profile.cache_hits += 1
+
+    def record_frame(self, table_name: str, rows: int, seconds: float, size: Optional[int] = None):
+        profile = self.current.get()
+        if profile is not None:
+            with profile.lock:
+                profile.frames.append({"table": table_name, "rows": rows, "memory": size,
+                                       "ms": round(seconds * 1000, 2)})
+
+    # --- Export ---
+
+    def openmetrics(self, cache_stats: Optional[Dict[str, Any]] = None) -> str:
+        """Render the process totals in OpenMetrics text format."""
+        lines = [
+            "# TYPE clinic_db_queries counter",
+            "# HELP clinic_db_queries Database requests issued by the app.",
+        ]
+        with self.lock:
+            totals = {key: dict(value, buckets=list(value["buckets"])) for key, value in self.totals.items()}
+        for (table_name, action), t in sorted(totals.items()):
+            lines.append(f'clinic_db_queries_total{{table="{table_name}",action="{action}"}} {t["count"]}')
+        lines += ["# TYPE clinic_db_query_errors counter"]
+        for (table_name, action), t in sorted(totals.items()):
+            lines.append(f'clinic_db_query_errors_total{{table="{table_name}",action="{action}"}} {t["errors"]}')
+        lines += ["# TYPE clinic_db_rows counter"]
+        for (table_name, action), t in sorted(totals.items()):
+            lines.append(f'clinic_db_rows_total{{table="{table_name}",action="{action}"}} {t["rows"]}')
+        lines += ["# TYPE clinic_db_response_bytes counter"]
+        for (table_name, action), t in sorted(totals.items()):
+            lines.append(f'clinic_db_response_bytes_total{{table="{table_name}",action="{action}"}} {t["bytes"]}')
+        lines += ["# TYPE clinic_db_query_seconds histogram", "# UNIT clinic_db_query_seconds seconds"]
+        for (table_name, action), t in sorted(totals.items()):
+            labels = f'table="{table_name}",action="{action}"'
+            for bound, count in zip(LATENCY_BUCKETS, t["buckets"]):
+                lines.append(f'clinic_db_query_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'clinic_db_query_seconds_bucket{{{labels},le="+Inf"}} {t["count"]}')
+            lines.append(f'clinic_db_query_seconds_sum{{{labels}}} {t["seconds"]:.6f}')
+            lines.append(f'clinic_db_query_seconds_count{{{labels}}} {t["count"]}')
+        if cache_stats:
+            for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+                lines.append(f"# TYPE clinic_query_cache_{name} counter")
+                lines.append(f"clinic_query_cache_{name}_total {cache_stats[name]}")
+            for name in ("loads", "coalesced"):
+                lines.append(f"# TYPE clinic_query_cache_{name} counter")
+                lines.append(f"clinic_query_cache_{name}_total {cache_stats.get(name, 0)}")
+            lines.append("# TYPE clinic_query_cache_entries gauge")
+            lines.append(f"clinic_query_cache_entries {cache_stats['entries']}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedQuery:
+    """Proxy for a backend query builder that records execute() calls."""
+
+    def __init__(self, builder, recorder: MetricsRecorder, table_name: str):
+        self._builder = builder
+        self._recorder = recorder
+        self._table_name = table_name
+        self._action = "select"
+        self._columns = ""
+        self._filters: List[str] = []
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if name == "select":
+                self._columns = ",".join(args) or "*"
+                if kwargs.get("head"):
+                    self._action = "count"
+            elif name in WRITE_METHODS:
+                self._action = name
+            elif name in FILTER_METHODS and args:
+                value = describe_value(args[1]) if len(args) > 1 else ""
+                self._filters.append(f"{name.rstrip('_')}({args[0]}, {value})")
+            self._builder = attr(*args, **kwargs)
+            return self
+
+        return call
+
+    def execute(self):
+        start = time.perf_counter()
+        try:
+            response = self._builder.execute()
+        except Exception as e:
+            self._recorder.record_query(self._table_name, self._action, self._filters, self._columns,
+                                        time.perf_counter() - start, 0, None, error=str(e))
+            raise
+        seconds = time.perf_counter() - start
+        data = response.data or []
+        size = len(json.dumps(data, default=str)) if self._recorder.measure_bytes else None
+        self._recorder.record_query(self._table_name, self._action, self._filters, self._columns,
+                                    seconds, len(data), size)
+        return response
+
+
+class InstrumentedBackend:
+    """Wraps a backend so every query it runs is recorded."""
+
+    def __init__(self, backend, recorder: MetricsRecorder):
+        self.backend = backend
+        self.recorder = recorder
+
+    def table(self, table_name: str) -> InstrumentedQuery:
+        return InstrumentedQuery(self.backend.table(table_name), self.recorder, table_name)
+
+    def __getattr__(self, name: str):
+        # Pass through backend-specific extras (rpc, bulk_insert, ...)
+        return getattr(self.backend, name)
@@ -0,0 +1,241 @@
+"""
+Process-wide reference data (the doctor list, the patient directory)
+that every session needs and that changes rarely.
+
+Each dataset is fetched by one caller while the rest wait for it, and is
+then served from memory to every session. Once it is older than its TTL,
+readers keep getting the current copy while one background thread
+refetches it (stale-while-revalidate), so no rerun waits on a refresh.
+Every dataset carries a version that only goes up when its content
+changes, so consumers can cache derived structures (e.g. a search index)
+per version.
+
+With a snapshot directory, each refresh is also written there as an
+uncompressed Arrow IPC file. Other server processes on the host
+memory-map it instead of querying the database, as long as it is fresh
+and newer than their last local write, so N processes cost one fetch per
+TTL rather than N.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, Optional
+
+import pandas as pd
+
+from clinic.repository import QueryResult, describe_query_error
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots still work, refreshes just aren't coordinated
+    fcntl = None
+
+logger = logging.getLogger("clinic.reference")
+
+
+class Dataset:
+    def __init__(self, name: str, loader: Callable[[], pd.DataFrame], tables: Iterable[str], ttl: float):
+        self.name = name
+        self.loader = loader
+        self.tables = frozenset(tables)
+        self.ttl = ttl
+        self.frame: Optional[pd.DataFrame] = None
+        self.version = 0
+        self.digest: Optional[int] = None
+        self.fetched_at = 0.0       # wall clock, comparable across processes
+        self.invalidated_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self.stats = {"fetches": 0, "snapshot_loads": 0, "background_refreshes": 0, "errors": 0}
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class ReferenceStore:
+    """Thread-safe; one instance per server process."""
+
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        self.snapshot_dir = snapshot_dir
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+        self.datasets: Dict[str, Dataset] = {}
+
+    def register(self, name: str, loader: Callable[[], pd.DataFrame], tables: Iterable[str], ttl: float = 300):
+        """loader returns the whole dataset; tables are the ones whose writes invalidate it."""
+        self.datasets[name] = Dataset(name, loader, tables, ttl)
+
+    # --- Reading ---
+
+    def get(self, name: str) -> pd.DataFrame:
+        """The dataset, loading it on first use. Shared by every session: don't modify it in place."""
+        dataset = self.datasets[name]
+        frame = dataset.frame
+        if frame is None:
+            with dataset.lock:
+                if dataset.frame is None:
+                    self.load(dataset)
+                frame = dataset.frame
+        elif dataset.age > dataset.ttl and not dataset.refreshing:
+            dataset.refreshing = True
+            threading.Thread(target=self.refresh, args=(dataset,), daemon=True,
+                             name=f"reference-{name}").start()
+        return frame
+
+    def result(self, name: str) -> QueryResult:
+        """get() in the (DataFrame, error) shape of ClinicRepository."""
+        table_name = ", ".join(sorted(self.datasets[name].tables))
+        try:
+            df = self.get(name)
+        except Exception as e:
+            return None, describe_query_error(table_name, e)
+        if df.empty:
+            return None, f"No data found in {table_name} table."
+        return df, None
+
+    def version(self, name: str) -> int:
+        return self.datasets[name].version
+
+    # --- Refreshing ---
+
+    def invalidate(self, *table_names: str):
+        """After a write: datasets reading these tables are refetched on next use."""
+        now = time.time()
+        for dataset in self.datasets.values():
+            if not dataset.tables.isdisjoint(table_names):
+                with dataset.lock:
+                    dataset.invalidated_at = now
+                    dataset.frame = None
+
+    def refresh(self, dataset: Dataset):
+        try:
+            with dataset.lock:
+                dataset.stats["background_refreshes"] += 1
+                self.load(dataset)
+        except Exception as e:
+            # Keep serving the old copy; the next reader retries
+            dataset.stats["errors"] += 1
+            logger.warning("Refreshing %s failed: %s", dataset.name, e)
+        finally:
+            dataset.refreshing = False
+
+    def load(self, dataset: Dataset):
+        """Adopt a fresh snapshot if another process wrote one, otherwise fetch. Caller holds dataset.lock."""
+        with self.snapshot_lock(dataset):
+            if self.load_snapshot(dataset):
+                return
+            frame = dataset.loader()
+            dataset.stats["fetches"] += 1
+            digest = int(pd.util.hash_pandas_object(frame, index=False).sum()) if not frame.empty else 0
+            if digest != dataset.digest:
+                # Another process may already have published this content under a version
+                published = self.snapshot_metadata(dataset)
+                if published.get("clinic_digest") == str(digest):
+                    dataset.version = max(dataset.version, int(published["clinic_version"]))
+                else:
+                    dataset.version = max(dataset.version, int(published.get("clinic_version", 0))) + 1
+                dataset.digest = digest
+            dataset.frame = frame
+            dataset.fetched_at = time.time()
+            self.write_snapshot(dataset)
+
+    # --- Snapshots ---
+
+    def snapshot_path(self, dataset: Dataset) -> Optional[str]:
+        return os.path.join(self.snapshot_dir, f"{dataset.name}.arrow") if self.snapshot_dir else None
+
+    def snapshot_lock(self, dataset: Dataset):
+        """Exclusive lock on the dataset's snapshot, so processes refresh it one at a time."""
+        path = self.snapshot_path(dataset)
+        if path is None or fcntl is None:
+            return nullcontext()
+        return FileLock(path + ".lock")
+
+    @staticmethod
+    def read_metadata(schema) -> Dict[str, str]:
+        return {k.decode(): v.decode() for k, v in (schema.metadata or {}).items() if k.startswith(b"clinic_")}
+
+    def snapshot_metadata(self, dataset: Dataset) -> Dict[str, str]:
+        path = self.snapshot_path(dataset)
+        if not path or not os.path.exists(path):
+            return {}
+        import pyarrow as pa
+        try:
+            with pa.memory_map(path) as source:
+                return self.read_metadata(pa.ipc.open_file(source).schema)
+        except Exception:
+            return {}
+
+    def load_snapshot(self, dataset: Dataset) -> bool:
+        path = self.snapshot_path(dataset)
+        if not path or not os.path.exists(path):
+            return False
+        import pyarrow as pa
+        try:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            metadata = self.read_metadata(table.schema)
+            fetched_at = float(metadata["clinic_fetched_at"])
+            version = int(metadata["clinic_version"])
+        except Exception as e:
+            logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+            return False
+        fresh = time.time() - fetched_at < dataset.ttl
+        if not fresh or fetched_at <= max(dataset.invalidated_at, dataset.fetched_at):
+            return False
+        dataset.frame = table.to_pandas()
+        dataset.version = max(dataset.version, version)
+        dataset.digest = int(metadata.get("clinic_digest", 0)) or None
+        dataset.fetched_at = fetched_at
+        dataset.stats["snapshot_loads"] += 1
+        return True
+
+    def write_snapshot(self, dataset: Dataset):
+        path = self.snapshot_path(dataset)
+        if not path:
+            return
+        import pyarrow as pa
+        try:
+            table = pa.Table.from_pandas(dataset.frame, preserve_index=False)
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                b"clinic_version": str(dataset.version).encode(),
+                b"clinic_fetched_at": repr(dataset.fetched_at).encode(),
+                b"clinic_digest": str(dataset.digest or 0).encode(),
+            })
+            # Write then rename, so readers never see a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, prefix=f".{dataset.name}-")
+            with os.fdopen(fd, "wb") as f, pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning("Could not write snapshot %s: %s", path, e)
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {"version": d.version, "rows": len(d.frame) if d.frame is not None else None,
+                   "age_s": round(d.age, 1) if d.fetched_at else None, **d.stats}
+            for name, d in self.datasets.items()
+        }
+
+
+class FileLock:
+    """An exclusive flock on path, held for the with block (Unix only; see fcntl above)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        return False
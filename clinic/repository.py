@@ -0,0 +1,370 @@
+"""Read-side data access for the dashboards, with per-view column projections."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from clinic.cache import QueryCache
+from clinic.loader import DashboardLoader
+from clinic.metrics import MetricsRecorder
+from clinic.schema import apply_schema, memory_footprint
+from clinic.slots import slot_now
+
+QueryResult = Tuple[Optional[pd.DataFrame], Optional[str]]
+
+# Ids per request when an in_ filter has to be split up. Keeps each URL
+# well under typical proxy limits (~8 KB) even with large ids.
+IN_CHUNK_SIZE = 200
+IN_MAX_WORKERS = 4
+
+# PostgREST caps a response at its max-rows setting (1000 on Supabase), so
+# whole-table reads page through it
+FETCH_PAGE_SIZE = 1000
+
+# Columns each view actually renders. Keeping these in one place means a
+# dashboard never pulls addresses or free-text fields it doesn't show.
+PROJECTIONS = {
+    "patient_options": "patient_id, name",
+    "patient_search": "patient_id, name, phone, email",
+    "patient_info": "patient_id, name, email, phone, date_of_birth, gender, address",
+    "my_patients": "patient_id, name, email, phone, date_of_birth, gender",
+    "doctor_options": "staff_id, name",
+    "doctor_table": "doctor_id, specialization, pstart",
+    "appointment_table": "appointment_id, patient_id, doctor_id, clinic_id, appointment_datetime, status, priority",
+    "doctor_appointments": "appointment_id, patient_id, clinic_id, appointment_datetime, status, priority, reason",
+    "patient_appointments": "appointment_id, doctor_id, clinic_id, appointment_datetime, status, priority, reason",
+    "cancellable_appointments": "appointment_id, appointment_datetime, status",
+    "live_appointments": "appointment_id, patient_id, doctor_id, clinic_id, appointment_datetime, status, priority, updated_at",
+    "payment_table": "payment_id, appointment_id, amount, payment_method, payment_status, payment_date",
+    "prescription_table": "prescription_id, appointment_id, diagnosis, medicines, advice, prescription_date",
+    "appointment_doctor_day": "period, doctor_id, status, appointments",
+    "appointment_doctor_month": "period, doctor_id, status, appointments",
+    "payment_doctor_day": "period, doctor_id, payment_status, payments, amount",
+    "payment_doctor_month": "period, doctor_id, payment_status, payments, amount",
+    # Full extracts (clinic.export)
+    "appointment_export": "appointment_id, patient_id, doctor_id, clinic_id, appointment_datetime, status, priority, reason",
+    "payment_export": "payment_id, appointment_id, amount, payment_method, payment_status, payment_date",
+    "prescription_export": "prescription_id, appointment_id, diagnosis, medicines, advice, prescription_date",
+    # Local mirrors for the history views (clinic.snapshots)
+    "appointment_snapshot": "appointment_id, patient_id, doctor_id, clinic_id, appointment_datetime, status, priority, reason, updated_at",
+    "prescription_snapshot": "prescription_id, appointment_id, diagnosis, medicines, advice, prescription_date, updated_at",
+    "patient_snapshot": "patient_id, name, email, phone, date_of_birth, gender, updated_at",
+    # Raw rows the analytics fallback aggregates itself
+    "appointment_facts": "appointment_datetime, doctor_id, status",
+    "payment_facts": "payment_date, amount, payment_status, appointment!inner(doctor_id)",
+}
+
+
+def describe_query_error(table_name: str, e: Exception) -> str:
+    error_msg = str(e)
+    if "infinite recursion" in error_msg.lower():
+        return f"Database configuration error: Row Level Security policy issue in {table_name}. Please check your Supabase RLS policies."
+    elif "does not exist" in error_msg.lower():
+        return f"Column or table error in {table_name}: {error_msg}"
+    else:
+        return f"Error accessing {table_name}: {error_msg}"
+
+
+def is_unresolved_join(error: str) -> bool:
+    """True if PostgREST couldn't embed the requested table (PGRST200), as opposed to the query failing."""
+    return "PGRST200" in error or "could not find a relationship" in error.lower()
+
+
+def is_cacheable(result: QueryResult) -> bool:
+    """Cache rows and empty results, not errors, which may be transient."""
+    df, error = result
+    return df is not None or error.startswith("No data found")
+
+
+class ClinicRepository:
+    """
+    Cached reads against the clinic tables.
+
+    Every method returns (DataFrame, None) on success or (None, message) when
+    there are no rows or the query failed, matching safe_query in app.py.
+    Returned DataFrames can be shared with other sessions through the
+    cache, so callers must not modify them in place.
+
+    With snapshots (a clinic.snapshots.SnapshotStore), the history views
+    read the local mirrors first and query the database only when a mirror
+    can't answer.
+    """
+
+    def __init__(self, client, cache: QueryCache, metrics: Optional[MetricsRecorder] = None,
+                 arrow_dtypes: bool = False, snapshots=None, loader: Optional[DashboardLoader] = None):
+        self.client = client
+        self.cache = cache
+        self.metrics = metrics
+        self.arrow_dtypes = arrow_dtypes
+        self.snapshots = snapshots
+        # Runs prefetches; without one, nothing is prefetched
+        self.loader = loader
+        # (table, link table) pairs PostgREST couldn't embed; skip the join next time
+        self.unjoinable = set()
+
+    def to_frame(self, table_name: str, rows: list) -> pd.DataFrame:
+        """Build the DataFrame for a result set, typed per clinic.schema."""
+        start = time.perf_counter()
+        df = apply_schema(table_name, pd.DataFrame(rows), arrow=self.arrow_dtypes)
+        if self.metrics:
+            size = memory_footprint(df) if self.metrics.measure_bytes else None
+            self.metrics.record_frame(table_name, len(rows), time.perf_counter() - start, size)
+        return df
+
+    def cached_select(self, cache_key: tuple, build_query: Callable,
+                      depends_on: Iterable[str] = ()) -> QueryResult:
+        """
+        Run build_query().execute() through the shared query cache.
+        cache_key[0] must be the table name so writes can invalidate it;
+        depends_on names any other tables the query joins against.
+        """
+        table_name = cache_key[0]
+
+        def load():
+            try:
+                response = build_query().execute()
+            except Exception as e:
+                return None, describe_query_error(table_name, e)
+            if response.data:
+                return self.to_frame(table_name, response.data), None
+            return None, f"No data found in {table_name} table."
+
+        # Identical misses from concurrent sessions share one request
+        return self.cache.get_or_load(cache_key, load, depends_on, cacheable=is_cacheable)
+
+    def query(self, table_name: str, eq_column: Optional[str] = None, eq_value: Optional[Any] = None,
+              columns: str = "*", depends_on: Iterable[str] = ()) -> QueryResult:
+        """
+        eq_column may name a column of an embedded table, e.g.
+        "appointment.doctor_id" with columns "..., appointment!inner()";
+        list that table in depends_on so writes to it invalidate the result.
+        """
+        def build_query():
+            query = self.client.table(table_name).select(columns)
+            if eq_column and eq_value is not None:
+                query = query.eq(eq_column, eq_value)
+            return query
+
+        return self.cached_select((table_name, eq_column, eq_value, columns), build_query, depends_on)
+
+    def fetch_all(self, table_name: str, order_by: Union[str, Sequence[str]], columns: str = "*",
+                  eq_column: Optional[str] = None, eq_value: Optional[Any] = None,
+                  gte: Optional[Tuple[str, Any]] = None) -> pd.DataFrame:
+        """
+        Every matching row, read page by page and bypassing the query cache.
+        order_by must make the order unique (several columns may be given)
+        so pages don't overlap. gte is an optional (column, lower bound)
+        filter. Raises on errors. For loaders that manage their own caching
+        (clinic.reference, clinic.analytics).
+        """
+        order_columns = [order_by] if isinstance(order_by, str) else list(order_by)
+        rows, start = [], 0
+        while True:
+            query = self.client.table(table_name).select(columns)
+            if eq_column and eq_value is not None:
+                query = query.eq(eq_column, eq_value)
+            if gte is not None:
+                query = query.gte(*gte)
+            for column in order_columns:
+                query = query.order(column)
+            batch = query.range(start, start + FETCH_PAGE_SIZE - 1).execute().data or []
+            rows.extend(batch)
+            if len(batch) < FETCH_PAGE_SIZE:
+                return self.to_frame(table_name, rows)
+            start += FETCH_PAGE_SIZE
+
+    def query_in(self, table_name: str, in_column: str, values: Iterable, columns: str = "*",
+                 depends_on: Iterable[str] = ()) -> QueryResult:
+        """
+        Rows whose in_column is one of values. Long id lists are split into
+        IN_CHUNK_SIZE batches fetched concurrently, then concatenated.
+        """
+        values = sorted(set(values))
+        cache_key = (table_name, in_column, tuple(values), columns)
+        chunks = [values[i:i + IN_CHUNK_SIZE] for i in range(0, len(values), IN_CHUNK_SIZE)]
+
+        def fetch(chunk):
+            return self.client.table(table_name).select(columns).in_(in_column, chunk).execute().data
+
+        def load():
+            try:
+                if len(chunks) <= 1:
+                    batches = [fetch(chunk) for chunk in chunks]
+                else:
+                    with ThreadPoolExecutor(max_workers=min(IN_MAX_WORKERS, len(chunks))) as pool:
+                        batches = list(pool.map(fetch, chunks))
+            except Exception as e:
+                return None, describe_query_error(table_name, e)
+            rows = [row for batch in batches for row in batch]
+            if rows:
+                return self.to_frame(table_name, rows), None
+            return None, f"No data found in {table_name} table."
+
+        return self.cache.get_or_load(cache_key, load, depends_on, cacheable=is_cacheable)
+
+    def query_via(self, table_name: str, link_table: str, link_column: str, link_value: Any,
+                  key_column: str, columns: str) -> QueryResult:
+        """
+        Rows of table_name that have a link_table row with
+        link_column == link_value, joined on key_column.
+
+        Tries a single embedded inner join first; if PostgREST can't resolve
+        the relationship, falls back to fetching the keys from link_table and
+        a chunked in_ query, and skips the join from then on. Other errors
+        (timeouts, 5xx) are returned as they are.
+        """
+        if (table_name, link_table) not in self.unjoinable:
+            joined_columns = f"{columns}, {link_table}!inner()"
+            df, error = self.query(table_name, f"{link_table}.{link_column}", link_value,
+                                   columns=joined_columns, depends_on=[link_table])
+            if df is not None:
+                return df.drop(columns=[link_table], errors="ignore"), None
+            if not is_unresolved_join(error):
+                return None, error
+            self.unjoinable.add((table_name, link_table))
+
+        keys_df, error = self.query(link_table, link_column, link_value, columns=key_column)
+        if keys_df is None:
+            return None, error
+        return self.query_in(table_name, key_column, keys_df[key_column].tolist(),
+                             columns=columns, depends_on=[link_table])
+
+    def count(self, table_name: str, eq_column: Optional[str] = None, eq_value: Optional[Any] = None) -> Optional[int]:
+        """Return the number of matching rows without downloading them (HEAD request)."""
+        def load():
+            try:
+                query = self.client.table(table_name).select("*", count="exact", head=True)
+                if eq_column and eq_value is not None:
+                    query = query.eq(eq_column, eq_value)
+                return query.execute().count
+            except Exception:
+                return None
+
+        return self.cache.get_or_load((table_name, eq_column, eq_value, "count"), load,
+                                      cacheable=lambda total: total is not None)
+
+    def page(self, table_name: str, order_by: str, page: int, page_size: int,
+             eq_column: Optional[str] = None, eq_value: Optional[Any] = None,
+             id_column: Optional[str] = None, descending: bool = True,
+             columns: str = "*") -> QueryResult:
+        """
+        Fetch one page (0-based) of a table ordered by order_by, using a
+        server-side range so only page_size rows are transferred. id_column
+        breaks ties in order_by so rows don't shift between pages.
+        """
+        return self.cached_select(*self.page_query(table_name, order_by, page, page_size, eq_column, eq_value,
+                                                   id_column, descending, columns))
+
+    def page_query(self, table_name: str, order_by: str, page: int, page_size: int,
+                   eq_column: Optional[str] = None, eq_value: Optional[Any] = None,
+                   id_column: Optional[str] = None, descending: bool = True,
+                   columns: str = "*") -> Tuple[tuple, Callable]:
+        """page()'s cache key and query builder."""
+        start = page * page_size
+        end = start + page_size - 1
+
+        def build_query():
+            query = self.client.table(table_name).select(columns)
+            if eq_column and eq_value is not None:
+                query = query.eq(eq_column, eq_value)
+            query = query.order(order_by, desc=descending)
+            if id_column:
+                query = query.order(id_column, desc=descending)
+            return query.range(start, end)
+
+        cache_key = (table_name, eq_column, eq_value, columns, order_by, id_column, descending, start, page_size)
+        return cache_key, build_query
+
+    def prefetch_page(self, *args, **kwargs):
+        """
+        Warm the query cache with a page (page()'s arguments) on the loader's
+        pool, unless it is already cached or being fetched.
+        """
+        if self.loader is None:
+            return
+        cache_key, build_query = self.page_query(*args, **kwargs)
+        if not self.cache.has(cache_key):
+            self.loader.submit(lambda: self.cached_select(cache_key, build_query))
+
+    def from_snapshot(self, table_name: str, columns: str, filters: list) -> Optional[QueryResult]:
+        """The rows from the local mirror in the usual result shape, or None to query the database."""
+        if self.snapshots is None:
+            return None
+        df = self.snapshots.read(table_name, [c.strip() for c in columns.split(",")], filters)
+        if df is None:
+            return None
+        if df.empty:
+            return None, f"No data found in {table_name} table."
+        return df, None
+
+    def snapshot_keys(self, table_name: str, key_column: str, filters: list) -> Optional[list]:
+        """key_column of the mirrored rows matching filters, or None to query the database."""
+        if self.snapshots is None:
+            return None
+        df = self.snapshots.read(table_name, [key_column], filters)
+        return None if df is None else df[key_column].dropna().unique().tolist()
+
+    # --- Views ---
+
+    def patient_options(self) -> QueryResult:
+        return self.query("patient", columns=PROJECTIONS["patient_options"])
+
+    def doctor_options(self) -> QueryResult:
+        return self.query("staff", "staff_type", "Doctor", columns=PROJECTIONS["doctor_options"])
+
+    def my_patients(self, doctor_id: int) -> QueryResult:
+        """Patients with at least one appointment with this doctor."""
+        patient_ids = self.snapshot_keys("appointment", "patient_id", [("doctor_id", "=", doctor_id)])
+        if patient_ids is not None:
+            if not patient_ids:
+                return None, "No data found in patient table."
+            result = self.from_snapshot("patient", PROJECTIONS["my_patients"], [("patient_id", "in", patient_ids)])
+            if result is not None:
+                return result
+        return self.query_via("patient", "appointment", "doctor_id", doctor_id,
+                              "patient_id", PROJECTIONS["my_patients"])
+
+    def upcoming_appointments(self, id_column: str, user_id: int) -> QueryResult:
+        """
+        A doctor's or patient's Booked appointments from now on, oldest first.
+        The status and date filters run in the database. The date cutoff is
+        the start of today, which keeps the cache key stable for the day.
+        Earlier slots from today are then dropped from the small result.
+        Both use slot_now(), the clock bookings are written in.
+        """
+        now = slot_now()
+        today = now.strftime("%Y-%m-%d 00:00:00")
+
+        def build_query():
+            return (self.client.table("appointment").select(PROJECTIONS["cancellable_appointments"])
+                    .eq(id_column, user_id).eq("status", "Booked")
+                    .gte("appointment_datetime", today).order("appointment_datetime"))
+
+        df, error = self.cached_select(("appointment", "upcoming", id_column, user_id, today), build_query)
+        if df is not None:
+            df = df[df["appointment_datetime"] >= now]
+            if df.empty:
+                return None, "No data found in appointment table."
+        return df, error
+
+    def patient_appointments(self, id_column: str, patient_id: int) -> QueryResult:
+        """Every appointment of a patient, whatever its date or status."""
+        result = self.from_snapshot("appointment", PROJECTIONS["patient_appointments"], [(id_column, "=", patient_id)])
+        if result is not None:
+            return result
+        return self.query("appointment", id_column, patient_id, columns=PROJECTIONS["patient_appointments"])
+
+    def my_prescriptions(self, patient_id: int) -> QueryResult:
+        """Prescriptions written against any of this patient's appointments."""
+        appointment_ids = self.snapshot_keys("appointment", "appointment_id", [("patient_id", "=", patient_id)])
+        if appointment_ids is not None:
+            if not appointment_ids:
+                return None, "No data found in prescription table."
+            result = self.from_snapshot("prescription", PROJECTIONS["prescription_table"],
+                                        [("appointment_id", "in", appointment_ids)])
+            if result is not None:
+                return result
+        return self.query_via("prescription", "appointment", "patient_id", patient_id,
+                              "appointment_id", PROJECTIONS["prescription_table"])
@@ -0,0 +1,168 @@
+"""
+Column types for each table's DataFrames.
+
+pd.DataFrame(response.data) leaves enumerations such as status or
+gender as one string per row and timestamps as text. TABLE_DTYPES lists, per
+table, the columns worth converting: enumerations become categoricals
+(fixed categories where a CHECK constraint guarantees the values), ids
+nullable Int64, and dates/timestamps real datetime64 columns. Columns that
+are missing from a result, e.g. outside a view's projection, are skipped.
+
+With arrow=True ids and timestamps use Arrow-backed dtypes instead.
+Categoricals stay pandas categoricals, which are already compact.
+
+arrow_schema() and rows_to_arrow() give the same columns a fixed Arrow
+schema, for files written page by page (clinic.export, clinic.snapshots),
+where every page has to match the first.
+"""
+
+from typing import Dict, List, Union
+
+import pandas as pd
+
+# Marker for columns parsed with pd.to_datetime
+DATETIME = "datetime"
+
+DtypeSpec = Union[str, pd.CategoricalDtype]
+
+TABLE_DTYPES: Dict[str, Dict[str, DtypeSpec]] = {
+    "staff": {
+        "staff_id": "Int64",
+        "staff_type": pd.CategoricalDtype(["Doctor", "Nurse"]),
+    },
+    "doctor": {
+        "doctor_id": "Int64",
+        "specialization": "category",
+        "pstart": DATETIME,
+    },
+    "nurse": {
+        "nurse_id": "Int64",
+        "department": "category",
+        "shift_type": "category",
+    },
+    "patient": {
+        "patient_id": "Int64",
+        "date_of_birth": DATETIME,
+        "gender": "category",
+        "updated_at": DATETIME,
+    },
+    "clinic": {
+        "clinic_id": "Int64",
+    },
+    "appointment": {
+        "appointment_id": "Int64",
+        "patient_id": "Int64",
+        "doctor_id": "Int64",
+        "clinic_id": "Int64",
+        "appointment_datetime": DATETIME,
+        "status": pd.CategoricalDtype(["Booked", "Completed", "Cancelled"]),
+        "priority": pd.CategoricalDtype(["Low", "Medium", "High"], ordered=True),
+        "updated_at": DATETIME,
+    },
+    "payment": {
+        "payment_id": "Int64",
+        "appointment_id": "Int64",
+        "payment_method": pd.CategoricalDtype(["Cash", "Card", "UPI", "Insurance"]),
+        "payment_status": pd.CategoricalDtype(["Pending", "Paid", "Failed"]),
+        "payment_date": DATETIME,
+    },
+    "appointment_doctor_day": {
+        "period": DATETIME,
+        "doctor_id": "Int64",
+        "status": "category",
+        "appointments": "Int64",
+    },
+    "appointment_doctor_month": {
+        "period": DATETIME,
+        "doctor_id": "Int64",
+        "status": "category",
+        "appointments": "Int64",
+    },
+    "payment_doctor_day": {
+        "period": DATETIME,
+        "doctor_id": "Int64",
+        "payment_status": "category",
+        "payments": "Int64",
+    },
+    "payment_doctor_month": {
+        "period": DATETIME,
+        "doctor_id": "Int64",
+        "payment_status": "category",
+        "payments": "Int64",
+    },
+    "prescription": {
+        "prescription_id": "Int64",
+        "appointment_id": "Int64",
+        "prescription_date": DATETIME,
+        "updated_at": DATETIME,
+    },
+}
+
+ARROW_DTYPES = {"Int64": "int64[pyarrow]", DATETIME: "timestamp[us][pyarrow]"}
+
+# Numeric columns TABLE_DTYPES leaves alone; arrow_schema makes every other
+# unregistered column text
+NUMERIC_COLUMNS = {"amount"}
+
+
+def apply_schema(table_name: str, df: pd.DataFrame, arrow: bool = False) -> pd.DataFrame:
+    """Return df with its table's registered dtypes applied; unregistered columns are left alone."""
+    dtypes = TABLE_DTYPES.get(table_name)
+    if not dtypes or df.empty:
+        return df
+    converted = {}
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype == DATETIME:
+            # ISO8601 covers SQLite's "2026-10-17 09:00:00" and PostgREST's "2026-10-17T09:00:00"
+            values = pd.to_datetime(values, format="ISO8601", errors="coerce")
+            if getattr(values.dt, "tz", None) is not None:
+                values = values.dt.tz_convert(None)
+        if arrow and dtype in ARROW_DTYPES:
+            dtype = ARROW_DTYPES[dtype]
+        converted[column] = values if dtype == DATETIME else values.astype(dtype)
+    return df.assign(**converted)
+
+
+def memory_footprint(df: pd.DataFrame) -> int:
+    """Bytes held by df, including the contents of object and string columns."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def arrow_schema(table_name: str, columns: List[str]):
+    """Arrow types for columns of table_name: ids as int64, dates as timestamps, categories as text."""
+    import pyarrow as pa
+
+    dtypes = TABLE_DTYPES.get(table_name, {})
+    fields = []
+    for column in columns:
+        dtype = dtypes.get(column)
+        if dtype == "Int64":
+            arrow_type = pa.int64()
+        elif dtype == DATETIME:
+            arrow_type = pa.timestamp("us")
+        elif column in NUMERIC_COLUMNS:
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+
+def rows_to_arrow(rows: List[dict], schema):
+    """Response rows as an Arrow table of exactly schema."""
+    import pyarrow as pa
+
+    arrays = []
+    for field in schema:
+        values = pa.array([row.get(field.name) for row in rows])
+        if pa.types.is_timestamp(field.type) and pa.types.is_string(values.type):
+            try:
+                values = values.cast(field.type)
+            except pa.ArrowInvalid:
+                # PostgREST sends timestamptz with an offset; keep UTC wall time, as apply_schema does
+                values = values.cast(pa.timestamp("us", "UTC")).cast(field.type)
+        arrays.append(values.cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
@@ -0,0 +1,148 @@
+"""
+In-memory patient search: prefix matches on name, phone and email, plus
+fuzzy name matches through a trigram index.
+
+The index is built once per version of the patient directory
+(clinic.reference) with vectorized numpy operations. Each query costs a
+few binary searches plus one pass over the postings of its trigrams, so it
+stays in the low milliseconds at a million patients.
+
+- Prefix keys live in sorted fixed-width byte arrays: the full lowercased
+  name and each later name token ("aarav sharma", "sharma"), the phone
+  digits, and the email. A prefix query is two np.searchsorted calls.
+- Fuzzy matching uses a CSR trigram index over the padded lowercased
+  name. A candidate's score is the share of the query's trigrams it
+  contains; candidates that share under half of them are dropped.
+"""
+
+import re
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+SEARCH_COLUMNS = ["patient_id", "name", "phone", "email"]
+MIN_FUZZY_LENGTH = 3
+MIN_FUZZY_SCORE = 0.5
+
+
+# String work runs in Arrow compute kernels; a Python loop over a million
+# names would dominate the build
+
+def normalise(values: pd.Series) -> pa.Array:
+    text = pa.array(values.fillna("").astype(str).to_numpy(dtype=object), type=pa.string())
+    return pc.replace_substring_regex(pc.utf8_trim_whitespace(pc.utf8_lower(text)), r"\s+", " ")
+
+
+def to_bytes(values: pa.Array) -> np.ndarray:
+    return np.array(values.cast(pa.binary()).to_numpy(zero_copy_only=False), dtype=bytes)
+
+
+class PrefixArray:
+    """Sorted byte keys with the row each key came from."""
+
+    def __init__(self, keys: pa.Array, rows: np.ndarray):
+        keys = to_bytes(keys)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.rows = rows[order]
+
+    def match(self, prefix: str, limit: int) -> np.ndarray:
+        if not prefix:
+            return self.rows[:0]
+        q = prefix.encode("utf-8")
+        lo = np.searchsorted(self.keys, q, side="left")
+        hi = np.searchsorted(self.keys, q + b"\xff", side="left")
+        return self.rows[lo:min(hi, lo + limit)]
+
+
+def trigram_codes(names: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, code) for every trigram of every padded name; names is a fixed-width bytes array."""
+    width = names.dtype.itemsize
+    chars = names.view(np.uint8).reshape(len(names), width).astype(np.int32)
+    rows, codes = [], []
+    for i in range(width - 2):
+        code = (chars[:, i] << 16) | (chars[:, i + 1] << 8) | chars[:, i + 2]
+        present = chars[:, i + 2] != 0
+        rows.append(np.nonzero(present)[0])
+        codes.append(code[present])
+    return np.concatenate(rows), np.concatenate(codes)
+
+
+class PatientSearchIndex:
+    def __init__(self, patients: pd.DataFrame):
+        df = patients.reindex(columns=SEARCH_COLUMNS).reset_index(drop=True)
+        self.patients = df
+        n = len(df)
+        rows = np.arange(n)
+
+        names = normalise(df["name"])
+        # Every word after the first is a key too, so "sharma" finds "Aarav Sharma"
+        words = pc.split_pattern(names, " ")
+        flat = pc.list_flatten(words)
+        parents = pc.list_parent_indices(words).to_numpy()
+        later = np.arange(len(flat)) - words.offsets.to_numpy()[:-1][parents] > 0
+        self.names = PrefixArray(pa.concat_arrays([names, flat.filter(pa.array(later))]),
+                                 np.concatenate([rows, parents[later]]))
+        self.phones = PrefixArray(pc.replace_substring_regex(normalise(df["phone"]), r"\D", ""), rows)
+        self.emails = PrefixArray(normalise(df["email"]), rows)
+        self.ids = df["patient_id"].to_numpy(dtype="int64", na_value=-1)
+
+        # Trigram postings in CSR form: rows of trigram code c are
+        # posting_rows[starts[k]:starts[k + 1]] where codes_sorted[k] == c
+        padded = to_bytes(pc.binary_join_element_wise("  ", names, " ", ""))
+        trigram_rows, trigram_codes_ = trigram_codes(padded) if n else (np.array([], int), np.array([], int))
+        pairs = np.sort((trigram_codes_.astype(np.int64) << 32) | trigram_rows)
+        if len(pairs):
+            # A trigram repeated within one name counts once
+            pairs = pairs[np.concatenate([[True], pairs[1:] != pairs[:-1]])]
+        codes = (pairs >> 32).astype(np.int32)
+        self.posting_rows = (pairs & 0xFFFFFFFF).astype(np.int32)
+        starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]])) if len(codes) else np.array([], int)
+        self.codes = codes[starts]
+        self.starts = np.append(starts, len(codes))
+
+    def __len__(self) -> int:
+        return len(self.patients)
+
+    def fuzzy(self, query: str, limit: int) -> np.ndarray:
+        padded = to_bytes(pa.array(["  " + query + " "]))
+        _, codes = trigram_codes(padded)
+        codes = np.unique(codes)
+        positions = np.searchsorted(self.codes, codes)
+        known = (positions < len(self.codes)) & (self.codes[np.minimum(positions, len(self.codes) - 1)] == codes)
+        postings = [self.posting_rows[self.starts[p]:self.starts[p + 1]] for p in positions[known]]
+        if not postings:
+            return np.array([], dtype=np.int64)
+        scores = np.bincount(np.concatenate(postings), minlength=len(self.patients)) / len(codes)
+        candidates = np.nonzero(scores >= MIN_FUZZY_SCORE)[0]
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def search(self, query: str, k: int = 20) -> pd.DataFrame:
+        """
+        Up to k patients matching query, best first: an exact patient_id,
+        then name/phone/email prefix matches, then fuzzy name matches.
+        """
+        q = re.sub(r"\s+", " ", query.lower().strip())
+        if not q:
+            return self.patients.iloc[:0]
+        matches: List[np.ndarray] = []
+        digits = re.sub(r"[\s()+-]", "", q)
+        if digits.isdigit():
+            matches.append(np.nonzero(self.ids == int(digits))[0])
+            matches.append(self.phones.match(digits, k))
+        if "@" in q:
+            matches.append(self.emails.match(q, k))
+            matches.append(self.names.match(q, k))
+        else:
+            matches.append(self.names.match(q, k))
+            matches.append(self.emails.match(q, k))
+        found = list(dict.fromkeys(np.concatenate(matches).tolist()))[:k]
+        if len(found) < k and len(q) >= MIN_FUZZY_LENGTH:
+            seen = set(found)
+            found += [r for r in self.fuzzy(q, k + len(found)).tolist() if r not in seen][:k - len(found)]
+        return self.patients.iloc[found]
@@ -0,0 +1,89 @@
+"""
+Single-flight execution: concurrent callers asking for the same key share
+one call.
+
+When a clinic opens, dozens of sessions miss the query cache for the same
+appointment list or doctor list at the same instant. Without coordination
+each sends its own identical request. With SingleFlight the first caller
+(the leader) runs the query; callers arriving while it is in flight
+(followers) wait for and share its result, or its exception.
+
+Keys are tuples whose first element is a table name, like QueryCache keys.
+After a write, forget(table) detaches in-flight calls that read the table,
+so callers arriving after the write start a fresh query instead of joining
+one that may have read the old rows.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+
+class _Call:
+    def __init__(self, tables: frozenset):
+        self.tables = tables
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """Thread-safe; share one instance per process."""
+
+    def __init__(self):
+        self._calls: Dict[Tuple, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders: Dict[str, int] = {}
+        self.followers: Dict[str, int] = {}
+
+    def do(self, key: Tuple[Hashable, ...], fn: Callable[[], Any], depends_on: Iterable[str] = ()) -> Any:
+        """Run fn() for key, unless a call for key is already in flight, in which case wait for its result."""
+        table_name = key[0]
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(frozenset((table_name, *depends_on)))
+            counts = self.leaders if leader else self.followers
+            counts[table_name] = counts.get(table_name, 0) + 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key: Tuple[Hashable, ...]) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def forget(self, *table_names: str):
+        """Let calls made from now on start afresh rather than join a flight reading these tables."""
+        with self._lock:
+            for key in [key for key, call in self._calls.items() if not call.tables.isdisjoint(table_names)]:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            leaders, followers = sum(self.leaders.values()), sum(self.followers.values())
+            tables = sorted(set(self.leaders) | set(self.followers))
+            return {
+                "in_flight": len(self._calls),
+                "loads": leaders,
+                "coalesced": followers,
+                # Share of cache misses that were served by another caller's query
+                "coalescing_ratio": round(followers / (leaders + followers), 3) if leaders + followers else 0.0,
+                "by_table": {t: {"loads": self.leaders.get(t, 0), "coalesced": self.followers.get(t, 0)}
+                             for t in tables},
+            }
@@ -0,0 +1,162 @@
+"""
+Appointment slots: each doctor's free slots over a date window, and
+bookings that cannot collide.
+
+Clinic hours are split into fixed SLOT_MINUTES slots. A SlotIndex keeps a
+doctor's booked start times sorted, so checking a slot is a bisect rather
+than a scan of the appointment table, and "next N free slots" is one walk
+over the slot grid. SlotBook builds one index per (doctor, window) from a
+single query and keeps it in the shared query cache, where bookings and
+cancellations invalidate it along with everything else on "appointment".
+
+The index only decides what to offer. Double-booking is prevented by the
+database: a partial unique index on (doctor_id, appointment_datetime) over
+non-cancelled appointments (sql/001_appointment_slot_guard.sql for
+Supabase; the SQLite backend creates it itself). Of two concurrent inserts
+for the same slot exactly one succeeds, and the other raises SlotTaken.
+"""
+
+import bisect
+import datetime
+from typing import Iterable, List, Optional
+
+from clinic.cache import QueryCache
+
+SLOT_MINUTES = 15
+DAY_START = datetime.time(9, 0)
+DAY_END = datetime.time(18, 0)  # the last slot ends here
+WINDOW_DAYS = 14
+
+# Bookings are always written in this form so the unique index compares
+# like with like (SQLite stores the text as-is)
+SLOT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SlotTaken(Exception):
+    """Raised when the slot was booked by someone else first."""
+
+
+def slot_now() -> datetime.datetime:
+    """
+    Now, on the clock slots are written in: the server's local wall time,
+    naive. Everything that decides whether a slot is in the past uses it.
+    """
+    return datetime.datetime.now()
+
+
+def format_slot(when: datetime.datetime) -> str:
+    return when.strftime(SLOT_FORMAT)
+
+
+def parse_slot(value: str) -> datetime.datetime:
+    # PostgREST returns "2026-10-17T09:00:00", SQLite "2026-10-17 09:00:00"
+    return datetime.datetime.fromisoformat(str(value)).replace(tzinfo=None)
+
+
+def day_slots(day: datetime.date) -> List[datetime.datetime]:
+    step = datetime.timedelta(minutes=SLOT_MINUTES)
+    when = datetime.datetime.combine(day, DAY_START)
+    end = datetime.datetime.combine(day, DAY_END)
+    slots = []
+    while when + step <= end:
+        slots.append(when)
+        when += step
+    return slots
+
+
+def is_conflict(e: Exception) -> bool:
+    """True if e is a unique-constraint violation (Postgres SQLSTATE 23505)."""
+    return getattr(e, "code", None) == "23505" or "duplicate key value" in str(e)
+
+
+class SlotIndex:
+    """Sorted booked start times for one doctor over one window."""
+
+    def __init__(self, booked: Iterable[datetime.datetime], start_day: datetime.date, days: int):
+        self.starts = sorted(booked)
+        self.start_day = start_day
+        self.days = days
+        self.duration = datetime.timedelta(minutes=SLOT_MINUTES)
+
+    def is_free(self, start: datetime.datetime) -> bool:
+        # A booking at b overlaps [start, start + duration) iff start - duration < b < start + duration.
+        # Bookings made before slots existed can sit off the grid, hence the interval check.
+        i = bisect.bisect_right(self.starts, start - self.duration)
+        return i == len(self.starts) or self.starts[i] >= start + self.duration
+
+    def free_slots(self, after: Optional[datetime.datetime] = None, limit: Optional[int] = None,
+                   from_day: Optional[datetime.date] = None) -> List[datetime.datetime]:
+        """Free slots in the window in time order, skipping any that start at or before after."""
+        free = []
+        day = max(from_day or self.start_day, self.start_day)
+        end_day = self.start_day + datetime.timedelta(days=self.days)
+        while day < end_day:
+            for slot in day_slots(day):
+                if (after is None or slot > after) and self.is_free(slot):
+                    free.append(slot)
+                    if limit is not None and len(free) >= limit:
+                        return free
+            day += datetime.timedelta(days=1)
+        return free
+
+
+class SlotBook:
+    """Builds cached SlotIndexes and books appointments through the slot guard."""
+
+    def __init__(self, client, cache: QueryCache):
+        self.client = client
+        self.cache = cache
+
+    def index(self, doctor_id: int, start_day: datetime.date, days: int = WINDOW_DAYS) -> SlotIndex:
+        def load():
+            start = datetime.datetime.combine(start_day, datetime.time())
+            end = start + datetime.timedelta(days=days)
+            response = (self.client.table("appointment").select("appointment_datetime")
+                        .eq("doctor_id", doctor_id).neq("status", "Cancelled")
+                        .gte("appointment_datetime", format_slot(start))
+                        .lt("appointment_datetime", format_slot(end))
+                        .execute())
+            return SlotIndex((parse_slot(r["appointment_datetime"]) for r in response.data or []), start_day, days)
+
+        return self.cache.get_or_load(("appointment", "slot_index", doctor_id, start_day, days), load)
+
+    def next_slots(self, doctor_id: int, from_day: Optional[datetime.date] = None, n: int = 20,
+                   days: int = WINDOW_DAYS) -> List[datetime.datetime]:
+        """The next n free slots for a doctor, starting at from_day (default today) and never in the past."""
+        now = slot_now()
+        from_day = max(from_day or now.date(), now.date())
+        return self.index(doctor_id, from_day, days).free_slots(after=now, limit=n)
+
+    def check(self, doctor_id: int, when: datetime.datetime):
+        """Raise SlotTaken if the cached index already shows the slot as booked."""
+        if not self.index(doctor_id, when.date(), 1).is_free(when):
+            raise SlotTaken(f"{format_slot(when)} is no longer available.")
+
+    @staticmethod
+    def appointment_row(patient_id: Optional[int], doctor_id: int, clinic_id: int, when: datetime.datetime,
+                        reason: str, priority: str = "Medium") -> dict:
+        """The appointment row a booking inserts."""
+        return {
+            "patient_id": patient_id,
+            "doctor_id": doctor_id,
+            "clinic_id": clinic_id,
+            "appointment_datetime": format_slot(when),
+            "status": "Booked",
+            "reason": reason,
+            "priority": priority,
+        }
+
+    def book(self, patient_id: int, doctor_id: int, clinic_id: int, when: datetime.datetime,
+             reason: str, priority: str = "Medium") -> dict:
+        """Insert a Booked appointment, raising SlotTaken if the slot is already held."""
+        self.check(doctor_id, when)
+        try:
+            response = self.client.table("appointment").insert(
+                self.appointment_row(patient_id, doctor_id, clinic_id, when, reason, priority)).execute()
+        except Exception as e:
+            if is_conflict(e):
+                self.cache.invalidate("appointment")
+                raise SlotTaken(f"{format_slot(when)} was just booked by someone else.") from e
+            raise
+        self.cache.invalidate("appointment")
+        return response.data[0] if response.data else {}
@@ -0,0 +1,414 @@
+"""
+Local columnar snapshots of the tables behind the history views: a
+patient's appointments and prescriptions, and a doctor's patient list.
+
+Each table is mirrored to one Parquet file in the snapshot directory,
+sorted by the column its views filter on and split into small row groups.
+A read passes its filter (e.g. patient_id = 42) to the Parquet reader,
+which uses each row group's min/max statistics to skip the groups that
+can't match. Only the groups that can match are read from the
+memory-mapped file and decoded. Nothing goes over the network.
+
+The mirrors are kept current the way clinic.feed keeps the live
+appointment view. After one full load, a refresh asks only for rows whose
+updated_at is at or after the watermark (less an overlap). The changed
+rows go to a small delta file beside the sorted one ({table}.delta.parquet),
+which a read lays over it by primary key, so a refresh never rewrites the
+whole mirror. Once the delta passes COMPACT_ROWS, a background thread
+merges it into a new sorted file and swaps it in; reads meanwhile use the
+current pair. Refreshes are rate limited per table. The watermark is
+stored in the files' metadata, and a file lock covers every swap, so
+several server processes share one mirror and its polls. After a write
+through this app, invalidate() makes the next read poll first, so the
+write shows up.
+
+A read returns None when the mirror can't answer, and the caller queries
+the database instead (ClinicRepository does). That happens while the
+mirror's first full load runs (always on a background thread; a read only
+ever polls), when the table has no updated_at column
+(sql/004_history_updated_at.sql), when refreshes have failed for longer
+than max_staleness, or when the file can't be read.
+Deleted rows stay in the mirror. The app never deletes these rows:
+cancelling an appointment is an update.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from clinic.feed import format_watermark
+from clinic.reference import FileLock, fcntl
+from clinic.repository import FETCH_PAGE_SIZE, PROJECTIONS
+from clinic.schema import apply_schema, arrow_schema, rows_to_arrow
+
+logger = logging.getLogger("clinic.snapshots")
+
+# Per mirrored table: primary key, and the column the file is sorted by so
+# that the views' filters prune row groups
+SNAPSHOT_TABLES = {
+    "appointment": {"key": "appointment_id", "sort_by": "patient_id"},
+    "prescription": {"key": "prescription_id", "sort_by": "appointment_id"},
+    "patient": {"key": "patient_id", "sort_by": "patient_id"},
+}
+
+# Small enough that a filter on the sort column decodes a few thousand rows
+ROW_GROUP_ROWS = 4096
+
+# Every read loads the whole delta, so it's folded into the sorted file
+# once it gets this big
+COMPACT_ROWS = 10000
+
+# Filters in pyarrow's form, e.g. [("patient_id", "=", 42)]
+Filters = List[tuple]
+
+
+class Mirror:
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+        self.key = SNAPSHOT_TABLES[table_name]["key"]
+        self.sort_by = SNAPSHOT_TABLES[table_name]["sort_by"]
+        self.columns = [c.strip() for c in PROJECTIONS[f"{table_name}_snapshot"].split(",")]
+        self.lock = threading.Lock()
+        self.available = True
+        self.dirty = True
+        self.compacting = False
+        self.loading = False            # a full load is running
+        self.loader: Optional[threading.Thread] = None
+        self.delta_rows = 0
+        self.last_refresh = 0.0         # monotonic, this process
+        self.refreshed_at = 0.0         # wall clock of the last successful refresh
+        self.stats = {"full_loads": 0, "polls": 0, "compactions": 0, "rows_fetched": 0, "rows_changed": 0,
+                      "reads": 0, "misses": 0, "errors": 0}
+
+
+def newest_per_key(table, key: str):
+    """The rows of table with the latest updated_at for each key."""
+    import numpy as np
+    import pyarrow as pa
+
+    if table.num_rows == 0:
+        return table
+    table = table.sort_by([(key, "ascending"), ("updated_at", "descending")])
+    keys = table[key].to_numpy()
+    return table.filter(pa.array(np.concatenate([[True], keys[1:] != keys[:-1]])))
+
+
+def without_keys(table, key: str, keys):
+    import pyarrow.compute as pc
+
+    return table.filter(pc.invert(pc.is_in(table[key], value_set=keys)))
+
+
+class SnapshotStore:
+    """Thread-safe; one instance per server process, any number per snapshot_dir."""
+
+    def __init__(self, client, snapshot_dir: str, min_interval: float = 5.0, max_staleness: float = 300.0,
+                 overlap: float = 5.0, compact_rows: int = COMPACT_ROWS):
+        self.client = client
+        self.snapshot_dir = snapshot_dir
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.min_interval = min_interval
+        self.max_staleness = max_staleness
+        self.overlap = pd.Timedelta(seconds=overlap)
+        self.compact_rows = compact_rows
+        self.mirrors: Dict[str, Mirror] = {name: Mirror(name) for name in SNAPSHOT_TABLES}
+        self.loader_lock = threading.Lock()
+
+    def path(self, mirror: Mirror) -> str:
+        return os.path.join(self.snapshot_dir, f"{mirror.table_name}.parquet")
+
+    def delta_path(self, mirror: Mirror) -> str:
+        return os.path.join(self.snapshot_dir, f"{mirror.table_name}.delta.parquet")
+
+    def file_lock(self, mirror: Mirror):
+        """Held while the files are swapped, and while a read opens them, so it never sees half a swap."""
+        return FileLock(self.path(mirror) + ".lock") if fcntl is not None else nullcontext()
+
+    # --- Reading ---
+
+    def read(self, table_name: str, columns: List[str], filters: Optional[Filters] = None) -> Optional[pd.DataFrame]:
+        """
+        columns of the mirrored rows matching filters, typed like
+        ClinicRepository's frames, or None if the mirror can't answer.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        mirror = self.mirrors[table_name]
+        if not mirror.available:
+            return None
+        if mirror.loading or not os.path.exists(self.path(mirror)):
+            self.load_in_background(mirror)
+            mirror.stats["misses"] += 1
+            return None
+        try:
+            self.refresh(table_name, load=False)
+        except Exception as e:
+            mirror.stats["errors"] += 1
+            logger.warning("Refreshing the %s snapshot failed: %s", table_name, e)
+            if not mirror.available or time.time() - mirror.refreshed_at > self.max_staleness:
+                mirror.stats["misses"] += 1
+                return None
+        try:
+            # Mapped files stay readable after a swap replaces them
+            with self.file_lock(mirror):
+                base = pa.memory_map(self.path(mirror))
+                delta_path = self.delta_path(mirror)
+                delta = pa.memory_map(delta_path) if os.path.exists(delta_path) else None
+            wanted = columns + [c for c in dict.fromkeys([mirror.sort_by, mirror.key]) if c not in columns]
+            table = pq.read_table(base, columns=wanted, filters=filters or None)
+            if delta is not None:
+                delta = pq.read_table(delta)
+                table = without_keys(table, mirror.key, delta[mirror.key])
+                if filters:
+                    delta = delta.filter(pq.filters_to_expression(filters))
+                table = pa.concat_tables([table, delta.select(table.column_names)])
+                if delta.num_rows:
+                    table = table.sort_by([(mirror.sort_by, "ascending"), (mirror.key, "ascending")])
+        except Exception as e:
+            logger.warning("Could not read the %s snapshot: %s", table_name, e)
+            mirror.stats["misses"] += 1
+            return None
+        mirror.stats["reads"] += 1
+        return apply_schema(table_name, table.select(columns).to_pandas())
+
+    # --- Refreshing ---
+
+    def prewarm(self) -> threading.Thread:
+        """
+        Build or catch up every mirror on a background thread. Until a
+        mirror's first full load is done, its reads go to the database.
+        """
+        def refresh_all():
+            for table_name in self.mirrors:
+                self.refresh_logged(table_name)
+
+        thread = threading.Thread(target=refresh_all, name="clinic-snapshot-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def load_in_background(self, mirror: Mirror) -> threading.Thread:
+        """Start a refresh (a full load, if there's no file yet) on a background thread, or join the running one."""
+        with self.loader_lock:
+            if mirror.loader is None or not mirror.loader.is_alive():
+                mirror.loader = threading.Thread(target=self.refresh_logged, args=(mirror.table_name,),
+                                                 name=f"clinic-snapshot-load-{mirror.table_name}", daemon=True)
+                mirror.loader.start()
+            return mirror.loader
+
+    def refresh_logged(self, table_name: str):
+        try:
+            self.refresh(table_name)
+        except Exception as e:
+            self.mirrors[table_name].stats["errors"] += 1
+            logger.warning("Refreshing the %s snapshot failed: %s", table_name, e)
+
+    def invalidate(self, *table_names: str):
+        """After a write: the next read of these tables polls for changes first."""
+        for table_name in table_names:
+            if table_name in self.mirrors:
+                self.mirrors[table_name].dirty = True
+
+    def refresh(self, table_name: str, force: bool = False, load: bool = True) -> int:
+        """
+        Bring the mirror up to date. Returns how many rows changed (all of
+        them on a full load). With load=False a missing or unreadable file
+        isn't loaded here but on a background thread, and 0 is returned.
+        """
+        mirror = self.mirrors[table_name]
+        with mirror.lock:
+            if not (force or mirror.dirty) and time.monotonic() - mirror.last_refresh < self.min_interval:
+                return 0
+            base, delta = self.metadata(self.path(mirror)), self.metadata(self.delta_path(mirror))
+            if not delta and os.path.exists(self.delta_path(mirror)):
+                # Unreadable: the next poll fetches its rows again from the sorted file's watermark
+                with self.file_lock(mirror):
+                    os.unlink(self.delta_path(mirror))
+            refreshed_at = max(base.get("refreshed_at", 0.0), delta.get("refreshed_at", 0.0))
+            mirror.delta_rows = delta.get("rows", 0)
+            # Another process refreshed it just now
+            if not (force or mirror.dirty) and time.time() - refreshed_at < self.min_interval:
+                changed = 0
+            elif not base:
+                if not load:
+                    self.load_in_background(mirror)
+                    return 0
+                mirror.loading = True
+                try:
+                    with self.file_lock(mirror):
+                        changed = self.full_load(mirror)
+                finally:
+                    mirror.loading = False
+            else:
+                stamps = [m["watermark"] for m in (base, delta) if m.get("watermark") is not None]
+                changed = self.poll(mirror, max(stamps) if stamps else None)
+            mirror.stats["rows_changed"] += changed
+            mirror.dirty = False
+            mirror.last_refresh = time.monotonic()
+            mirror.refreshed_at = time.time()
+            if mirror.delta_rows >= self.compact_rows and not mirror.compacting:
+                mirror.compacting = True
+                threading.Thread(target=self.compact, args=(mirror,), name=f"clinic-snapshot-compact-{table_name}",
+                                 daemon=True).start()
+            return changed
+
+    def metadata(self, path: str) -> Dict[str, Any]:
+        import pyarrow.parquet as pq
+
+        if not os.path.exists(path):
+            return {}
+        try:
+            file_metadata = pq.read_metadata(path, memory_map=True)
+        except Exception as e:
+            logger.warning("Replacing unreadable snapshot %s: %s", path, e)
+            return {}
+        raw = file_metadata.metadata or {}
+        watermark = raw.get(b"clinic_watermark", b"").decode()
+        return {"watermark": pd.Timestamp(watermark) if watermark else None,
+                "refreshed_at": float(raw.get(b"clinic_refreshed_at", b"0")), "rows": file_metadata.num_rows}
+
+    def fetch(self, mirror: Mirror, since: Optional[str] = None):
+        """Rows of the mirrored columns, all of them or those updated since, as one Arrow table."""
+        import pyarrow as pa
+
+        schema = arrow_schema(mirror.table_name, mirror.columns)
+        columns = ", ".join(mirror.columns)
+        batches, start = [], 0
+        while True:
+            query = self.client.table(mirror.table_name).select(columns)
+            if since is not None:
+                query = query.gte("updated_at", since).order("updated_at")
+            query = query.order(mirror.key)
+            try:
+                page = query.range(start, start + FETCH_PAGE_SIZE - 1).execute().data or []
+            except Exception as e:
+                if "does not exist" in str(e).lower():
+                    logger.warning("%s.updated_at is missing, reading %s from the database instead",
+                                   mirror.table_name, mirror.table_name)
+                    mirror.available = False
+                raise
+            mirror.stats["rows_fetched"] += len(page)
+            if page:
+                batches.append(rows_to_arrow(page, schema))
+            if len(page) < FETCH_PAGE_SIZE:
+                return pa.concat_tables(batches) if batches else schema.empty_table()
+            start += FETCH_PAGE_SIZE
+
+    def full_load(self, mirror: Mirror) -> int:
+        table = self.fetch(mirror)
+        mirror.stats["full_loads"] += 1
+        if os.path.exists(self.delta_path(mirror)):
+            os.unlink(self.delta_path(mirror))
+        mirror.delta_rows = 0
+        self.write(mirror, self.path(mirror), table, sort=True)
+        return table.num_rows
+
+    def poll(self, mirror: Mirror, watermark: Optional[pd.Timestamp]) -> int:
+        """Fetch the rows changed since watermark and add them to the delta file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        since = format_watermark(watermark - self.overlap) if watermark is not None else "1970-01-01"
+        changed = newest_per_key(self.fetch(mirror, since), mirror.key)
+        mirror.stats["polls"] += 1
+        if changed.num_rows == 0:
+            return 0
+
+        with self.file_lock(mirror):
+            delta_path = self.delta_path(mirror)
+            delta = pq.read_table(delta_path, memory_map=True) if os.path.exists(delta_path) else None
+            # Drop rows we already hold at this version or newer (the overlap re-reads them)
+            held = pq.read_table(self.path(mirror), columns=[mirror.key, "updated_at"], memory_map=True,
+                                 filters=[(mirror.key, "in", changed[mirror.key].to_pylist())])
+            if delta is not None:
+                held = pa.concat_tables([held, delta.select([mirror.key, "updated_at"])])
+            held_stamps = {}
+            for key, stamp in zip(held[mirror.key].to_pylist(), held["updated_at"].to_pylist()):
+                held_stamps[key] = max(stamp, held_stamps.get(key, stamp))
+            is_new = [key not in held_stamps or stamp > held_stamps[key]
+                      for key, stamp in zip(changed[mirror.key].to_pylist(), changed["updated_at"].to_pylist())]
+            changed = changed.filter(pa.array(is_new, type=pa.bool_()))
+            if changed.num_rows == 0:
+                return 0
+            if delta is not None:
+                changed = pa.concat_tables([without_keys(delta, mirror.key, changed[mirror.key]), changed])
+            self.write(mirror, delta_path, changed)
+            mirror.delta_rows = changed.num_rows
+        return int(sum(is_new))
+
+    def compact(self, mirror: Mirror):
+        """Merge the delta into a new sorted file and swap it in (on a background thread)."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path, delta_path = self.path(mirror), self.delta_path(mirror)
+        tmp_path = None
+        try:
+            with self.file_lock(mirror):
+                if not os.path.exists(delta_path):
+                    return
+                base = pa.memory_map(path)
+                folded = pq.read_table(delta_path, memory_map=True)
+            # The slow part runs unlocked; polls keep adding to the delta meanwhile
+            merged = pa.concat_tables([without_keys(pq.read_table(base), mirror.key, folded[mirror.key]), folded])
+            tmp_path = self.write(mirror, None, merged, sort=True)
+            with self.file_lock(mirror):
+                delta = pq.read_table(delta_path, memory_map=True)
+                # Keep the delta rows that arrived after the merge started
+                folded_stamps = dict(zip(folded[mirror.key].to_pylist(), folded["updated_at"].to_pylist()))
+                keep = [key not in folded_stamps or stamp > folded_stamps[key]
+                        for key, stamp in zip(delta[mirror.key].to_pylist(), delta["updated_at"].to_pylist())]
+                delta = delta.filter(pa.array(keep, type=pa.bool_()))
+                # New sorted file first: until the delta is trimmed, it only repeats rows the file now has
+                os.replace(tmp_path, path)
+                tmp_path = None
+                if delta.num_rows:
+                    self.write(mirror, delta_path, delta)
+                else:
+                    os.unlink(delta_path)
+                mirror.delta_rows = delta.num_rows
+            mirror.stats["compactions"] += 1
+        except Exception as e:
+            mirror.stats["errors"] += 1
+            logger.warning("Compacting the %s snapshot failed: %s", mirror.table_name, e)
+        finally:
+            if tmp_path is not None:
+                os.unlink(tmp_path)
+            mirror.compacting = False
+
+    def write(self, mirror: Mirror, path: Optional[str], table, sort: bool = False) -> str:
+        """Write table to path atomically, or to a temporary file returned for the caller to move into place."""
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        if sort:
+            table = table.sort_by([(mirror.sort_by, "ascending"), (mirror.key, "ascending")])
+        newest = pc.max(table["updated_at"]).as_py() if table.num_rows else None
+        table = table.replace_schema_metadata({
+            b"clinic_watermark": format_watermark(pd.Timestamp(newest)).encode() if newest else b"",
+            b"clinic_refreshed_at": repr(time.time()).encode(),
+        })
+        # Write then rename, so readers never see a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, prefix=f".{mirror.table_name}-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pq.write_table(table, f, row_group_size=ROW_GROUP_ROWS, compression="zstd")
+            if path is not None:
+                os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path if path is None else path
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {"available": m.available, "delta_rows": m.delta_rows,
+                   "age_s": round(time.time() - m.refreshed_at, 1) if m.refreshed_at else None, **m.stats}
+            for name, m in self.mirrors.items()
+        }
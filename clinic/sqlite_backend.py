@@ -0,0 +1,705 @@
+"""
+A SQLite implementation of the backend interface in clinic.backend.
+
+It mirrors the clinic schema and the parts of PostgREST the app uses:
+column lists with one level of embedded resources ("doctor_id, staff(name)",
+"..., appointment!inner()"), filters on base or embedded columns, ordering,
+ranges, exact counts, and insert/update returning the affected rows.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("clinic.sqlite_backend")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS staff (
+    staff_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT UNIQUE,
+    phone TEXT,
+    address TEXT,
+    staff_type TEXT CHECK (staff_type IN ('Doctor', 'Nurse'))
+);
+CREATE TABLE IF NOT EXISTS doctor (
+    doctor_id INTEGER PRIMARY KEY REFERENCES staff (staff_id) ON DELETE CASCADE,
+    specialization TEXT,
+    pstart TEXT
+);
+CREATE TABLE IF NOT EXISTS nurse (
+    nurse_id INTEGER PRIMARY KEY REFERENCES staff (staff_id) ON DELETE CASCADE,
+    department TEXT,
+    shift_type TEXT CHECK (shift_type IN ('Morning', 'Evening', 'Night'))
+);
+CREATE TABLE IF NOT EXISTS patient (
+    patient_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT UNIQUE,
+    phone TEXT,
+    date_of_birth TEXT,
+    gender TEXT,
+    address TEXT,
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    idempotency_key TEXT
+);
+CREATE TABLE IF NOT EXISTS clinic (
+    clinic_id INTEGER PRIMARY KEY,
+    name TEXT,
+    address TEXT
+);
+CREATE TABLE IF NOT EXISTS clinic_contact (
+    clinic_id INTEGER REFERENCES clinic (clinic_id) ON DELETE CASCADE,
+    contact_number TEXT,
+    PRIMARY KEY (clinic_id, contact_number)
+);
+CREATE TABLE IF NOT EXISTS appointment (
+    appointment_id INTEGER PRIMARY KEY,
+    patient_id INTEGER REFERENCES patient (patient_id),
+    doctor_id INTEGER REFERENCES doctor (doctor_id),
+    clinic_id INTEGER REFERENCES clinic (clinic_id),
+    appointment_datetime TEXT,
+    status TEXT CHECK (status IN ('Booked', 'Completed', 'Cancelled')),
+    reason TEXT,
+    priority TEXT CHECK (priority IN ('Low', 'Medium', 'High')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    idempotency_key TEXT
+);
+CREATE TABLE IF NOT EXISTS payment (
+    payment_id INTEGER PRIMARY KEY,
+    appointment_id INTEGER UNIQUE REFERENCES appointment (appointment_id),
+    amount REAL,
+    payment_method TEXT CHECK (payment_method IN ('Cash', 'Card', 'UPI', 'Insurance')),
+    payment_status TEXT CHECK (payment_status IN ('Pending', 'Paid', 'Failed')),
+    payment_date TEXT
+);
+CREATE TABLE IF NOT EXISTS prescription (
+    prescription_id INTEGER PRIMARY KEY,
+    appointment_id INTEGER REFERENCES appointment (appointment_id),
+    diagnosis TEXT,
+    medicines TEXT,
+    advice TEXT,
+    prescription_date TEXT,
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TABLE IF NOT EXISTS prescription_medicine (
+    prescription_id INTEGER REFERENCES prescription (prescription_id) ON DELETE CASCADE,
+    medicine_name TEXT,
+    dosage TEXT,
+    duration TEXT,
+    PRIMARY KEY (prescription_id, medicine_name)
+);
+CREATE TABLE IF NOT EXISTS nurse_doctor (
+    nurse_id INTEGER REFERENCES nurse (nurse_id) ON DELETE CASCADE,
+    doctor_id INTEGER REFERENCES doctor (doctor_id) ON DELETE CASCADE,
+    PRIMARY KEY (nurse_id, doctor_id)
+);
+CREATE INDEX IF NOT EXISTS appointment_doctor_idx ON appointment (doctor_id, appointment_datetime);
+CREATE INDEX IF NOT EXISTS appointment_patient_idx ON appointment (patient_id);
+CREATE INDEX IF NOT EXISTS appointment_datetime_idx ON appointment (appointment_datetime);
+CREATE INDEX IF NOT EXISTS payment_date_idx ON payment (payment_date);
+CREATE INDEX IF NOT EXISTS prescription_appointment_idx ON prescription (appointment_id);
+CREATE INDEX IF NOT EXISTS staff_type_idx ON staff (staff_type);
+"""
+
+# Keeps updated_at current on the tables polled by watermark: appointment
+# for clinic.feed, patient and prescription too for clinic.snapshots (UTC,
+# millisecond precision, like sql/002 and sql/004). The insert trigger only
+# matters for databases that gained the column via ALTER TABLE, which can't
+# give it a non-constant default.
+TRACKED_TABLES = {"appointment": "appointment_id", "patient": "patient_id", "prescription": "prescription_id"}
+
+CHANGE_TRACKING = "".join(f"""
+CREATE INDEX IF NOT EXISTS {table}_updated_idx ON {table} (updated_at);
+CREATE TRIGGER IF NOT EXISTS {table}_insert_stamp AFTER INSERT ON {table}
+WHEN NEW.updated_at IS NULL BEGIN
+    UPDATE {table} SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE {key} = NEW.{key};
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_update_stamp AFTER UPDATE ON {table}
+WHEN NEW.updated_at IS OLD.updated_at BEGIN
+    UPDATE {table} SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE {key} = NEW.{key};
+END;
+""" for table, key in TRACKED_TABLES.items())
+
+# Keys of rows inserted through clinic.writes, so an insert sent twice
+# conflicts instead of adding a second row, like sql/005_idempotency_keys.sql
+IDEMPOTENT_TABLES = ("appointment", "patient")
+
+IDEMPOTENCY_KEYS = "".join(f"""
+CREATE UNIQUE INDEX IF NOT EXISTS {table}_idempotency_key ON {table} (idempotency_key);
+""" for table in IDEMPOTENT_TABLES)
+
+# One live booking per doctor and start time (see clinic.slots). Kept out of
+# SCHEMA because databases created before it may already hold duplicates.
+SLOT_GUARD = """
+CREATE UNIQUE INDEX IF NOT EXISTS appointment_slot_guard ON appointment (doctor_id, appointment_datetime)
+    WHERE status <> 'Cancelled';
+"""
+
+# Trigger-maintained daily aggregates, and the per-doctor day and month
+# views over them that clinic.analytics reads, like sql/003_daily_aggregates.sql. Missing
+# doctor or clinic ids count as 0.
+DAILY_AGGREGATES = """
+CREATE TABLE IF NOT EXISTS appointment_daily (
+    day TEXT NOT NULL,
+    doctor_id INTEGER NOT NULL,
+    clinic_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    appointments INTEGER NOT NULL DEFAULT 0,
+    -- Key order matches the views' GROUP BY, so they read the index in order
+    PRIMARY KEY (day, doctor_id, status, clinic_id)
+);
+CREATE TABLE IF NOT EXISTS payment_daily (
+    day TEXT NOT NULL,
+    doctor_id INTEGER NOT NULL,
+    clinic_id INTEGER NOT NULL,
+    payment_method TEXT NOT NULL,
+    payment_status TEXT NOT NULL,
+    payments INTEGER NOT NULL DEFAULT 0,
+    amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, doctor_id, payment_status, clinic_id, payment_method)
+);
+CREATE INDEX IF NOT EXISTS appointment_daily_doctor_idx ON appointment_daily (doctor_id, day);
+CREATE INDEX IF NOT EXISTS payment_daily_doctor_idx ON payment_daily (doctor_id, day);
+CREATE VIEW IF NOT EXISTS appointment_doctor_day AS
+SELECT day AS period, doctor_id, status, sum(appointments) AS appointments
+FROM appointment_daily GROUP BY day, doctor_id, status HAVING sum(appointments) > 0;
+CREATE VIEW IF NOT EXISTS appointment_doctor_month AS
+SELECT substr(day, 1, 7) || '-01' AS period, doctor_id, status, sum(appointments) AS appointments
+FROM appointment_daily GROUP BY 1, doctor_id, status HAVING sum(appointments) > 0;
+CREATE VIEW IF NOT EXISTS payment_doctor_day AS
+SELECT day AS period, doctor_id, payment_status, sum(payments) AS payments, sum(amount) AS amount
+FROM payment_daily GROUP BY day, doctor_id, payment_status HAVING sum(payments) > 0;
+CREATE VIEW IF NOT EXISTS payment_doctor_month AS
+SELECT substr(day, 1, 7) || '-01' AS period, doctor_id, payment_status, sum(payments) AS payments,
+       sum(amount) AS amount
+FROM payment_daily GROUP BY 1, doctor_id, payment_status HAVING sum(payments) > 0;
+
+CREATE TRIGGER IF NOT EXISTS appointment_daily_insert AFTER INSERT ON appointment
+WHEN NEW.appointment_datetime IS NOT NULL BEGIN
+    INSERT INTO appointment_daily (day, doctor_id, clinic_id, status, appointments)
+    VALUES (substr(NEW.appointment_datetime, 1, 10), coalesce(NEW.doctor_id, 0), coalesce(NEW.clinic_id, 0),
+            coalesce(NEW.status, 'Unknown'), 1)
+    ON CONFLICT (day, doctor_id, status, clinic_id) DO UPDATE SET appointments = appointments + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS appointment_daily_delete AFTER DELETE ON appointment BEGIN
+    UPDATE appointment_daily SET appointments = appointments - 1
+    WHERE day = substr(OLD.appointment_datetime, 1, 10) AND doctor_id = coalesce(OLD.doctor_id, 0)
+      AND clinic_id = coalesce(OLD.clinic_id, 0) AND status = coalesce(OLD.status, 'Unknown');
+END;
+CREATE TRIGGER IF NOT EXISTS appointment_daily_update
+AFTER UPDATE OF appointment_datetime, doctor_id, clinic_id, status ON appointment BEGIN
+    UPDATE appointment_daily SET appointments = appointments - 1
+    WHERE day = substr(OLD.appointment_datetime, 1, 10) AND doctor_id = coalesce(OLD.doctor_id, 0)
+      AND clinic_id = coalesce(OLD.clinic_id, 0) AND status = coalesce(OLD.status, 'Unknown');
+    INSERT INTO appointment_daily (day, doctor_id, clinic_id, status, appointments)
+    SELECT substr(NEW.appointment_datetime, 1, 10), coalesce(NEW.doctor_id, 0), coalesce(NEW.clinic_id, 0),
+           coalesce(NEW.status, 'Unknown'), 1
+    WHERE NEW.appointment_datetime IS NOT NULL
+    ON CONFLICT (day, doctor_id, status, clinic_id) DO UPDATE SET appointments = appointments + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS payment_daily_insert AFTER INSERT ON payment
+WHEN NEW.payment_date IS NOT NULL BEGIN
+    INSERT INTO payment_daily (day, doctor_id, clinic_id, payment_method, payment_status, payments, amount)
+    SELECT substr(NEW.payment_date, 1, 10),
+           coalesce((SELECT doctor_id FROM appointment WHERE appointment_id = NEW.appointment_id), 0),
+           coalesce((SELECT clinic_id FROM appointment WHERE appointment_id = NEW.appointment_id), 0),
+           coalesce(NEW.payment_method, 'Unknown'), coalesce(NEW.payment_status, 'Unknown'),
+           1, coalesce(NEW.amount, 0)
+    WHERE true
+    ON CONFLICT (day, doctor_id, payment_status, clinic_id, payment_method)
+    DO UPDATE SET payments = payments + 1, amount = amount + excluded.amount;
+END;
+CREATE TRIGGER IF NOT EXISTS payment_daily_delete AFTER DELETE ON payment BEGIN
+    UPDATE payment_daily SET payments = payments - 1, amount = amount - coalesce(OLD.amount, 0)
+    WHERE day = substr(OLD.payment_date, 1, 10)
+      AND doctor_id = coalesce((SELECT doctor_id FROM appointment WHERE appointment_id = OLD.appointment_id), 0)
+      AND clinic_id = coalesce((SELECT clinic_id FROM appointment WHERE appointment_id = OLD.appointment_id), 0)
+      AND payment_method = coalesce(OLD.payment_method, 'Unknown')
+      AND payment_status = coalesce(OLD.payment_status, 'Unknown');
+END;
+CREATE TRIGGER IF NOT EXISTS payment_daily_update
+AFTER UPDATE OF payment_date, appointment_id, amount, payment_method, payment_status ON payment BEGIN
+    UPDATE payment_daily SET payments = payments - 1, amount = amount - coalesce(OLD.amount, 0)
+    WHERE day = substr(OLD.payment_date, 1, 10)
+      AND doctor_id = coalesce((SELECT doctor_id FROM appointment WHERE appointment_id = OLD.appointment_id), 0)
+      AND clinic_id = coalesce((SELECT clinic_id FROM appointment WHERE appointment_id = OLD.appointment_id), 0)
+      AND payment_method = coalesce(OLD.payment_method, 'Unknown')
+      AND payment_status = coalesce(OLD.payment_status, 'Unknown');
+    INSERT INTO payment_daily (day, doctor_id, clinic_id, payment_method, payment_status, payments, amount)
+    SELECT substr(NEW.payment_date, 1, 10),
+           coalesce((SELECT doctor_id FROM appointment WHERE appointment_id = NEW.appointment_id), 0),
+           coalesce((SELECT clinic_id FROM appointment WHERE appointment_id = NEW.appointment_id), 0),
+           coalesce(NEW.payment_method, 'Unknown'), coalesce(NEW.payment_status, 'Unknown'),
+           1, coalesce(NEW.amount, 0)
+    WHERE NEW.payment_date IS NOT NULL
+    ON CONFLICT (day, doctor_id, payment_status, clinic_id, payment_method)
+    DO UPDATE SET payments = payments + 1, amount = amount + excluded.amount;
+END;
+"""
+
+# Rebuilds the aggregates from the base tables, for databases that had rows
+# before DAILY_AGGREGATES was added
+REFRESH_DAILY_AGGREGATES = """
+DELETE FROM appointment_daily;
+INSERT INTO appointment_daily (day, doctor_id, clinic_id, status, appointments)
+SELECT substr(appointment_datetime, 1, 10), coalesce(doctor_id, 0), coalesce(clinic_id, 0),
+       coalesce(status, 'Unknown'), count(*)
+FROM appointment WHERE appointment_datetime IS NOT NULL
+GROUP BY 1, 2, 3, 4;
+DELETE FROM payment_daily;
+INSERT INTO payment_daily (day, doctor_id, clinic_id, payment_method, payment_status, payments, amount)
+SELECT substr(p.payment_date, 1, 10), coalesce(a.doctor_id, 0), coalesce(a.clinic_id, 0),
+       coalesce(p.payment_method, 'Unknown'), coalesce(p.payment_status, 'Unknown'),
+       count(*), coalesce(sum(p.amount), 0)
+FROM payment p LEFT JOIN appointment a ON a.appointment_id = p.appointment_id
+WHERE p.payment_date IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5;
+"""
+
+# (child table, child column, parent table, parent column): the foreign keys
+# PostgREST would use to resolve embedded resources.
+FOREIGN_KEYS = [
+    ("doctor", "doctor_id", "staff", "staff_id"),
+    ("nurse", "nurse_id", "staff", "staff_id"),
+    ("appointment", "patient_id", "patient", "patient_id"),
+    ("appointment", "doctor_id", "doctor", "doctor_id"),
+    ("appointment", "clinic_id", "clinic", "clinic_id"),
+    ("payment", "appointment_id", "appointment", "appointment_id"),
+    ("prescription", "appointment_id", "appointment", "appointment_id"),
+    ("clinic_contact", "clinic_id", "clinic", "clinic_id"),
+    ("prescription_medicine", "prescription_id", "prescription", "prescription_id"),
+    ("nurse_doctor", "nurse_id", "nurse", "nurse_id"),
+    ("nurse_doctor", "doctor_id", "doctor", "doctor_id"),
+]
+
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "in": "IN"}
+
+# SQLite caps bound parameters per statement; stay well below it
+MAX_PARAMS = 900
+
+EMBED_RE = re.compile(r"^(\w+)(?:!(\w+))?\((.*)\)$")
+
+
+class BackendError(Exception):
+    """Raised for errors PostgREST would report (unknown columns, constraint violations, ...)."""
+
+
+def split_columns(columns: str) -> List[str]:
+    """Split a select list on top-level commas, leaving embedded lists intact."""
+    items, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def to_sql_value(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    # dates, times, Decimals, numpy scalars
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class Embed:
+    def __init__(self, name: str, columns: List[str], inner: bool, one_to_many: bool,
+                 local_column: str, remote_column: str):
+        self.name = name
+        self.columns = columns
+        self.inner = inner
+        self.one_to_many = one_to_many
+        self.local_column = local_column
+        self.remote_column = remote_column
+        self.filters: List[Tuple[str, str, Any]] = []
+
+
+class SQLiteQuery:
+    def __init__(self, backend: "SQLiteBackend", table_name: str):
+        backend.check_table(table_name)
+        self.backend = backend
+        self.table_name = table_name
+        self.action = "select"
+        self.columns = "*"
+        self.count_method = None
+        self.head = False
+        self.payload = None
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.ordering: List[Tuple[str, bool]] = []
+        self.limit_rows: Optional[int] = None
+        self.offset_rows = 0
+
+    # --- Builder methods ---
+
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None) -> "SQLiteQuery":
+        self.columns = ",".join(columns) if columns else "*"
+        self.count_method = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, json: Any, **kwargs) -> "SQLiteQuery":
+        self.action = "insert"
+        self.payload = json if isinstance(json, list) else [json]
+        return self
+
+    def update(self, json: dict, **kwargs) -> "SQLiteQuery":
+        self.action = "update"
+        self.payload = json
+        return self
+
+    def _filter(self, column: str, op: str, value: Any) -> "SQLiteQuery":
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "lte", value)
+
+    def in_(self, column: str, values: Iterable) -> "SQLiteQuery":
+        return self._filter(column, "in", list(values))
+
+    def order(self, column: str, *, desc: bool = False, **kwargs) -> "SQLiteQuery":
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> "SQLiteQuery":
+        self.limit_rows = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs) -> "SQLiteQuery":
+        self.offset_rows = start
+        self.limit_rows = end - start + 1
+        return self
+
+    def execute(self) -> SimpleNamespace:
+        if self.action == "insert":
+            return self.backend.run_insert(self)
+        if self.action == "update":
+            return self.backend.run_update(self)
+        return self.backend.run_select(self)
+
+
+class SQLiteBackend:
+    """
+    Thread-safe. Writes go through one connection guarded by a lock, which
+    matches how SQLite serialises writers anyway. For file databases each
+    thread reads through its own connection, so concurrent reads (e.g. the
+    dashboard loader's pool) run in parallel under WAL. ":memory:" databases
+    share the single connection for reads too.
+    """
+
+    def __init__(self, path: str = "clinic.db"):
+        self.path = path
+        self.conn = self.connect()
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        with self.lock:
+            if path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.executescript(SCHEMA)
+            for table in TRACKED_TABLES:
+                columns = [r[1] for r in self.conn.execute(f"PRAGMA table_info({table})")]
+                if "updated_at" not in columns:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TEXT")
+            self.conn.executescript(CHANGE_TRACKING)
+            for table in IDEMPOTENT_TABLES:
+                columns = [r[1] for r in self.conn.execute(f"PRAGMA table_info({table})")]
+                if "idempotency_key" not in columns:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN idempotency_key TEXT")
+            self.conn.executescript(IDEMPOTENCY_KEYS)
+            tables = {r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.conn.executescript(DAILY_AGGREGATES)
+            if "appointment_daily" not in tables:
+                self.conn.executescript(REFRESH_DAILY_AGGREGATES)
+            try:
+                self.conn.executescript(SLOT_GUARD)
+            except sqlite3.IntegrityError as e:
+                logger.warning("Appointment slot guard not created, existing bookings overlap: %s", e)
+        self.refresh_schema()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Yield a connection for a read on the current thread."""
+        if self.path == ":memory:":
+            with self.lock:
+                yield self.conn
+            return
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self.connect()
+        yield conn
+
+    def refresh_schema(self):
+        """Re-read table columns, e.g. after applying extra DDL with executescript."""
+        with self.lock:
+            names = [r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")]
+            self.table_columns: Dict[str, List[str]] = {
+                name: [r[1] for r in self.conn.execute(f'PRAGMA table_info("{name}")')] for name in names
+            }
+
+    def table(self, table_name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, table_name)
+
+    def executescript(self, sql: str):
+        with self.lock:
+            self.conn.executescript(sql)
+        self.refresh_schema()
+
+    def bulk_insert(self, table_name: str, rows: Iterable[dict], batch_size: int = 10000) -> int:
+        """Fast path for seeding: executemany without returning rows. Returns rows written."""
+        self.check_table(table_name)
+        written = 0
+        batch: List[dict] = []
+        columns: Optional[List[str]] = None
+        for row in rows:
+            if columns is None:
+                columns = list(row)
+                for col in columns:
+                    self.check_column(table_name, col)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                written += self._insert_many(table_name, columns, batch)
+                batch = []
+        if batch:
+            written += self._insert_many(table_name, columns, batch)
+        return written
+
+    def _insert_many(self, table_name: str, columns: List[str], rows: List[dict]) -> int:
+        sql = f'INSERT INTO "{table_name}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+        with self.lock, self.conn:
+            self.conn.executemany(sql, ([to_sql_value(r.get(c)) for c in columns] for r in rows))
+        return len(rows)
+
+    # --- Schema checks (column and table names are interpolated into SQL) ---
+
+    def check_table(self, table_name: str):
+        if table_name not in self.table_columns:
+            raise BackendError(f'relation "public.{table_name}" does not exist')
+
+    def check_column(self, table_name: str, column: str):
+        if column not in self.table_columns[table_name]:
+            raise BackendError(f"column {table_name}.{column} does not exist")
+
+    def relationship(self, table_name: str, other: str) -> Tuple[bool, str, str]:
+        """Return (one_to_many, local column, remote column) for embedding other into table_name."""
+        for child, child_col, parent, parent_col in FOREIGN_KEYS:
+            if child == table_name and parent == other:
+                return False, child_col, parent_col
+        for child, child_col, parent, parent_col in FOREIGN_KEYS:
+            if parent == table_name and child == other:
+                return True, parent_col, child_col
+        raise BackendError(f"Could not find a relationship between '{table_name}' and '{other}' in the schema cache")
+
+    # --- Query execution ---
+
+    def parse_columns(self, query: SQLiteQuery) -> Tuple[List[str], Dict[str, Embed]]:
+        table_name = query.table_name
+        base: List[str] = []
+        embeds: Dict[str, Embed] = {}
+        for item in split_columns(query.columns):
+            match = EMBED_RE.match(item)
+            if match:
+                name, hint, inner_cols = match.groups()
+                self.check_table(name)
+                one_to_many, local, remote = self.relationship(table_name, name)
+                cols = [c.strip() for c in inner_cols.split(",") if c.strip()]
+                if cols == ["*"]:
+                    cols = list(self.table_columns[name])
+                for col in cols:
+                    self.check_column(name, col)
+                embeds[name] = Embed(name, cols, hint == "inner", one_to_many, local, remote)
+            elif item == "*":
+                base.extend(c for c in self.table_columns[table_name] if c not in base)
+            else:
+                self.check_column(table_name, item)
+                base.append(item)
+        return base, embeds
+
+    def where_clause(self, query: SQLiteQuery, embeds: Dict[str, Embed]) -> Tuple[str, list]:
+        clauses, params = [], []
+        for column, op, value in query.filters:
+            if "." in column:
+                embed_name, embed_col = column.split(".", 1)
+                if embed_name not in embeds:
+                    raise BackendError(f"'{embed_name}' is not an embedded resource in this request")
+                self.check_column(embed_name, embed_col)
+                embeds[embed_name].filters.append((embed_col, op, value))
+                continue
+            self.check_column(query.table_name, column)
+            clause, clause_params = self.condition(column, op, value)
+            clauses.append(clause)
+            params.extend(clause_params)
+
+        # Inner embeds keep only rows that have a matching (filtered) related row
+        for embed in embeds.values():
+            if not embed.inner:
+                continue
+            sub_clauses = [f'"{embed.name}"."{embed.remote_column}" = "{query.table_name}"."{embed.local_column}"']
+            for col, op, value in embed.filters:
+                clause, clause_params = self.condition(f'"{embed.name}"."{col}"', op, value)
+                sub_clauses.append(clause)
+                params.extend(clause_params)
+            clauses.append(f'EXISTS (SELECT 1 FROM "{embed.name}" WHERE {" AND ".join(sub_clauses)})')
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @staticmethod
+    def condition(column: str, op: str, value: Any) -> Tuple[str, list]:
+        if op not in OPERATORS:
+            raise BackendError(f"Unsupported filter operator '{op}'")
+        if op == "in":
+            values = [to_sql_value(v) for v in value]
+            if not values:
+                return "0", []
+            return f"{column} IN ({', '.join('?' * len(values))})", values
+        if value is None and op in ("eq", "neq"):
+            return f"{column} IS {'NOT ' if op == 'neq' else ''}NULL", []
+        return f"{column} {OPERATORS[op]} ?", [to_sql_value(value)]
+
+    def run_select(self, query: SQLiteQuery) -> SimpleNamespace:
+        table_name = query.table_name
+        base, embeds = self.parse_columns(query)
+        where, params = self.where_clause(query, embeds)
+
+        count = None
+        if query.count_method:
+            with self.reader() as conn:
+                count = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"{where}', params).fetchone()[0]
+        if query.head:
+            return SimpleNamespace(data=[], count=count)
+
+        # Columns needed to attach embeds, even if not requested
+        fetch_cols = list(base)
+        for embed in embeds.values():
+            if embed.local_column not in fetch_cols:
+                fetch_cols.append(embed.local_column)
+
+        select_list = ", ".join(f'"{table_name}"."{c}"' for c in fetch_cols)
+        sql = f'SELECT {select_list} FROM "{table_name}"{where}'
+        order_params = []
+        if query.ordering:
+            parts = []
+            for column, desc in query.ordering:
+                self.check_column(table_name, column)
+                parts.append(f'"{column}" {"DESC" if desc else "ASC"}')
+            sql += " ORDER BY " + ", ".join(parts)
+        if query.limit_rows is not None:
+            sql += " LIMIT ? OFFSET ?"
+            order_params = [query.limit_rows, query.offset_rows]
+        elif query.offset_rows:
+            sql += " LIMIT -1 OFFSET ?"
+            order_params = [query.offset_rows]
+
+        with self.reader() as conn:
+            rows = [dict(r) for r in conn.execute(sql, params + order_params)]
+
+        for embed in embeds.values():
+            self.attach_embed(rows, embed)
+
+        extra = set(fetch_cols) - set(base)
+        if extra:
+            for row in rows:
+                for col in extra:
+                    del row[col]
+        return SimpleNamespace(data=rows, count=count)
+
+    def attach_embed(self, rows: List[dict], embed: Embed):
+        if not embed.columns:
+            return  # empty embeds like appointment!inner() only filter
+        keys = sorted({r[embed.local_column] for r in rows if r[embed.local_column] is not None})
+        cols = list(embed.columns)
+        if embed.remote_column not in cols:
+            cols.append(embed.remote_column)
+        related: Dict[Any, List[dict]] = {}
+        for start in range(0, len(keys), MAX_PARAMS):
+            chunk = keys[start:start + MAX_PARAMS]
+            clauses = [f'"{embed.remote_column}" IN ({", ".join("?" * len(chunk))})']
+            params = list(chunk)
+            for col, op, value in embed.filters:
+                clause, clause_params = self.condition(f'"{col}"', op, value)
+                clauses.append(clause)
+                params.extend(clause_params)
+            sql = f'SELECT {", ".join(cols)} FROM "{embed.name}" WHERE {" AND ".join(clauses)}'
+            with self.reader() as conn:
+                for r in conn.execute(sql, params):
+                    r = dict(r)
+                    related.setdefault(r[embed.remote_column], []).append(
+                        {c: r[c] for c in embed.columns})
+        for row in rows:
+            matches = related.get(row[embed.local_column], [])
+            row[embed.name] = matches if embed.one_to_many else (matches[0] if matches else None)
+
+    def run_insert(self, query: SQLiteQuery) -> SimpleNamespace:
+        table_name = query.table_name
+        inserted = []
+        try:
+            with self.lock, self.conn:
+                for row in query.payload:
+                    for col in row:
+                        self.check_column(table_name, col)
+                    cols = list(row)
+                    sql = (f'INSERT INTO "{table_name}" ({", ".join(cols)}) '
+                           f'VALUES ({", ".join("?" * len(cols))}) RETURNING *')
+                    cursor = self.conn.execute(sql, [to_sql_value(row[c]) for c in cols])
+                    inserted.append(dict(cursor.fetchone()))
+        except sqlite3.IntegrityError as e:
+            raise BackendError(self.describe_integrity_error(e)) from e
+        return SimpleNamespace(data=inserted, count=None)
+
+    def run_update(self, query: SQLiteQuery) -> SimpleNamespace:
+        table_name = query.table_name
+        for col in query.payload:
+            self.check_column(table_name, col)
+        where, params = self.where_clause(query, {})
+        assignments = ", ".join(f'"{c}" = ?' for c in query.payload)
+        sql = f'UPDATE "{table_name}" SET {assignments}{where} RETURNING *'
+        values = [to_sql_value(v) for v in query.payload.values()]
+        try:
+            with self.lock, self.conn:
+                rows = [dict(r) for r in self.conn.execute(sql, values + params)]
+        except sqlite3.IntegrityError as e:
+            raise BackendError(self.describe_integrity_error(e)) from e
+        return SimpleNamespace(data=rows, count=None)
+
+    @staticmethod
+    def describe_integrity_error(e: sqlite3.IntegrityError) -> str:
+        message = str(e)
+        if message.startswith("UNIQUE"):
+            return f"duplicate key value violates unique constraint ({message})"
+        if message.startswith("FOREIGN KEY"):
+            return "insert or update violates foreign key constraint"
+        return message
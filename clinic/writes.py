@@ -0,0 +1,330 @@
+"""
+A write-behind queue for the inserts users wait on: bookings and sign-ups.
+
+Submitting a form appends a job to a local SQLite file and returns its id,
+which takes a millisecond or two whatever the database is doing. A worker
+thread per process drains the file. It claims the due jobs in one batch,
+inserts each table's rows with one request, and records every job's
+outcome (the inserted row, or an error) for the session to read back
+with get().
+
+Every job carries an idempotency key chosen by the client: see
+idempotency_key(), which hashes a per-form nonce with the row. Submitting
+a key that is already queued returns the existing job, so a double-clicked
+submit queues one insert. The key is also written with the row. With
+sql/005_idempotency_keys.sql its unique index turns a repeated insert (a
+retry after a timeout, or a job re-run after its worker died) into a
+conflict, and the worker reads back the row holding the key instead.
+Without that column keys are only checked in the queue, and, as in
+clinic.async_backend, only requests that never reached the server are
+retried.
+
+Transient failures are retried with capped, full-jitter exponential
+backoff, up to max_attempts. A batch the database rejects (e.g. one slot
+already taken) is retried row by row, so a bad row fails only its own job.
+A job can depend on another and take columns of its inserted row, e.g. a
+new patient's patient_id for their first appointment. If the other job
+fails, so does this one.
+
+One queue file can be shared by several server processes. Jobs are claimed
+under a write transaction with a lease, and a job whose worker died is
+claimed again once its lease runs out.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from clinic.async_backend import is_transient, never_sent
+from clinic.slots import is_conflict
+
+logger = logging.getLogger("clinic.writes")
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS write_job (
+    job_id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    table_name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    depends_on INTEGER REFERENCES write_job (job_id),
+    fill TEXT,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS write_job_due_idx ON write_job (status, next_attempt_at);
+"""
+
+FINISHED = ("done", "failed")
+
+# What a session is told when the database rejects its row as a duplicate
+CONFLICT_MESSAGES = {
+    "appointment": "That slot was just booked by someone else. Please choose another slot.",
+    "patient": "An account with these details already exists.",
+}
+
+
+def idempotency_key(nonce: str, row: dict) -> str:
+    """The same key for a repeated submit of one form, a new one once the row or the nonce changes."""
+    digest = hashlib.sha256(nonce.encode())
+    digest.update(json.dumps(row, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:32]
+
+
+class WriteQueue:
+    """Thread-safe; one instance (and worker) per server process, any number per queue file."""
+
+    def __init__(self, client, path: str, batch_size: int = 50, max_attempts: int = 5, backoff: float = 0.5,
+                 max_backoff: float = 30.0, lease: float = 60.0, poll_interval: float = 1.0,
+                 retention: float = 86400.0, on_commit: Optional[Callable[[str], None]] = None):
+        self.client = client
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # Called with a table name on the worker thread after rows are inserted into it
+        self.on_commit = on_commit
+        # Tables without an idempotency_key column (sql/005 not applied)
+        self.unkeyed = set()
+        self.local = threading.local()
+        self.wake = threading.Event()
+        self.worker: Optional[threading.Thread] = None
+        self.start_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.counters = {"submitted": 0, "deduplicated": 0, "batches": 0, "inserted": 0, "retries": 0,
+                         "failed": 0}
+        self.connection().executescript(QUEUE_SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection to the queue file, in autocommit mode."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            self.local.conn = conn
+        return conn
+
+    def count(self, name: str, n: int = 1):
+        with self.stats_lock:
+            self.counters[name] += n
+
+    # --- Sessions ---
+
+    def submit(self, table_name: str, row: dict, key: str, depends_on: Optional[int] = None,
+               fill: Optional[Dict[str, str]] = None) -> int:
+        """
+        Queue an insert of row and return its job id, or the id of the job
+        already queued under key. fill maps columns of row to columns of the
+        row inserted by job depends_on, copied in before the insert.
+        """
+        conn = self.connection()
+        cursor = conn.execute(
+            "INSERT INTO write_job (idempotency_key, table_name, payload, depends_on, fill, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+            (key, table_name, json.dumps(row, default=str), depends_on, json.dumps(fill) if fill else None,
+             time.time()))
+        self.count("submitted" if cursor.rowcount else "deduplicated")
+        job_id = conn.execute("SELECT job_id FROM write_job WHERE idempotency_key = ?", (key,)).fetchone()[0]
+        self.start()
+        self.wake.set()
+        return job_id
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """A job's status ('pending', 'running', 'done' or 'failed'), inserted row and error."""
+        row = self.connection().execute(
+            "SELECT job_id, table_name, status, attempts, result, error FROM write_job WHERE job_id = ?",
+            (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def wait(self, job_ids: Iterable[int], timeout: float = 30.0) -> List[Optional[Dict[str, Any]]]:
+        """The jobs once all have finished, or as they stand after timeout seconds."""
+        job_ids = list(job_ids)
+        deadline = time.monotonic() + timeout
+        while True:
+            jobs = [self.get(job_id) for job_id in job_ids]
+            if all(job is None or job["status"] in FINISHED for job in jobs) or time.monotonic() > deadline:
+                return jobs
+            time.sleep(0.01)
+
+    # --- Worker ---
+
+    def start(self) -> threading.Thread:
+        with self.start_lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name="clinic-write-worker", daemon=True)
+                self.worker.start()
+            return self.worker
+
+    def run(self):
+        last_prune = 0.0
+        while True:
+            # Cleared before draining, so a job submitted meanwhile wakes the next wait
+            self.wake.clear()
+            try:
+                claimed = self.drain()
+                if time.monotonic() - last_prune > 60:
+                    self.prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                logger.warning("Write queue worker failed: %s", e)
+                claimed = 0
+            if not claimed:
+                self.wake.wait(self.idle_wait())
+
+    def idle_wait(self) -> float:
+        """Seconds until the next retry is due, at most poll_interval (other processes may queue jobs too)."""
+        due = self.connection().execute(
+            "SELECT min(next_attempt_at) FROM write_job WHERE status = 'pending'").fetchone()[0]
+        return self.poll_interval if due is None else min(max(due - time.time(), 0.0), self.poll_interval)
+
+    def drain(self) -> int:
+        """Claim the due jobs, up to batch_size, and run them. Returns how many were claimed."""
+        jobs = self.claim()
+        by_table: Dict[str, List[dict]] = {}
+        for job in jobs:
+            by_table.setdefault(job["table_name"], []).append(job)
+        for table_name, table_jobs in by_table.items():
+            self.count("batches")
+            try:
+                self.insert(table_name, table_jobs)
+            except Exception as e:
+                # e.g. reading back a conflicting row failed; the keys make another try safe
+                self.retry(table_jobs, e)
+        return len(jobs)
+
+    def claim(self) -> List[dict]:
+        conn = self.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE write_job SET status = 'failed', finished_at = ?, "
+                "error = (SELECT error FROM write_job parent WHERE parent.job_id = write_job.depends_on) "
+                "WHERE status = 'pending' AND depends_on IN (SELECT job_id FROM write_job WHERE status = 'failed')",
+                (now,))
+            rows = conn.execute(
+                "SELECT job.*, parent.result AS parent_result FROM write_job job "
+                "LEFT JOIN write_job parent ON parent.job_id = job.depends_on "
+                "WHERE ((job.status = 'pending' AND job.next_attempt_at <= ?) "
+                "       OR (job.status = 'running' AND job.claimed_at < ?)) "
+                "  AND (job.depends_on IS NULL OR parent.status = 'done') "
+                "ORDER BY job.job_id LIMIT ?",
+                (now, now - self.lease, self.batch_size)).fetchall()
+            conn.executemany("UPDATE write_job SET status = 'running', claimed_at = ? WHERE job_id = ?",
+                             [(now, r["job_id"]) for r in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        jobs = []
+        for r in rows:
+            row = json.loads(r["payload"])
+            if r["fill"]:
+                parent = json.loads(r["parent_result"] or "{}")
+                for column, source in json.loads(r["fill"]).items():
+                    row[column] = parent.get(source)
+            jobs.append({"job_id": r["job_id"], "key": r["idempotency_key"], "table_name": r["table_name"],
+                         "row": row, "attempts": r["attempts"]})
+        return jobs
+
+    def insert(self, table_name: str, jobs: List[dict]):
+        keyed = table_name not in self.unkeyed
+        rows = [dict(job["row"], idempotency_key=job["key"]) if keyed else job["row"] for job in jobs]
+        try:
+            inserted = self.client.table(table_name).insert(rows).execute().data or []
+        except Exception as e:
+            if keyed and "idempotency_key" in str(e) and "does not exist" in str(e).lower():
+                logger.warning("%s.idempotency_key is missing (sql/005_idempotency_keys.sql); "
+                               "repeated inserts are only caught in the queue", table_name)
+                self.unkeyed.add(table_name)
+                return self.insert(table_name, jobs)
+            if is_transient(e):
+                if keyed or never_sent(e):
+                    self.retry(jobs, e)
+                else:
+                    self.fail(jobs, f"The database did not confirm the write, please check before retrying ({e})")
+                return
+            if len(jobs) > 1:
+                # The whole batch was rejected; find the offending rows, the rest still go in
+                for job in jobs:
+                    self.insert(table_name, [job])
+                return
+            if is_conflict(e) and keyed:
+                existing = (self.client.table(table_name).select("*")
+                            .eq("idempotency_key", jobs[0]["key"]).execute().data)
+                if existing:
+                    # Inserted by an earlier attempt
+                    self.complete(table_name, jobs, existing)
+                    return
+            self.fail(jobs, CONFLICT_MESSAGES.get(table_name, str(e)) if is_conflict(e) else str(e))
+            return
+        self.complete(table_name, jobs, inserted)
+
+    def complete(self, table_name: str, jobs: List[dict], inserted: List[dict]):
+        if inserted and all("idempotency_key" in row for row in inserted):
+            by_key = {row["idempotency_key"]: row for row in inserted}
+            results = [by_key.get(job["key"], {}) for job in jobs]
+        else:
+            results = inserted + [{}] * (len(jobs) - len(inserted))
+        now = time.time()
+        self.connection().executemany(
+            "UPDATE write_job SET status = 'done', attempts = attempts + 1, finished_at = ?, result = ?, error = NULL "
+            "WHERE job_id = ?",
+            [(now, json.dumps(result, default=str), job["job_id"]) for job, result in zip(jobs, results)])
+        self.count("inserted", len(jobs))
+        if self.on_commit is not None:
+            try:
+                self.on_commit(table_name)
+            except Exception as e:
+                logger.warning("on_commit(%s) failed: %s", table_name, e)
+
+    def retry(self, jobs: List[dict], error: Exception):
+        now = time.time()
+        for job in jobs:
+            attempts = job["attempts"] + 1
+            if attempts >= self.max_attempts:
+                self.fail([job], str(error))
+                continue
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempts))
+            self.connection().execute(
+                "UPDATE write_job SET status = 'pending', attempts = ?, next_attempt_at = ?, error = ? "
+                "WHERE job_id = ?", (attempts, now + delay, str(error), job["job_id"]))
+            self.count("retries")
+
+    def fail(self, jobs: List[dict], error: str):
+        self.connection().executemany(
+            "UPDATE write_job SET status = 'failed', attempts = attempts + 1, finished_at = ?, error = ? "
+            "WHERE job_id = ?", [(time.time(), error, job["job_id"]) for job in jobs])
+        self.count("failed", len(jobs))
+
+    def prune(self):
+        """Forget jobs that finished more than retention seconds ago."""
+        self.connection().execute("DELETE FROM write_job WHERE status IN ('done', 'failed') AND finished_at < ?",
+                                  (time.time() - self.retention,))
+
+    def stats(self) -> Dict[str, Any]:
+        depth = dict(self.connection().execute(
+            "SELECT status, count(*) FROM write_job WHERE status IN ('pending', 'running') GROUP BY status").fetchall())
+        with self.stats_lock:
+            return {**self.counters, "pending": depth.get("pending", 0), "running": depth.get("running", 0),
+                    "unkeyed_tables": sorted(self.unkeyed)}
@@ -0,0 +1,16 @@
+-- One live booking per doctor and start time. Concurrent inserts for the
+-- same slot race on this index, so exactly one of them succeeds; the others
+-- fail with SQLSTATE 23505, which the app reports as "slot already taken".
+-- Cancelled appointments are excluded so their slots can be booked again.
+--
+-- Existing duplicates must be resolved before the index can be built:
+--
+--   SELECT doctor_id, appointment_datetime, count(*)
+--   FROM appointment
+--   WHERE status <> 'Cancelled'
+--   GROUP BY 1, 2
+--   HAVING count(*) > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS appointment_slot_guard
+    ON appointment (doctor_id, appointment_datetime)
+    WHERE status <> 'Cancelled';
@@ -0,0 +1,22 @@
+-- Change tracking for the nurse dashboard's live appointment feed
+-- (clinic/feed.py). It polls for rows with updated_at at or after its last
+-- watermark instead of re-reading the table, so every insert and update
+-- must move updated_at forward.
+
+ALTER TABLE appointment
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS appointment_updated_at_idx ON appointment (updated_at);
+
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS appointment_touch ON appointment;
+CREATE TRIGGER appointment_touch
+    BEFORE UPDATE ON appointment
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
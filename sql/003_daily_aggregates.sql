@@ -0,0 +1,147 @@
+-- Daily aggregates for the analytics tab (clinic/analytics.py).
+--
+-- appointment_daily counts appointments per day, doctor, clinic and status;
+-- payment_daily totals payments per day, doctor, clinic, method and status.
+-- Triggers keep both current on every insert, update and delete. Missing
+-- doctor or clinic ids are stored as 0.
+--
+-- The dashboard reads the *_doctor_day and *_doctor_month views, which roll
+-- the tables up to the grain it shows (period, doctor, status) and drop rows
+-- whose count fell to zero: a doctor's month is a few hundred rows and the
+-- clinic's year a couple of thousand, instead of every appointment and
+-- payment.
+--
+-- refresh_daily_aggregates() rebuilds both tables from scratch; it runs once
+-- at the end of this script and can be scheduled (e.g. nightly with pg_cron)
+-- to repair drift from bulk loads done with triggers disabled.
+
+CREATE TABLE IF NOT EXISTS appointment_daily (
+    day date NOT NULL,
+    doctor_id integer NOT NULL,
+    clinic_id integer NOT NULL,
+    status text NOT NULL,
+    appointments integer NOT NULL DEFAULT 0,
+    -- Key order matches the views' GROUP BY, so they read the index in order
+    PRIMARY KEY (day, doctor_id, status, clinic_id)
+);
+
+CREATE TABLE IF NOT EXISTS payment_daily (
+    day date NOT NULL,
+    doctor_id integer NOT NULL,
+    clinic_id integer NOT NULL,
+    payment_method text NOT NULL,
+    payment_status text NOT NULL,
+    payments integer NOT NULL DEFAULT 0,
+    amount numeric(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, doctor_id, payment_status, clinic_id, payment_method)
+);
+
+CREATE INDEX IF NOT EXISTS appointment_daily_doctor_idx ON appointment_daily (doctor_id, day);
+CREATE INDEX IF NOT EXISTS payment_daily_doctor_idx ON payment_daily (doctor_id, day);
+
+CREATE OR REPLACE VIEW appointment_doctor_day AS
+SELECT day AS period, doctor_id, status, sum(appointments)::integer AS appointments
+FROM appointment_daily
+GROUP BY day, doctor_id, status
+HAVING sum(appointments) > 0;
+
+CREATE OR REPLACE VIEW appointment_doctor_month AS
+SELECT date_trunc('month', day)::date AS period, doctor_id, status, sum(appointments)::integer AS appointments
+FROM appointment_daily
+GROUP BY 1, doctor_id, status
+HAVING sum(appointments) > 0;
+
+CREATE OR REPLACE VIEW payment_doctor_day AS
+SELECT day AS period, doctor_id, payment_status, sum(payments)::integer AS payments, sum(amount) AS amount
+FROM payment_daily
+GROUP BY day, doctor_id, payment_status
+HAVING sum(payments) > 0;
+
+CREATE OR REPLACE VIEW payment_doctor_month AS
+SELECT date_trunc('month', day)::date AS period, doctor_id, payment_status,
+       sum(payments)::integer AS payments, sum(amount) AS amount
+FROM payment_daily
+GROUP BY 1, doctor_id, payment_status
+HAVING sum(payments) > 0;
+
+CREATE OR REPLACE FUNCTION count_appointment_daily() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE appointment_daily SET appointments = appointments - 1
+        WHERE day = OLD.appointment_datetime::date
+          AND doctor_id = coalesce(OLD.doctor_id, 0)
+          AND clinic_id = coalesce(OLD.clinic_id, 0)
+          AND status = coalesce(OLD.status, 'Unknown');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.appointment_datetime IS NOT NULL THEN
+        INSERT INTO appointment_daily (day, doctor_id, clinic_id, status, appointments)
+        VALUES (NEW.appointment_datetime::date, coalesce(NEW.doctor_id, 0), coalesce(NEW.clinic_id, 0),
+                coalesce(NEW.status, 'Unknown'), 1)
+        ON CONFLICT (day, doctor_id, status, clinic_id)
+        DO UPDATE SET appointments = appointment_daily.appointments + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS appointment_daily_count ON appointment;
+CREATE TRIGGER appointment_daily_count
+    AFTER INSERT OR DELETE OR UPDATE OF appointment_datetime, doctor_id, clinic_id, status ON appointment
+    FOR EACH ROW EXECUTE FUNCTION count_appointment_daily();
+
+CREATE OR REPLACE FUNCTION total_payment_daily() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    a_doctor integer;
+    a_clinic integer;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT doctor_id, clinic_id INTO a_doctor, a_clinic FROM appointment WHERE appointment_id = OLD.appointment_id;
+        UPDATE payment_daily SET payments = payments - 1, amount = amount - coalesce(OLD.amount, 0)
+        WHERE day = OLD.payment_date::date
+          AND doctor_id = coalesce(a_doctor, 0)
+          AND clinic_id = coalesce(a_clinic, 0)
+          AND payment_method = coalesce(OLD.payment_method, 'Unknown')
+          AND payment_status = coalesce(OLD.payment_status, 'Unknown');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.payment_date IS NOT NULL THEN
+        SELECT doctor_id, clinic_id INTO a_doctor, a_clinic FROM appointment WHERE appointment_id = NEW.appointment_id;
+        INSERT INTO payment_daily (day, doctor_id, clinic_id, payment_method, payment_status, payments, amount)
+        VALUES (NEW.payment_date::date, coalesce(a_doctor, 0), coalesce(a_clinic, 0),
+                coalesce(NEW.payment_method, 'Unknown'), coalesce(NEW.payment_status, 'Unknown'),
+                1, coalesce(NEW.amount, 0))
+        ON CONFLICT (day, doctor_id, payment_status, clinic_id, payment_method)
+        DO UPDATE SET payments = payment_daily.payments + 1,
+                      amount = payment_daily.amount + excluded.amount;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS payment_daily_total ON payment;
+CREATE TRIGGER payment_daily_total
+    AFTER INSERT OR DELETE OR UPDATE OF payment_date, appointment_id, amount, payment_method, payment_status ON payment
+    FOR EACH ROW EXECUTE FUNCTION total_payment_daily();
+
+CREATE OR REPLACE FUNCTION refresh_daily_aggregates() RETURNS void
+LANGUAGE sql AS $$
+    DELETE FROM appointment_daily;
+    INSERT INTO appointment_daily (day, doctor_id, clinic_id, status, appointments)
+    SELECT appointment_datetime::date, coalesce(doctor_id, 0), coalesce(clinic_id, 0),
+           coalesce(status, 'Unknown'), count(*)
+    FROM appointment
+    WHERE appointment_datetime IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    DELETE FROM payment_daily;
+    INSERT INTO payment_daily (day, doctor_id, clinic_id, payment_method, payment_status, payments, amount)
+    SELECT p.payment_date::date, coalesce(a.doctor_id, 0), coalesce(a.clinic_id, 0),
+           coalesce(p.payment_method, 'Unknown'), coalesce(p.payment_status, 'Unknown'),
+           count(*), coalesce(sum(p.amount), 0)
+    FROM payment p LEFT JOIN appointment a ON a.appointment_id = p.appointment_id
+    WHERE p.payment_date IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5;
+$$;
+
+SELECT refresh_daily_aggregates();
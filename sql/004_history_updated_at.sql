@@ -0,0 +1,25 @@
+-- Change tracking for the local history snapshots (clinic/snapshots.py).
+-- Like the live appointment feed (002), they poll for rows with updated_at
+-- at or after their last watermark, so patient and prescription need the
+-- same column and trigger as appointment. Requires 002 for
+-- touch_updated_at().
+
+ALTER TABLE patient
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS patient_updated_at_idx ON patient (updated_at);
+
+DROP TRIGGER IF EXISTS patient_touch ON patient;
+CREATE TRIGGER patient_touch
+    BEFORE UPDATE ON patient
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+ALTER TABLE prescription
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS prescription_updated_at_idx ON prescription (updated_at);
+
+DROP TRIGGER IF EXISTS prescription_touch ON prescription;
+CREATE TRIGGER prescription_touch
+    BEFORE UPDATE ON prescription
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
@@ -0,0 +1,19 @@
+-- Idempotency keys for the write-behind queue (clinic/writes.py).
+-- Bookings and sign-ups queued by the app carry a client-generated key,
+-- and the unique index makes an insert that is sent twice (a retry after a
+-- timeout, or a worker that died after its insert) fail instead of creating
+-- a second row. The queue then reads back the row already holding the key.
+-- Rows written without the queue leave the column null; nulls never
+-- conflict.
+
+ALTER TABLE appointment
+    ADD COLUMN IF NOT EXISTS idempotency_key text;
+
+CREATE UNIQUE INDEX IF NOT EXISTS appointment_idempotency_key
+    ON appointment (idempotency_key);
+
+ALTER TABLE patient
+    ADD COLUMN IF NOT EXISTS idempotency_key text;
+
+CREATE UNIQUE INDEX IF NOT EXISTS patient_idempotency_key
+    ON patient (idempotency_key);